@@ -0,0 +1,165 @@
+"""
+Throughput, latency percentiles and peak memory of PyMMT operations against
+a local mock of the scheduler API (benchmarks/mock_server.py), so that
+performance changes can be measured offline.
+
+    python benchmarks/bench_api.py [--targets 200] [--files 4] [--size 100000]
+                                   [--latency 0.005] [--workers 8] [--json]
+
+Each operation is timed once with tracing off; peak memory is measured in a
+second run under tracemalloc, which would otherwise slow the timed run.
+"""
+import argparse, json, os, sys, tempfile, time, tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from mock_server import MockScheduler, target_payload
+
+OPERATIONS = ('target_get', 'target_post', 'download_exposures', 'listener', 'instruments_cold', 'instruments_cached')
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not len(values):
+        return None
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def timed(func, args, workers):
+    """
+    Calls func(arg) for every arg on `workers` threads. Returns the total
+    elapsed seconds and the latency of every call.
+    """
+    def call(arg):
+        start = time.perf_counter()
+        func(arg)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            latencies = list(pool.map(call, args))
+    else:
+        latencies = [call(arg) for arg in args]
+    return time.perf_counter() - start, latencies
+
+
+def measure(name, func, args, workers, nbytes=None):
+    elapsed, latencies = timed(func, args, workers)
+
+    tracemalloc.start()
+    timed(func, args, workers)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    result = {
+        'operation':name,
+        'calls':len(latencies),
+        'elapsed':elapsed,
+        'throughput':len(latencies) / elapsed if elapsed else None,
+        'p50':percentile(latencies, 0.5),
+        'p95':percentile(latencies, 0.95),
+        'p99':percentile(latencies, 0.99),
+        'peak_memory':peak,
+    }
+    if nbytes is not None:
+        result['mb_per_s'] = nbytes / elapsed / 1e6 if elapsed else None
+    return result
+
+
+def run(args):
+    import pymmt
+    from pymmt.schedule import SCHEDULE_CACHE
+
+    token = 'benchmark'
+    targetids = list(range(1, args.targets + 1))
+    results = []
+    workdir = tempfile.TemporaryDirectory()
+    cwd = os.getcwd()
+    os.chdir(workdir.name)
+    try:
+        if 'target_get' in args.operations:
+            results.append(measure('target_get', lambda i: pymmt.Target(token=token, verbose=False, payload={'targetid':i}),
+                                   targetids, args.workers))
+
+        if 'target_post' in args.operations:
+            def post(i):
+                payload = dict((k, v) for k, v in target_payload(i).items() if k != 'id')
+                pymmt.Target(token=token, verbose=False, payload=payload).post()
+            results.append(measure('target_post', post, targetids, args.workers))
+
+        targets = [pymmt.Target(token=token, verbose=False, payload={'targetid':i}) for i in targetids]
+        if 'download_exposures' in args.operations:
+            # a fresh directory per run, so that every file is transferred
+            def download_all(_):
+                parentdir = tempfile.mkdtemp(dir=workdir.name)
+                def download(t):
+                    t.parentdir = parentdir
+                    t.download_exposures(force=True, refresh=True, workers=args.download_workers)
+                timed(download, targets, args.workers)
+            result = measure('download_exposures', download_all, [None], 1,
+                             nbytes=args.targets * args.files * args.size)
+            result['targets_per_s'] = args.targets / result['elapsed']
+            results.append(result)
+
+        if 'listener' in args.operations:
+            def listen(_):
+                os.chdir(tempfile.mkdtemp(dir=workdir.name))
+                listener = pymmt.Listener(token=token, targetids=targetids, workers=args.workers, min_interval=0, verbose=False)
+                listener.listen()
+            result = measure('listener', listen, [None], 1, nbytes=args.targets * args.files * args.size)
+            results.append(result)
+            os.chdir(workdir.name)
+
+        if 'instruments_cold' in args.operations:
+            def cold(_):
+                SCHEDULE_CACHE.clear()
+                pymmt.Instruments(token=token, verbose=False).get_instruments(instrumentid=16)
+            results.append(measure('instruments_cold', cold, range(args.repeat), 1))
+
+        if 'instruments_cached' in args.operations:
+            instruments = pymmt.Instruments(token=token, verbose=False)
+            instruments.get_instruments(instrumentid=16)
+            results.append(measure('instruments_cached', lambda _: instruments.get_instruments(), range(args.repeat), 1))
+    finally:
+        os.chdir(cwd)
+        workdir.cleanup()
+    return results
+
+
+def report(results):
+    print('{:<20} {:>7} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10}'.format(
+        'operation', 'calls', 'ops/s', 'p50 ms', 'p95 ms', 'p99 ms', 'peak MB', 'MB/s'))
+    for r in results:
+        print('{:<20} {:>7} {:>10.1f} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.2f} {:>10}'.format(
+            r['operation'], r['calls'], r['throughput'], r['p50'] * 1e3, r['p95'] * 1e3, r['p99'] * 1e3,
+            r['peak_memory'] / 1e6, '{:.1f}'.format(r['mb_per_s']) if 'mb_per_s' in r else '-'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--targets', type=int, default=200)
+    parser.add_argument('--files', type=int, default=4, help='raw datafiles per target')
+    parser.add_argument('--size', type=int, default=100000, help='bytes per datafile')
+    parser.add_argument('--latency', type=float, default=0.005, help='seconds added to every response')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='fraction of responses answered with 503')
+    parser.add_argument('--workers', type=int, default=8, help='concurrent calls per operation')
+    parser.add_argument('--download-workers', type=int, default=4, help='download threads per target')
+    parser.add_argument('--repeat', type=int, default=50, help='calls of the schedule operations')
+    parser.add_argument('--operations', nargs='+', choices=OPERATIONS, default=list(OPERATIONS))
+    parser.add_argument('--json', action='store_true', help='print the results as json')
+    args = parser.parse_args()
+
+    with MockScheduler(targets=args.targets, files=args.files, size=args.size, latency=args.latency,
+                       fail_rate=args.fail_rate) as server:
+        os.environ['MMT_API_BASE'] = server.url
+        results = run(args)
+
+    if args.json:
+        print(json.dumps({'settings':vars(args), 'results':results}, indent=1))
+    else:
+        report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Throughput of the coordinate engine: parsing and formatting sexagesimal
+ra/dec and proper-motion propagation, for whole arrays with the
+pymmt.coords array functions and one value at a time with the scalar ones.
+
+    python benchmarks/bench_coords.py [--coords 100000]
+"""
+import argparse, time
+import numpy as np
+from pymmt import coords
+
+
+def measure(label, run, n, repeat=3):
+    best = min(timed(run) for _ in range(repeat))
+    print('{:<28} {:>12.0f} coords/s {:>10.2f} us/coord'.format(label, n / best, best / n * 1e6))
+
+
+def timed(run):
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start
+
+
+def main(n=100000):
+    rng = np.random.default_rng(0)
+    ra = rng.uniform(0, 360, n)
+    dec = np.degrees(np.arcsin(rng.uniform(-1, 1, n)))
+    pm_ra, pm_dec = rng.normal(0, 50, n), rng.normal(0, 50, n)
+    ra_strings, dec_strings = coords.format_ra(ra), coords.format_dec(dec)
+    ra_list, dec_list = ra.tolist(), dec.tolist()
+
+    print('{} coordinates'.format(n))
+    measure('parse_ra', lambda: coords.parse_ra(ra_strings), n)
+    measure('ra_to_degrees (loop)', lambda: [coords.ra_to_degrees(s) for s in ra_strings], n)
+    measure('parse_dec', lambda: coords.parse_dec(dec_strings), n)
+    measure('dec_to_degrees (loop)', lambda: [coords.dec_to_degrees(s) for s in dec_strings], n)
+    measure('format_ra', lambda: coords.format_ra(ra), n)
+    measure('degrees_to_ra (loop)', lambda: [coords.degrees_to_ra(x) for x in ra_list], n)
+    measure('format_dec', lambda: coords.format_dec(dec), n)
+    measure('degrees_to_dec (loop)', lambda: [coords.degrees_to_dec(x) for x in dec_list], n)
+    measure('propagate', lambda: coords.propagate(ra, dec, pm_ra, pm_dec, 'J2000', 2026.5), n)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--coords', type=int, default=100000, help='number of coordinates')
+    args = parser.parse_args()
+    main(args.coords)
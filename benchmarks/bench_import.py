@@ -0,0 +1,65 @@
+"""
+Cold-start cost of PyMMT: the wall time of fresh interpreters importing the
+package and reaching the first useful object, and the modules that import
+takes longest on.
+
+    python benchmarks/bench_import.py [--repeat 20] [--top 10]
+"""
+import argparse, os, statistics, subprocess, sys, time
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+STAGES = [
+    ('python', 'pass'),
+    ('import pymmt', 'import pymmt'),
+    ('pymmt.Target', 'import pymmt; pymmt.Target'),
+    ('Target.validate', "import pymmt; pymmt.Target(token='x', verbose=False, payload={'ra':'10:00:00.0', "
+                        "'dec':'+10:00:00.0', 'instrumentid':16, 'observationtype':'imaging', 'filter':'g', "
+                        "'exposuretime':300, 'numberexposures':1, 'magnitude':19, 'epoch':'J2000', 'maskid':110, "
+                        "'objectid':'x'})"),
+    ('first request ready', 'import pymmt; pymmt.get_session()'),
+    ('validate_catalog', 'import pymmt; pymmt.validate_catalog'),
+]
+
+
+def run(code, env):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], env=env, check=True)
+    return time.perf_counter() - start
+
+
+def slowest_imports(code, env, top):
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], env=env, check=True,
+                         stderr=subprocess.PIPE, text=True).stderr
+    rows = []
+    for line in out.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line.split(':', 1)[1].split('|')]
+        rows.append((int(cumulative_us), int(self_us), name))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repeat', type=int, default=20, help='interpreters started per stage')
+    parser.add_argument('--top', type=int, default=10, help='slowest imports listed for pymmt.Target')
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([SRC, os.environ.get('PYTHONPATH', '')]))
+    baseline = None
+    print('{:<22} {:>10} {:>10} {:>12}'.format('stage', 'median ms', 'min ms', 'over python'))
+    for label, code in STAGES:
+        times = [run(code, env) for _ in range(args.repeat)]
+        median = statistics.median(times)
+        baseline = median if baseline is None else baseline
+        print('{:<22} {:>10.1f} {:>10.1f} {:>12.1f}'.format(label, median * 1e3, min(times) * 1e3, (median - baseline) * 1e3))
+
+    print()
+    print('slowest imports for pymmt.Target (cumulative ms, self ms)')
+    for cumulative, own, name in slowest_imports('import pymmt; pymmt.Target', env, args.top):
+        print('{:>8.1f} {:>8.1f}  {}'.format(cumulative / 1e3, own / 1e3, name))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Memory per target and JSON conversion speed of TargetRecord compared with
+plain payload dicts and full Target objects.
+
+    python benchmarks/bench_record.py [--targets 10000]
+"""
+import argparse, time, tracemalloc
+import pymmt
+from pymmt import TargetRecord
+
+
+def payload(i):
+    return {
+        'id':i, 'objectid':'AT2024abc{}'.format(i), 'ra':'12:34:56.78', 'dec':'+12:34:56.7',
+        'ra_decimal':'188.7365', 'dec_decimal':'12.5824', 'pm_ra':0.0, 'pm_dec':0.0, 'magnitude':19.5,
+        'epoch':'J2000', 'exposuretime':'600', 'numberexposures':'3', 'visits':'1', 'priority':'1',
+        'photometric':0, 'targetofopportunity':1, 'observationtype':'imaging', 'filter':'g', 'maskid':110,
+        'instrumentid':16, 'onevisitpernight':0, 'pa':0.0, 'iscomplete':0, 'percentcompleted':'0.0',
+        'modified':'2024-05-01 12:00:00', 'submitted':'2024-05-01 11:00:00', 'notes':'',
+    }
+
+
+def measure(label, build, n):
+    tracemalloc.start()
+    start = time.perf_counter()
+    objects = [build(i) for i in range(n)]
+    elapsed = time.perf_counter() - start
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print('{:<22} {:>8.0f} bytes/target {:>10.0f} targets/s'.format(label, size / n, n / elapsed))
+    return objects
+
+
+def main(n=10000):
+    payloads = [payload(i) for i in range(n)]
+    print('{} targets'.format(n))
+    measure('payload dict', lambda i: dict(payloads[i]), n)
+    measure('Target', lambda i: pymmt.Target(token='benchmark', verbose=False, payload=payloads[i]), n)
+    records = measure('TargetRecord.from_json', lambda i: TargetRecord.from_json(payloads[i]), n)
+
+    start = time.perf_counter()
+    for r in records:
+        r.to_json()
+    elapsed = time.perf_counter() - start
+    print('{:<22} {:>31.0f} targets/s'.format('TargetRecord.to_json', n / elapsed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--targets', type=int, default=10000)
+    args = parser.parse_args()
+    main(args.targets)
@@ -0,0 +1,99 @@
+"""
+CPU time and memory of decoding API responses, for large datalist and
+schedule payloads: a requests.Response parsed twice with json.loads (as
+Target.update and Target.post used to) and with requests' .json(), against
+pymmt.responses.Response with every JSON backend that is installed.
+
+    python benchmarks/bench_responses.py [--files 20000] [--runs 2000] [--repeat 5]
+
+'cpu' is the process time of one call (best of --repeat). 'peak' is the
+most memory allocated during the call and 'retained' what is still held
+while the response and the decoded value are kept, as the api classes do
+with self.request and Datalist.data.
+"""
+import argparse, json, os, sys, time, tracemalloc
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from mock_server import schedule_payload
+from pymmt.responses import Response, JSON_BACKENDS, configure_json
+
+
+def datalist_payload(files):
+    return [{'name':'2024.{:04d}'.format(n), 'datafiles':[
+        {'id':n * 1000 + j, 'filename':'mock{}_{:04d}.fits'.format(n, j), 'type':'science', 'size':100000,
+         'md5':'{:032x}'.format(n * 1000 + j), 'modified':'2024-05-01 12:00:00'}
+        for j in range(100)]} for n in range(max(1, files // 100))]
+
+
+def requests_response(body):
+    r = requests.Response()
+    r.status_code = 200
+    r._content = body
+    r.encoding = 'utf-8'
+    r.headers['Content-Type'] = 'application/json'
+    return r
+
+
+def parse_twice(body):
+    r = requests_response(body)
+    json.loads(r.text)
+    return r, json.loads(r.text)
+
+
+def requests_json(body):
+    r = requests_response(body)
+    return r, r.json()
+
+
+def response_json(body):
+    r = Response(200, {'Content-Type':'application/json'}, body, 'http://localhost')
+    r.json()
+    return r, r.json()
+
+
+def measure(label, func, body, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.process_time()
+        func(body)
+        elapsed = time.process_time() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    # a body of its own, as read from the network, so that keeping it counts
+    kept = func(bytes(bytearray(body)))
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    print('{:<32} {:>10.1f} ms cpu {:>10.1f} MB peak {:>10.1f} MB retained'.format(
+        label, best * 1e3, (peak - base) / 1e6, (retained - base) / 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=20000, help='datafiles in the datalist')
+    parser.add_argument('--runs', type=int, default=2000, help='queue runs per instrument in the schedule')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    payloads = [
+        ('datalist', json.dumps(datalist_payload(args.files)).encode()),
+        ('schedule', json.dumps(schedule_payload(args.runs)).encode()),
+    ]
+    for name, body in payloads:
+        print('{} ({:.1f} MB)'.format(name, len(body) / 1e6))
+        measure('requests, json.loads(text) x2', parse_twice, body, args.repeat)
+        measure('requests, .json()', requests_json, body, args.repeat)
+        for backend in JSON_BACKENDS:
+            try:
+                configure_json(backend)
+            except ImportError:
+                continue
+            measure('Response.json() x2, {}'.format(backend), response_json, body, args.repeat)
+        configure_json()
+
+
+if __name__ == '__main__':
+    main()
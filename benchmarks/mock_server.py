@@ -0,0 +1,279 @@
+"""
+Local stand-in for the MMT scheduler APIv2 endpoints used by PyMMT, for
+benchmarks and offline experiments.
+
+Serves catalogTarget (GET/POST/PUT/DELETE and the target list),
+data/list/catalogtarget (raw and reduced), data/download/datafile (with
+Range requests) and trimester//schedule/all/, from synthetic data of
+configurable size. Every response can be delayed by a fixed latency and a
+fraction of them can be answered with 429/503.
+
+    python benchmarks/mock_server.py --targets 100 --files 10 --size 1000000
+
+prints the base url to point PyMMT at with MMT_API_BASE. From Python:
+
+    with MockScheduler(targets=100) as server:
+        os.environ['MMT_API_BASE'] = server.url
+"""
+import argparse, json, os, random, re, threading, time
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+BLOCK = bytes(range(256)) * 256
+
+
+def target_payload(i, complete=False):
+    return {
+        'id':i, 'objectid':'AT2024mock{}'.format(i), 'ra':'12:34:56.78', 'dec':'+12:34:56.7',
+        'ra_decimal':188.736583, 'dec_decimal':12.582417, 'pm_ra':0.0, 'pm_dec':0.0, 'magnitude':19.5,
+        'epoch':'J2000', 'exposuretime':600, 'numberexposures':3, 'visits':1, 'priority':3,
+        'photometric':0, 'targetofopportunity':0, 'observationtype':'imaging', 'filter':'g', 'maskid':110,
+        'instrumentid':16, 'onevisitpernight':0, 'pa':0.0, 'iscomplete':int(complete),
+        'percentcompleted':100.0 if complete else 0.0, 'exposuretimecompleted':1800 if complete else 0,
+        'modified':'2024-05-01 12:00:00', 'submitted':'2024-05-01 11:00:00', 'notes':'',
+        'findingchartfilename':None,
+    }
+
+
+def schedule_payload(runs=40, start=None):
+    start = start if start is not None else datetime.now() - timedelta(days=runs)
+    queues = []
+    for instrumentid, name in [(16, 'Binospec'), (15, 'MMIRS')]:
+        queueruns = []
+        for n in range(runs):
+            begin = start + timedelta(days=4 * n + (instrumentid == 15) * 2)
+            queueruns.append({
+                'startdate':begin.strftime('%Y-%m-%d %H:%M:%S-00'),
+                'enddate':(begin + timedelta(days=2)).strftime('%Y-%m-%d %H:%M:%S-00'),
+            })
+        queues.append({'instrumentid':instrumentid, 'name':name, 'queueruns':queueruns})
+    return {'published':{'queues':queues}}
+
+
+class MockScheduler():
+    """
+    Threaded HTTP server with the synthetic data of `targets` targets, each
+    with `files` raw datafiles of `size` bytes and, with reduced=True, one
+    reduced datafile. Responses wait `latency` seconds; `fail_rate` of them,
+    and the next `fail_next` ones, are answered with `fail_status` and a
+    Retry-After of `retry_after` (none if None). The next `cut_next`
+    datafile downloads are cut off half way. The target list is
+    paginated when a page is asked for, and answered with 404 when
+    listing=False, like a server without a bulk endpoint. `requests` and
+    `connections` count the requests and TCP connections received.
+    """
+    def __init__(self, targets=100, files=4, size=100000, reduced=True, complete=True, latency=0.0,
+                 fail_rate=0.0, fail_status=503, fail_next=0, retry_after='0', cut_next=0, schedule_runs=40, listing=True,
+                 host='127.0.0.1', port=0):
+        self.size = size
+        self.listing = listing
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.fail_next = fail_next
+        self.retry_after = retry_after
+        self.cut_next = cut_next
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+
+        self.targets = dict((i, target_payload(i, complete)) for i in range(1, targets + 1))
+        self.datalists = {}
+        for i in self.targets:
+            raw = [{'id':i * 10000 + j, 'filename':'mock{}_{:04d}.fits'.format(i, j), 'type':'science', 'size':size}
+                   for j in range(files)]
+            self.datalists[(i, 'raw')] = [{'name':'2024.0501', 'datafiles':raw}]
+            self.datalists[(i, 'reduced')] = [{'name':'2024.0501', 'datafiles':[
+                {'id':i * 10000 + 9999, 'filename':'mock{}_stack.fits'.format(i), 'type':'reduced', 'size':size}
+            ]}] if reduced else []
+        self.schedule = schedule_payload(schedule_runs)
+
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return 'http://{}:{}/APIv2'.format(host, port)
+
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # headers and body are written separately; without this, Nagle's
+            # algorithm and delayed ACKs add ~40ms to every keep-alive response
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                with mock.lock:
+                    mock.connections += 1
+
+            def send_json(self, status, body, headers={}):
+                body = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def read_body(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                self.raw_body = body
+                if self.headers.get('Content-Type', '').startswith('application/json') and body:
+                    return json.loads(body)
+                return {}
+
+            def send_file(self, size):
+                start, end, status = 0, size - 1, 200
+                match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+                if match:
+                    start = int(match.group(1))
+                    end = int(match.group(2)) if match.group(2) else end
+                    if start >= size:
+                        return self.send_json(416, {'error':'range not satisfiable'})
+                    status = 206
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Content-Length', str(end - start + 1))
+                if status == 206:
+                    self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, end, size))
+                self.end_headers()
+                with mock.lock:
+                    cut = mock.cut_next > 0
+                    mock.cut_next -= cut
+                if cut:
+                    # the connection drops before the body is complete
+                    end = start + (end - start) // 2
+                    self.close_connection = True
+                position = start
+                while position <= end:
+                    offset = position % len(BLOCK)
+                    chunk = BLOCK[offset:offset + min(len(BLOCK) - offset, end - position + 1)]
+                    self.wfile.write(chunk)
+                    position += len(chunk)
+
+            def handle_any(self, method):
+                body = self.read_body()
+                with mock.lock:
+                    mock.requests += 1
+                    fail = mock.fail_next > 0
+                    mock.fail_next -= fail
+                if mock.latency:
+                    time.sleep(mock.latency)
+                if fail or (mock.fail_rate and random.random() < mock.fail_rate):
+                    headers = {'Retry-After':mock.retry_after} if mock.retry_after is not None else {}
+                    return self.send_json(mock.fail_status, {'error':'busy'}, headers)
+
+                path = self.path.split('?')[0]
+                match = re.match(r'/APIv2/catalogTarget/(\d+)/?$', path)
+                if match:
+                    targetid = int(match.group(1))
+                    if targetid not in mock.targets:
+                        return self.send_json(404, {'error':'no such target'})
+                    if method == 'PUT':
+                        mock.targets[targetid].update((k, v) for k, v in body.items() if k not in ['token', 'targetid'])
+                        mock.targets[targetid]['modified'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    elif method == 'DELETE':
+                        return self.send_json(200, mock.targets.pop(targetid))
+                    elif method == 'POST':
+                        # finders keep the name they were uploaded with
+                        name = re.search(rb'filename="([^"]*)"', self.raw_body)
+                        mock.targets[targetid]['findingchartfilename'] = (
+                            name.group(1).decode() if name else 'finder_{}.png'.format(targetid))
+                    return self.send_json(200, mock.targets[targetid])
+
+                if re.match(r'/APIv2/catalogTarget/?$', path):
+                    if method == 'POST':
+                        with mock.lock:
+                            targetid = max(mock.targets or [0]) + 1
+                            target = dict(target_payload(targetid), **dict((k, v) for k, v in body.items() if k != 'token'))
+                            target['id'] = targetid
+                            mock.targets[targetid] = target
+                        return self.send_json(200, target)
+                    if not mock.listing:
+                        return self.send_json(404, {'error':'unknown endpoint'})
+                    targets = list(mock.targets.values())
+                    if 'page' in body:
+                        size = int(body.get('per_page', 100))
+                        targets = targets[(int(body['page']) - 1) * size:int(body['page']) * size]
+                    return self.send_json(200, targets)
+
+                match = re.match(r'/APIv2/data/list/catalogtarget/(\d+)/token/[^/]+/type/(\w+)', path)
+                if match:
+                    return self.send_json(200, mock.datalists.get((int(match.group(1)), match.group(2)), []))
+
+                if re.match(r'/APIv2/data/download/datafile/(\d+)/token/', path):
+                    return self.send_file(mock.size)
+
+                if path.startswith('/APIv2/trimester//schedule/all'):
+                    return self.send_json(200, mock.schedule)
+
+                self.send_json(404, {'error':'unknown endpoint'})
+
+            def do_GET(self):
+                self.handle_any('GET')
+
+            def do_POST(self):
+                self.handle_any('POST')
+
+            def do_PUT(self):
+                self.handle_any('PUT')
+
+            def do_DELETE(self):
+                self.handle_any('DELETE')
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--targets', type=int, default=100)
+    parser.add_argument('--files', type=int, default=4, help='raw datafiles per target')
+    parser.add_argument('--size', type=int, default=100000, help='bytes per datafile')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--fail-status', type=int, default=503)
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    server = MockScheduler(targets=args.targets, files=args.files, size=args.size, latency=args.latency,
+                           fail_rate=args.fail_rate, fail_status=args.fail_status, port=args.port)
+    print('MMT_API_BASE={}'.format(server.url))
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
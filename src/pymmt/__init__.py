@@ -7,7 +7,9 @@ MMT_JSON_KEYS = ("id", "ra", "objectid", "observationtype", "moon", "seeing", "p
                  "totallengthformatted", "exposuretimeremainingformatted", "exposuretimecompleted",
                  "percentcompleted", "offsetstars", "details", "mask")
 
-LOCAL_TARGET_KEYS = ("partial_download", "downloaded", "local_save", "_id", "delete_date")
+MMT_JSON_KEY_SET = frozenset(MMT_JSON_KEYS)
+
+LOCAL_TARGET_KEYS = ("partial_download", "downloaded", "local_save", "_id", "delete_date", "finder_upload")
 
 MMT_MMIRS_REQUIRED_KEYS = ['ra', 'dec', 'epoch', 'exposuretime', 'observationtype', 'numberexposures', 'filter','grating' \
     ,'instrumentid','magnitude','maskid','objectid','onevisitpernight','pa','pm_dec','pm_ra','priority','slitwidth','slitwidthproperty','visits']
@@ -29,11 +31,53 @@ def isFloat(i):
         return False
 
 
-from .pymmt import (
-    api,
-    Target,
-    Instruments,
-    Datalist,
-    Image,
-    Listener
-)
+# Public names and the submodules they live in. They are imported on first
+# access (PEP 562), so that `import pymmt` stays cheap and the HTTP stack,
+# numpy and the instrument rule tables are only loaded when used.
+_EXPORTS = {
+    'api':'.pymmt',
+    'Target':'.pymmt',
+    'Instruments':'.pymmt',
+    'Datalist':'.pymmt',
+    'Image':'.pymmt',
+    'Listener':'.pymmt',
+    'ListenerDaemon':'.daemon',
+    'configure_session':'.session',
+    'get_session':'.session',
+    'close_session':'.session',
+    'configure_limiter':'.ratelimit',
+    'get_limiter':'.ratelimit',
+    'configure_coalescing':'.singleflight',
+    'get_singleflight':'.singleflight',
+    'configure_json':'.responses',
+    'get_json_backend':'.responses',
+    'METRICS':'.metrics',
+    'configure_logging':'.logs',
+    'download_datafiles':'.downloads',
+    'upload_finders':'.finders',
+    'sync_targets':'.sync',
+    'list_targets':'.bulk',
+    'refresh_targets':'.bulk',
+    'TargetBatch':'.batch',
+    'validate_catalog':'.catalog',
+    'validate_records':'.catalog',
+    'TargetCache':'.cache',
+    'SpatialIndex':'.spatial',
+    'TargetRecord':'.record',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    from importlib import import_module
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,591 @@
+import os, json, time, asyncio, logging, weakref
+from datetime import datetime
+from . import MMT_JSON_KEY_SET
+from .pymmt import api, Target
+from .schedule import SCHEDULE_CACHE
+from .session import get_session_config
+from .ratelimit import get_limiter, parse_retry_after, THROTTLE_STATUS
+from .metrics import METRICS
+from .singleflight import get_singleflight, request_key
+from .responses import Response
+from .manifest import file_digest
+from .finders import FINDER_FIELD, finder_digest, finder_is_current, record_finder_upload
+from .sync import DATA_TYPES, index_entries, filter_index, load_manifests, plan_targets, finish_sync
+from .logs import log
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# one aiohttp session per event loop, since sessions cannot be shared across loops
+_sessions = weakref.WeakKeyDictionary()
+
+
+def get_async_session():
+    """
+    Return the pooled aiohttp session for the running event loop.
+
+    The pool size and timeouts follow the settings of pymmt.configure_session.
+    """
+    if aiohttp is None:
+        raise ImportError('The asyncio client requires aiohttp. Install it with: pip install pymmt[async]')
+
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        config = get_session_config()
+        connect, read = config['timeout']
+        connector = aiohttp.TCPConnector(limit=config['pool_connections'] * config['pool_maxsize'],
+                                         limit_per_host=config['pool_maxsize'])
+        session = aiohttp.ClientSession(connector=connector,
+                                        timeout=aiohttp.ClientTimeout(sock_connect=connect, sock_read=read))
+        _sessions[loop] = session
+    return session
+
+
+async def close_async_session():
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+async def gather(*aws, limit=None, return_exceptions=False):
+    """
+    asyncio.gather with an optional cap on how many awaitables run at once.
+    """
+    if limit is None:
+        return await asyncio.gather(*aws, return_exceptions=return_exceptions)
+
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(aw):
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(*(run(aw) for aw in aws), return_exceptions=return_exceptions)
+
+
+class AsyncApi():
+
+    # request metrics and hooks, shared with the api classes
+    metrics = METRICS
+
+    def __init__(self, target=None, token=None, session=None):
+
+        self.base = os.getenv('MMT_API_BASE', 'https://scheduler.mmto.arizona.edu/APIv2')
+        self.target = target
+        self.session = session
+
+        if token is None:
+            self.token = os.getenv('MMT_API_TOKEN')
+        else:
+            self.token = token
+
+        self.request = None
+
+    _build_url = api._build_url
+
+
+    async def _request(self, method, **kwargs):
+        flight = get_singleflight()
+        key = request_key(method, self.url, kwargs, scope=None if self.session is None else id(self.session)) if flight is not None else None
+        if key is None:
+            return await self._send(method, **kwargs)
+        self.request = (await flight.do_async(key, lambda: self._send(method, **kwargs)))[0]
+        return self.request
+
+
+    def _record(self, method, limiter, started, attempt, kwargs, response=None, error=None):
+        """
+        Record one attempt in the limiter and the metrics, like api._send.
+        Returns the Retry-After delay of a throttled response, or None.
+        """
+        retry_after = None
+        status = response.status_code if response is not None else None
+        if status in THROTTLE_STATUS:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        if limiter is not None:
+            forced = status in get_session_config()['status_forcelist']
+            limiter.release(started, status=status, retry_after=retry_after, error=error is not None or forced)
+        body = kwargs.get('json')
+        self.metrics.after(self, method, response, elapsed=time.monotonic() - started, retries=min(attempt, 1), error=error,
+                           bytes_sent=len(json.dumps(body)) if body is not None else 0)
+        return retry_after
+
+
+    async def _send(self, method, stream=False, **kwargs):
+        """
+        Send a request with the retry rules of api._send. With stream=True
+        the body is not read: the aiohttp response of the last attempt is
+        returned for the caller to read and release.
+        """
+        session = self.session if self.session is not None else get_async_session()
+        limiter = get_limiter()
+        config = get_session_config()
+
+        # connection errors, which the session retries for api, are retried
+        # here for the allowed methods. Form bodies cannot be sent twice
+        if method == 'POST':
+            retriable = (429,) if limiter is not None else ()
+        else:
+            retriable = THROTTLE_STATUS if limiter is not None else ()
+            if method in config['allowed_methods']:
+                retriable += tuple(config['status_forcelist'])
+        if kwargs.get('data') is not None:
+            retriable = ()
+        retries, backoff = (limiter.retries, limiter.backoff) if limiter is not None else (config['retries'], config['backoff_factor'])
+
+        attempt = failures = 0
+        while True:
+            self.metrics.before(self, method, self.url, kwargs)
+            started = await limiter.acquire_async() if limiter is not None else time.monotonic()
+            try:
+                r = await session.request(method, self.url, **kwargs)
+                content = None if stream else await r.read()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                self._record(method, limiter, started, attempt + failures, kwargs, error=e)
+                if method not in config['allowed_methods'] or failures >= config['retries']:
+                    raise
+                failures += 1
+                await asyncio.sleep(config['backoff_factor'] * 2 ** (failures - 1))
+                continue
+
+            self.request = Response(r.status, r.headers, content, str(r.url), reason=r.reason, encoding=r.charset)
+            retry_after = self._record(method, limiter, started, attempt + failures, kwargs, self.request)
+            if r.status not in retriable or attempt >= retries:
+                if stream:
+                    return r
+                r.release()
+                return self.request
+            r.release()
+            attempt += 1
+            if retry_after is None:
+                await asyncio.sleep(backoff * 2 ** (attempt - 1))
+
+
+    async def _post(self, r_json):
+        self._build_url(r_json['urlparams'])
+        data = r_json['data'] if 'data' in r_json.keys() else None
+        files = r_json['files'] if 'files' in r_json.keys() else None
+        d_json = r_json['d_json'] if 'd_json' in r_json.keys() else None
+        if data is None and files is None:
+            return await self._request('POST', json=d_json)
+
+        form = aiohttp.FormData()
+        for key, value in (data or {}).items():
+            form.add_field(key, value)
+        for key, f in (files or {}).items():
+            form.add_field(key, f, filename=os.path.basename(getattr(f, 'name', key)))
+        return await self._request('POST', data=form)
+
+
+    async def _get(self, r_json):
+        self._build_url(r_json['urlparams'])
+        d_json = r_json['d_json'] if 'd_json' in r_json.keys() else None
+        return await self._request('GET', json=d_json)
+
+
+    async def _put(self, r_json):
+        self._build_url(r_json['urlparams'])
+        d_json = r_json['d_json']
+        return await self._request('PUT', json=d_json)
+
+
+    async def _delete(self, r_json):
+        self._build_url(r_json['urlparams'])
+        d_json = r_json['d_json']
+        return await self._request('DELETE', json=d_json)
+
+
+class AsyncTarget(AsyncApi):
+    """
+    Awaitable counterpart of pymmt.Target.
+
+    Payloads are validated exactly like Target. A target is not fetched on
+    construction; use `await AsyncTarget.fetch(token, targetid)` instead of
+    Target(payload={'targetid':...}).
+    """
+
+    validate = Target.validate
+    dump = Target.dump
+
+    def __init__(self, token=None, verbose=True, payload={}, session=None):
+        self.verbose = verbose
+        self.valid = False
+        self.downloaded = False
+        self.partial_download = False
+        self.message = {
+            'Errors':[],
+            'Warnings':[]
+        }
+
+        assert token is not None, 'Token cannot be None'
+        super().__init__('catalogTarget', token, session)
+
+        self.__dict__.update((str(key).lower(), value) for key, value in payload.items() if str(key).lower() in MMT_JSON_KEY_SET)
+
+        if 'targetid' in payload.keys():
+            self.targetid = payload['targetid']
+            self.id = payload['targetid']
+        else:
+            self.validate(verbose=self.verbose)
+
+
+    @classmethod
+    async def fetch(cls, token=None, targetid=None, verbose=True, session=None):
+        assert targetid is not None, 'targetid cannot be None'
+        target = cls(token=token, verbose=verbose, payload={'targetid':targetid}, session=session)
+        await target.get()
+        target.validate(verbose=target.verbose)
+        return target
+
+
+    async def update(self, **kwargs):
+
+        self.__dict__.update((key, value) for key, value in kwargs.items() if key in MMT_JSON_KEY_SET)
+        self.validate()
+
+        if self.valid:
+            kwargs['targetid'] = self.__dict__['id']
+            kwargs['token'] = self.token
+
+            data = {
+                'urlparams':{
+                    'targetid':self.__dict__['id']
+                },
+                'd_json':kwargs
+            }
+
+            r = await self._put(r_json=data)
+            log('{} {}'.format(r.json(), r.status_code), status=r.status_code)
+
+            if r.status_code == 200:
+                self.__dict__.update((key, value) for key, value in r.json().items())
+            else:
+                log('Something went wrong with the request. Envoke target.request to see request information', logging.ERROR)
+        else:
+            log('Invalid Target. Envoke target.validate() to see errors', logging.ERROR)
+
+
+    async def delete(self):
+        data = {
+            'urlparams':{
+                'targetid':self.__dict__['id']
+            },
+            'd_json':{
+                'token':self.token
+            }
+        }
+        r = await self._delete(r_json=data)
+        if r.status_code == 200:
+            log('Succesfully Deleted')
+        else:
+            log('Something went wrong with the request. Envoke target.request to see request information', logging.ERROR)
+        if self.verbose:
+            log('{} {}'.format(r.json(), r.status_code), status=r.status_code)
+
+
+    async def post(self):
+        if self.valid:
+            payload = dict((key, value) for key, value in self.__dict__.items() if key in MMT_JSON_KEY_SET)
+            payload['token'] = self.token
+            data = {
+                'urlparams':{},
+                'data':None,
+                'files':None,
+                'd_json':payload,
+            }
+            r = await self._post(r_json=data)
+
+            if self.verbose:
+                log('{} {}'.format(r.json(), r.status_code), status=r.status_code)
+            if r.status_code == 200:
+                self.__dict__.update((key, value) for key, value in r.json().items())
+                self.targetid = self.id
+            else:
+                log('Something went wrong with the request. Envoke target.request to see request information', logging.ERROR)
+        else:
+            log('Invalid Target parameters. Envoke target.validate() to see errors', logging.ERROR)
+
+
+    async def get(self):
+        data = {
+            'urlparams': {
+                'targetid':self.__dict__['targetid']
+            },
+            'd_json':{
+                'token':self.token
+            },
+        }
+        r = await self._get(r_json=data)
+        if r.status_code == 200:
+            self.__dict__.update((key, value) for key, value in r.json().items())
+        else:
+            log('Something went wrong with the request. Envoke target.request to see request information', logging.ERROR)
+
+
+    async def upload_finder(self, finder_path, force=False):
+        """
+        Awaitable Target.upload_finder: the upload is skipped (and None
+        returned) when the same content was already uploaded and the server
+        still has it, unless force is set.
+        """
+        if self.valid:
+            if isinstance(finder_path, (str, os.PathLike)):
+                finder_file = open(finder_path, 'rb')
+            else:  # if it's already a file object (e.g., from Django)
+                finder_file = finder_path.open('rb')
+            with finder_file:
+                digest = finder_digest(finder_file)
+                if not force and finder_is_current(self, digest):
+                    if self.verbose:
+                        log('Finder of target {} is already uploaded'.format(self.__dict__['id']), targetid=self.__dict__['id'])
+                    return None
+                form = aiohttp.FormData()
+                form.add_field('type', 'finding_chart')
+                form.add_field('token', self.token)
+                form.add_field('target_id', str(self.__dict__['id']))
+                form.add_field(FINDER_FIELD, finder_file,
+                               filename=os.path.basename(getattr(finder_file, 'name', None) or 'finder'))
+                self._build_url({'targetid':self.__dict__['targetid']})
+                r = await self._request('POST', data=form)
+            if r.status_code == 200:
+                self.__dict__.update((key, value) for key, value in r.json().items())
+                record_finder_upload(self, digest)
+            else:
+                log('Something went wrong with the request. Envoke target.request to see request information', logging.ERROR)
+            if self.verbose:
+                log('{} {}'.format(r.json(), r.status_code), status=r.status_code, url=r.url)
+            return r
+
+
+    async def download_exposures(self, force=False, workers=4, retries=2, progress=None, refresh=False,
+                                 data_types=('raw',), file_types=None):
+        """
+        Awaitable Target.download_exposures, with the same manifest and
+        download report (see pymmt.sync).
+        """
+        if (self.valid and self.iscomplete != 1) or force:
+            start = datetime.now()
+            data_types = list(data_types)
+            manifests, states, pending, skipped = load_manifests([self], data_types, file_types, refresh, self.verbose)
+            entries, errors = await fetch_index(self.token, [t.__dict__['id'] for t in pending], data_types,
+                                                verbose=self.verbose, session=self.session)
+            entries = filter_index(entries, file_types=file_types)
+            if self.verbose:
+                log('Length of datalist {}'.format(len(entries)))
+
+            jobs, listed = plan_targets(pending, entries, manifests, self.verbose)
+            report = await download_datafiles(jobs, token=self.token, workers=workers, retries=retries,
+                                              progress=progress, verbose=self.verbose, session=self.session)
+            finish_sync([self], pending, listed, manifests, states, report, skipped, errors, start)
+            if report['total'] == 0 and not len(errors):
+                if self.verbose:
+                    log('Exposures not taken yet.', targetid=self.__dict__['id'])
+                return None
+            return self.download_report
+        else:
+            if self.verbose:
+                log('Exposure is completed', targetid=self.__dict__.get('id'))
+
+
+class AsyncInstruments(AsyncApi):
+    def __init__(self, token=None, verbose=True, payload={}, session=None, cache=None):
+        self.verbose = verbose
+        self.cache = cache if cache is not None else SCHEDULE_CACHE
+        super().__init__('trimester//schedule/all/', token, session)
+
+    async def get_schedule(self, refresh=False):
+        key = (self.base, self.token)
+        schedule = None if refresh else self.cache.lookup(key)
+        if schedule is None:
+            r_json = {
+                'urlparams':{},
+                'd_json':{
+                    'token':self.token
+                }
+            }
+            r = await self._get(r_json=r_json)
+            schedule = self.cache.store(key, r.json())
+        return schedule
+
+    async def get_instruments(self, date=None, instrumentid=None, getAll=False, refresh=False):
+        if date is None and instrumentid is None:
+            date = datetime.now()
+
+        schedule = await self.get_schedule(refresh=refresh)
+        ret = schedule.select(date=date, instrumentid=instrumentid, getAll=getAll)
+        if self.verbose:
+            for r in ret:
+                log(str(r), run=r)
+        return ret
+
+
+class AsyncDatalist(AsyncApi):
+    def __init__(self, token=None, verbose=True, payload={}, session=None):
+        self.verbose = verbose
+        self.data = []
+        super().__init__('data/list/catalogtarget', token, session)
+
+
+    async def get(self, targetid, data_type='raw'):
+        assert data_type in ['raw', 'reduced'], 'data_type must either be raw or reduced'
+        r_json = {
+            'urlparams':{
+                'targetid':targetid,
+                'token':self.token,
+                'type':data_type
+            }
+        }
+
+        r = await self._get(r_json=r_json)
+
+        if r.status_code == 200:
+            self.data = r.json()
+        else:
+            log('Datalist request error', logging.ERROR)
+
+
+class AsyncImage(AsyncApi):
+    def __init__(self, token=None, verbose=True, payload={}, session=None):
+        self.verbose = verbose
+        super().__init__('data/download/datafile', token, session)
+
+
+    async def get(self, datafileid=None, filepath=os.getcwd(), chunk_size=1024*1024, resume=True):
+        """
+        Stream a datafile to filepath through '<filepath>.part', resuming a
+        leftover partial file with an HTTP Range request. See Image.get.
+        """
+        assert datafileid is not None, 'datafileid cannot be None'
+        self._build_url({
+            'datafileid':datafileid,
+            'token':self.token
+        })
+
+        partpath = '{}.part'.format(filepath)
+        offset = os.path.getsize(partpath) if resume and os.path.exists(partpath) else 0
+        headers = {'Range':'bytes={}-'.format(offset)} if offset else {}
+
+        r = await self._send('GET', stream=True, headers=headers)
+        async with r:
+            restart = r.status == 416 and offset
+            if not restart:
+                if r.status not in [200, 206]:
+                    log('Image download request error', logging.ERROR)
+                    return False
+
+                mode = 'ab' if r.status == 206 else 'wb'
+                if self.verbose:
+                    log('Writing file.')
+                with open(partpath, mode) as f:
+                    async for chunk in r.content.iter_chunked(chunk_size):
+                        f.write(chunk)
+
+        if restart:
+            os.remove(partpath)
+            return await self.get(datafileid=datafileid, filepath=filepath, chunk_size=chunk_size, resume=False)
+
+        os.replace(partpath, filepath)
+        return True
+
+
+async def _fetch_one(token, targetid, data_type, session):
+    datalist = AsyncDatalist(token=token, verbose=False, session=session)
+    try:
+        await datalist.get(targetid=targetid, data_type=data_type)
+    except Exception as e:
+        return None, '{}: {}'.format(type(e).__name__, e)
+    if datalist.request.status_code != 200:
+        return None, 'status {}'.format(datalist.request.status_code)
+    return datalist.data, None
+
+
+async def fetch_index(token, targetids, data_types=DATA_TYPES, limit=8, verbose=True, session=None):
+    """
+    Awaitable pymmt.sync.fetch_index, fetching at most `limit` datalists
+    at once. Returns (entries, errors).
+    """
+    for data_type in data_types:
+        assert data_type in DATA_TYPES, 'data_type must either be raw or reduced'
+
+    requests = [(targetid, data_type) for targetid in targetids for data_type in data_types]
+    results = await gather(*(_fetch_one(token, targetid, data_type, session) for targetid, data_type in requests), limit=limit)
+    entries, errors = [], []
+    for (targetid, data_type), (data, error) in zip(requests, results):
+        if error is not None:
+            if verbose:
+                log('Datalist request error for target {} ({}): {}'.format(targetid, data_type, error), logging.ERROR)
+            errors.append({'targetid':targetid, 'data_type':data_type, 'error':error})
+            continue
+        entries.extend(index_entries(targetid, data_type, data))
+    return entries, errors
+
+
+async def _download_one(job, token, retries, backoff, session):
+    # as in pymmt.downloads, only a download cut off in transit is tried
+    # again here; error responses were retried by the request loop
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            im = AsyncImage(token=token, verbose=False, session=session)
+            if not await im.get(datafileid=job['datafileid'], filepath=job['filepath']):
+                return {'status':'failed', 'attempts':attempt, 'error':'download request error'}
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+            if attempt > retries:
+                return {'status':'failed', 'attempts':attempt, 'error':'{}: {}'.format(type(e).__name__, e)}
+            await asyncio.sleep(backoff * 2 ** (attempt - 1))
+            continue
+        except Exception as e:
+            return {'status':'failed', 'attempts':attempt, 'error':'{}: {}'.format(type(e).__name__, e)}
+
+        result = {'status':'downloaded', 'attempts':attempt, 'error':None}
+        if job.get('checksum'):
+            result['digest'] = file_digest(job['filepath'])
+        return result
+
+
+async def download_datafiles(jobs, token=None, workers=4, retries=2, backoff=1.0, progress=None, verbose=True, session=None):
+    """
+    Awaitable counterpart of pymmt.download_datafiles, running at most
+    `workers` downloads at once on the current event loop.
+    """
+    assert workers >= 1, 'workers must be at least 1'
+    start = datetime.now()
+    report = {'downloaded':[], 'skipped':[], 'failed':[], 'total':0, 'elapsed':0.0}
+    semaphore = asyncio.Semaphore(workers)
+
+    async def run(job):
+        async with semaphore:
+            if verbose:
+                log('Downloading: {}'.format(job['filepath']))
+            return dict(job, **(await _download_one(job, token, retries, backoff, session)))
+
+    jobs = list(jobs)
+    report['total'] = len(jobs)
+    pending = []
+    for job in jobs:
+        if os.path.exists(job['filepath']):
+            if verbose:
+                log('File \'{}\' already exists'.format(job['filepath']))
+            result = dict(job, status='skipped', attempts=0, error=None)
+            report['skipped'].append(result)
+            if progress is not None:
+                progress(len(report['skipped']), report['total'], result)
+        else:
+            pending.append(run(job))
+
+    done = len(report['skipped'])
+    for coro in asyncio.as_completed(pending):
+        result = await coro
+        report[result['status']].append(result)
+        done += 1
+        if verbose and result['status'] == 'failed':
+            log('Failed to download \'{}\': {}'.format(result['filepath'], result['error']), logging.ERROR)
+        if progress is not None:
+            progress(done, report['total'], result)
+
+    report['elapsed'] = (datetime.now() - start).total_seconds()
+    return report
@@ -0,0 +1,234 @@
+import csv, json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from .bulk import list_targets
+from .logs import log
+from .pymmt import Target
+from .ratelimit import TokenBucket
+from .spatial import SpatialIndex, record_position
+
+# CSV cells are read as strings; these fields are converted before validation
+CSV_INT_KEYS = ('instrumentid', 'priority', 'photometric', 'targetofopportunity', 'onevisitpernight', 'maskid',
+                'numberexposures', 'visits', 'exposuretime')
+CSV_FLOAT_KEYS = ('magnitude', 'pa', 'pm_ra', 'pm_dec', 'centralwavelength', 'ra_decimal', 'dec_decimal')
+DUPLICATE_ACTIONS = ('reject', 'merge', 'allow')
+
+
+def _convert_csv_row(row):
+    payload = {}
+    for key, value in row.items():
+        if key is None or value is None:
+            continue
+        key, value = key.strip().lower(), value.strip()
+        if value == '':
+            # leave the field out so that the validation defaults apply
+            continue
+        try:
+            if key in CSV_INT_KEYS:
+                value = int(value)
+            elif key in CSV_FLOAT_KEYS:
+                value = float(value)
+        except ValueError:
+            pass
+        payload[key] = value
+    return payload
+
+
+def _refused(status_code):
+    # a 4xx answer means the server rejected the target without creating it
+    return status_code is not None and 400 <= status_code < 500
+
+
+class TargetBatch():
+    """
+    Validate and submit many targets at once.
+
+    Every payload is validated up front (quietly) when it is added. post()
+    then submits the valid targets concurrently on `workers` threads, at no
+    more than `rate` requests per second when a rate is given. The outcome
+    of each target is kept in `results`, one dict per payload in input
+    order with the keys:
+
+        index, objectid, valid, errors, warnings, status, targetid,
+        status_code, error, duplicate_of, separation
+
+    where status is one of 'invalid', 'pending', 'posted', 'failed' or
+    'duplicate'.
+
+    post() can be called again to retry the failed targets. Those the
+    server refused with a 4xx status are posted again. Those that failed
+    with an exception or another status may have been created anyway
+    (e.g. a timeout after the server accepted the target), so they are
+    first looked up by objectid in the token's target list: a target
+    found there is marked 'posted' with its targetid, and one that cannot
+    be looked up stays 'failed'.
+
+    With a SpatialIndex of the existing targets as `index`, a target within
+    `radius` arcseconds of an indexed target, or of an earlier target of
+    the batch, is not posted: its status becomes 'duplicate' and
+    duplicate_of and separation (arcseconds) name the closest match. With
+    duplicates='merge' its targetid is also set to that of the match, with
+    'reject' it is left empty. Posted targets are added to the index.
+    """
+    def __init__(self, token=None, payloads=[], workers=8, rate=None, burst=None, index=None, radius=2.0,
+                 duplicates='reject'):
+        assert token is not None, 'Token cannot be None'
+        assert workers >= 1, 'workers must be at least 1'
+        assert duplicates in DUPLICATE_ACTIONS, 'duplicates must be one of {}'.format(', '.join(DUPLICATE_ACTIONS))
+        self.token = token
+        self.workers = workers
+        self.limiter = TokenBucket(rate, burst) if rate is not None else None
+        self.index = index
+        self.radius = radius
+        self.duplicates = duplicates
+        self.targets = []
+        self.results = []
+        self.extend(payloads)
+
+
+    @classmethod
+    def from_csv(cls, path, token=None, **kwargs):
+        with open(path, newline='') as f:
+            payloads = [_convert_csv_row(row) for row in csv.DictReader(f)]
+        return cls(token=token, payloads=payloads, **kwargs)
+
+
+    @classmethod
+    def from_jsonl(cls, path, token=None, **kwargs):
+        with open(path) as f:
+            payloads = [json.loads(line) for line in f if line.strip()]
+        return cls(token=token, payloads=payloads, **kwargs)
+
+
+    def add(self, payload):
+        target = Target(token=self.token, verbose=False, payload=payload, index=self.index)
+        self.targets.append(target)
+        self.results.append({
+            'index':len(self.results),
+            'objectid':target.__dict__.get('objectid'),
+            'valid':target.valid,
+            'errors':target.message['Errors'],
+            'warnings':target.message['Warnings'],
+            'status':'pending' if target.valid else 'invalid',
+            'targetid':None,
+            'status_code':None,
+            'error':None,
+            'duplicate_of':None,
+            'separation':None,
+        })
+        return target
+
+
+    def extend(self, payloads):
+        for payload in payloads:
+            self.add(payload)
+
+
+    def _post_one(self, index):
+        target, result = self.targets[index], self.results[index]
+        if self.limiter is not None:
+            self.limiter.acquire()
+        try:
+            r = target.post()
+        except Exception as e:
+            result.update(status='failed', status_code=None, error='{}: {}'.format(type(e).__name__, e))
+            return result
+
+        result['status_code'] = r.status_code
+        if r.status_code == 200:
+            result.update(status='posted', targetid=target.targetid)
+        else:
+            result.update(status='failed', error=r.text)
+        return result
+
+
+    def _reconcile(self, unknown):
+        """
+        Look up by objectid the failed targets that may have been created
+        anyway, and mark those found on the server as posted. Returns the
+        rows that are not on the server and can be posted again.
+        """
+        records, error = list_targets(self.token)
+        if error is not None:
+            log('Listing targets failed, not posting {} failed targets again: {}'.format(len(unknown), error),
+                logging.WARNING, error=error)
+            for i in unknown:
+                self.results[i]['error'] = 'lookup failed: {}'.format(error)
+            return []
+        listed = dict((r.get('objectid'), r) for r in records if r.get('objectid') is not None)
+        repost = []
+        for i in unknown:
+            target, result = self.targets[i], self.results[i]
+            record = listed.get(result['objectid'])
+            if record is None:
+                repost.append(i)
+                continue
+            target.hydrate(record)
+            result.update(status='posted', targetid=target.targetid, error=None)
+        return repost
+
+
+    def _screen(self, pending):
+        """
+        Mark the pending targets that duplicate an indexed target or an
+        earlier pending one. Returns the rows still to post and, for the
+        rows duplicating another row of the batch, the row they duplicate.
+        """
+        batch = SpatialIndex(cell_size=self.index.cell_size)
+        keep, primaries = [], {}
+        for i in pending:
+            target, result = self.targets[i], self.results[i]
+            # the decimal fields keep the payload's type (e.g. a string) when they agree with ra/dec
+            ra, dec = record_position(target.__dict__)
+            match = self.index.nearest(ra, dec, self.radius)
+            if match is not None:
+                # the index keeps target ids as strings
+                targetid = int(match[0]) if match[0].isdigit() else match[0]
+                result.update(status='duplicate', duplicate_of=targetid, separation=match[1])
+                if self.duplicates == 'merge':
+                    result['targetid'] = targetid
+                continue
+            match = batch.nearest(ra, dec, self.radius)
+            if match is not None:
+                primaries[i] = int(match[0])
+                result.update(status='duplicate', separation=match[1])
+                continue
+            batch.add(i, ra, dec)
+            keep.append(i)
+        return keep, primaries
+
+
+    def post(self):
+        """
+        Submit every valid target that has not been posted yet and return
+        the results table.
+        """
+        pending = [r['index'] for r in self.results if r['valid'] and (r['status'] == 'pending' or
+                   (r['status'] == 'failed' and _refused(r['status_code'])))]
+        unknown = [r['index'] for r in self.results if r['valid'] and r['status'] == 'failed' and not _refused(r['status_code'])]
+        if len(unknown):
+            pending = sorted(pending + self._reconcile(unknown))
+        primaries = {}
+        if self.index is not None and self.duplicates != 'allow':
+            pending, primaries = self._screen(pending)
+        if len(pending):
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(pending))) as pool:
+                list(pool.map(self._post_one, pending))
+
+        for i, primary in primaries.items():
+            result, posted = self.results[i], self.results[primary]
+            if posted['status'] != 'posted':
+                # screened again against the index on the next post()
+                result.update(status='pending', separation=None)
+                continue
+            result['duplicate_of'] = posted['targetid']
+            if self.duplicates == 'merge':
+                result['targetid'] = posted['targetid']
+        return self.results
+
+
+    def summary(self):
+        counts = dict((status, 0) for status in ['invalid', 'pending', 'posted', 'failed', 'duplicate'])
+        for r in self.results:
+            counts[r['status']] += 1
+        return counts
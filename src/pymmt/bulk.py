@@ -0,0 +1,139 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from . import MMT_JSON_KEY_SET
+from .logs import log
+
+# keys under which a paginated listing may return its targets
+PAGE_KEYS = ('results', 'targets', 'data')
+
+
+def _page(data):
+    """
+    Returns (records, more) for a page of the target listing: a plain list
+    of records, or a dict with the records under one of PAGE_KEYS and an
+    optional 'next' link. records is None for anything else.
+    """
+    if isinstance(data, list):
+        return data, False
+    if isinstance(data, dict):
+        for key in PAGE_KEYS:
+            if isinstance(data.get(key), list):
+                return data[key], bool(data.get('next'))
+    return None, False
+
+
+def list_targets(token=None, page_size=500, max_pages=None, **filters):
+    """
+    List every target of the token with catalogTarget, page by page.
+
+    Each request asks for `page_size` targets of page 1, 2, ... with any
+    `filters` (e.g. a program) passed to the server alongside the token.
+    Pages are requested until one is short, has no 'next' link or only
+    repeats targets already listed, so a server that ignores pagination
+    and returns everything at once costs one extra request.
+
+    Returns (records, error): the target records in listing order, and
+    None or a description of the request that failed.
+    """
+    from .pymmt import api
+
+    a = api('catalogTarget', token)
+    records, seen, page = [], set(), 1
+    while True:
+        body = dict(filters, token=a.token, page=page, per_page=page_size)
+        try:
+            request = a._get({'urlparams':{}, 'd_json':body})
+            if request.status_code != 200:
+                return records, 'page {}: {} {}'.format(page, request.status_code, request.text[:200])
+            items, more = _page(request.json())
+        except Exception as e:
+            return records, 'page {}: {}: {}'.format(page, type(e).__name__, e)
+        if items is None:
+            return records, 'page {}: unexpected response'.format(page)
+
+        new = [r for r in items if str(r.get('id')) not in seen]
+        seen.update(str(r.get('id')) for r in new)
+        records.extend(new)
+        if not len(new) or not (more or len(items) >= page_size):
+            return records, None
+        if max_pages is not None and page >= max_pages:
+            return records, None
+        page += 1
+
+
+def _record(target):
+    return dict((key, value) for key, value in target.__dict__.items() if key in MMT_JSON_KEY_SET)
+
+
+def _get_one(target):
+    try:
+        target.get()
+    except Exception as e:
+        return '{}: {}'.format(type(e).__name__, e)
+    if target.request is None or target.request.status_code != 200:
+        return 'status {}'.format(getattr(target.request, 'status_code', None))
+    return None
+
+
+def refresh_targets(targets, token=None, workers=8, bulk=True, page_size=500, verbose=True):
+    """
+    Bring many Target objects up to date with the server in one pass.
+
+    With bulk=True the token's targets are listed with list_targets, a
+    request per `page_size` targets, and every target found in the listing
+    is hydrated from it. Targets missing from the listing, or all of them
+    when the listing is not available or bulk=False, are fetched with
+    Target.get() concurrently on `workers` threads.
+
+    Returns a report dict with:
+
+        changed    one dict per target whose server fields changed since
+                   it was last loaded, with 'target', 'targetid' and the
+                   sorted list of changed 'fields'
+        unchanged  the targets that did not change
+        failed     one dict per target that could not be fetched, with
+                   'target', 'targetid' and 'error'
+        listed     whether the bulk listing was used
+        fetched    the number of targets fetched one by one
+    """
+    assert workers >= 1, 'workers must be at least 1'
+    targets = list(targets)
+    report = {'changed':[], 'unchanged':[], 'failed':[], 'listed':False, 'fetched':0}
+    if not len(targets):
+        return report
+    before = [_record(t) for t in targets]
+
+    remaining = targets
+    if bulk:
+        records, error = list_targets(token if token is not None else targets[0].token, page_size=page_size)
+        if error is None:
+            report['listed'] = True
+            listed = dict((str(r.get('id')), r) for r in records)
+            remaining = []
+            for t in targets:
+                record = listed.get(str(t.__dict__.get('id')))
+                if record is None:
+                    remaining.append(t)
+                else:
+                    t.hydrate(record)
+        elif verbose:
+            log('Listing targets failed, fetching them one by one: {}'.format(error), logging.WARNING, error=error)
+
+    errors = {}
+    if len(remaining):
+        report['fetched'] = len(remaining)
+        with ThreadPoolExecutor(max_workers=min(workers, len(remaining))) as pool:
+            errors = dict((id(t), error) for t, error in zip(remaining, pool.map(_get_one, remaining)))
+
+    for t, old in zip(targets, before):
+        targetid = t.__dict__.get('id')
+        if errors.get(id(t)) is not None:
+            report['failed'].append({'target':t, 'targetid':targetid, 'error':errors[id(t)]})
+            continue
+        new = _record(t)
+        fields = sorted(key for key in set(old) | set(new) if old.get(key) != new.get(key))
+        if len(fields):
+            report['changed'].append({'target':t, 'targetid':targetid, 'fields':fields})
+        else:
+            report['unchanged'].append(t)
+    return report
@@ -0,0 +1,142 @@
+import os, json, threading, time
+from pathlib import Path
+from . import LOCAL_TARGET_KEYS
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'pymmt', 'targets.sqlite')
+# seconds between the checks for records older than max_age
+EVICT_INTERVAL = 60
+
+
+class TargetCache():
+    """
+    On-disk cache of target records, keyed by target id.
+
+    A record fetched less than `ttl` seconds ago is fresh and can hydrate a
+    Target without a network request. After that the record is refetched,
+    but the stored copy is only replaced when the server's 'modified'
+    timestamp changed. The local bookkeeping fields in LOCAL_TARGET_KEYS
+    (downloaded, partial_download, local_save, ...) are stored alongside.
+
+    Records that have not been used for `max_age` seconds are dropped, and
+    the least recently used records are dropped once there are more than
+    `max_entries`. Both are checked when an insert takes the cache past
+    max_entries and otherwise at most every EVICT_INTERVAL seconds, not on
+    every insert.
+    """
+    def __init__(self, path=None, ttl=300, max_age=7*24*3600, max_entries=10000):
+        import sqlite3
+
+        self.path = path if path is not None else os.getenv('PYMMT_CACHE', DEFAULT_CACHE_PATH)
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+
+        if self.path != ':memory:':
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        with self.lock:
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('''CREATE TABLE IF NOT EXISTS targets (
+                targetid TEXT PRIMARY KEY,
+                record TEXT NOT NULL,
+                local TEXT NOT NULL,
+                modified TEXT,
+                fetched REAL NOT NULL,
+                accessed REAL NOT NULL
+            )''')
+            self.db.execute('CREATE INDEX IF NOT EXISTS targets_accessed ON targets (accessed)')
+        self.evict()
+
+
+    def get(self, targetid):
+        """
+        Returns (record, local, fresh) for a cached target, or None.
+        """
+        now = time.time()
+        with self.lock:
+            row = self.db.execute('SELECT record, local, fetched FROM targets WHERE targetid = ?',
+                                  (str(targetid),)).fetchone()
+            if row is None:
+                return None
+            self.db.execute('UPDATE targets SET accessed = ? WHERE targetid = ?', (now, str(targetid)))
+        record, local, fetched = row
+        return json.loads(record), json.loads(local), now - fetched < self.ttl
+
+
+    def put(self, targetid, record, local=None, force=False):
+        """
+        Store a freshly fetched record. Returns True if the record is new or
+        its 'modified' timestamp changed, False if only its age was reset.
+        With force=True the stored record is always replaced.
+        """
+        now = time.time()
+        modified = record.get('modified')
+        with self.lock:
+            row = self.db.execute('SELECT modified, local FROM targets WHERE targetid = ?',
+                                  (str(targetid),)).fetchone()
+            if local is None:
+                local = json.loads(row[1]) if row is not None else {}
+            if not force and row is not None and modified is not None and row[0] == str(modified):
+                self.db.execute('UPDATE targets SET local = ?, fetched = ?, accessed = ? WHERE targetid = ?',
+                                (json.dumps(local, default=str), now, now, str(targetid)))
+                return False
+            self.db.execute('INSERT OR REPLACE INTO targets VALUES (?, ?, ?, ?, ?, ?)',
+                            (str(targetid), json.dumps(record, default=str), json.dumps(local, default=str),
+                             str(modified) if modified is not None else None, now, now))
+            if row is None:
+                self.entries += 1
+        if self.entries > self.max_entries or now - self.evicted >= EVICT_INTERVAL:
+            self.evict()
+        return True
+
+
+    def records(self):
+        """
+        Yields (targetid, record) for every cached target, fresh or not.
+        """
+        with self.lock:
+            rows = self.db.execute('SELECT targetid, record FROM targets').fetchall()
+        for targetid, record in rows:
+            yield targetid, json.loads(record)
+
+
+    def put_local(self, targetid, local):
+        with self.lock:
+            self.db.execute('UPDATE targets SET local = ? WHERE targetid = ?', (json.dumps(local, default=str), str(targetid)))
+
+
+    def invalidate(self, targetid):
+        with self.lock:
+            self.entries -= self.db.execute('DELETE FROM targets WHERE targetid = ?', (str(targetid),)).rowcount
+
+
+    def clear(self):
+        with self.lock:
+            self.db.execute('DELETE FROM targets')
+            self.entries = 0
+
+
+    def evict(self):
+        now = time.time()
+        with self.lock:
+            self.db.execute('DELETE FROM targets WHERE accessed < ?', (now - self.max_age,))
+            self.db.execute('''DELETE FROM targets WHERE targetid IN (
+                SELECT targetid FROM targets ORDER BY accessed DESC LIMIT -1 OFFSET ?)''', (self.max_entries,))
+            # recounted here, since other processes may share the file
+            self.entries = self.db.execute('SELECT COUNT(*) FROM targets').fetchone()[0]
+            self.evicted = now
+
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM targets').fetchone()[0]
+
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+def local_fields(target):
+    return dict((key, target.__dict__[key]) for key in LOCAL_TARGET_KEYS if key in target.__dict__)
@@ -0,0 +1,296 @@
+import numpy as np
+from .coords import parse_ra, parse_dec
+from .instruments import all_instruments
+from .instruments.rules import _member
+
+
+class CatalogValidation():
+    """
+    Result of validate_catalog.
+
+    valid is a boolean array with one entry per row. errors and warnings map
+    a field name to a boolean array marking the rows with an error or
+    warning for that field, including the instrument-specific fields.
+    ra_decimal and dec_decimal hold the coordinates in degrees, NaN where
+    they are invalid.
+    """
+    def __init__(self, n):
+        self.n = n
+        self.ra_decimal = np.full(n, np.nan)
+        self.dec_decimal = np.full(n, np.nan)
+        self.errors = {}
+        self.warnings = {}
+
+    def _flag(self, kind, field, mask):
+        masks = self.errors if kind == 'error' else self.warnings
+        if field in masks:
+            masks[field] |= mask
+        else:
+            masks[field] = mask.copy()
+
+    @property
+    def error_mask(self):
+        mask = np.zeros(self.n, dtype=bool)
+        for m in self.errors.values():
+            mask |= m
+        return mask
+
+    @property
+    def valid(self):
+        return ~self.error_mask
+
+    def row_errors(self, i):
+        return [field for field, m in self.errors.items() if m[i]]
+
+    def row_warnings(self, i):
+        return [field for field, m in self.warnings.items() if m[i]]
+
+
+def _columns(table):
+    # structured array, astropy-style table or mapping of columns
+    if getattr(getattr(table, 'dtype', None), 'names', None):
+        names = table.dtype.names
+    elif hasattr(table, 'colnames'):
+        names = table.colnames
+    else:
+        names = list(table.keys())
+    return dict((str(name).lower(), table[name]) for name in names)
+
+
+def _column(columns, name, n):
+    """
+    Return (present, values) for a column. Cells that are None or masked
+    count as missing, like a key that is absent from a Target payload.
+    """
+    if name not in columns:
+        return np.zeros(n, dtype=bool), np.empty(n, dtype=object)
+    col = columns[name]
+    mask = np.ma.getmaskarray(col) if np.ma.isMaskedArray(col) else None
+    values = np.asarray(np.ma.getdata(col) if mask is not None else col)
+    if values.dtype.kind == 'O':
+        present = np.fromiter((v is not None for v in values), dtype=bool, count=n)
+    else:
+        present = np.ones(n, dtype=bool)
+    if mask is not None:
+        present &= ~mask
+    return present, values
+
+
+def _as_float(values, present):
+    """
+    Vectorized isFloat: returns (ok, floats) for the present cells.
+    """
+    n = len(values)
+    if values.dtype.kind in 'biuf':
+        return present.copy(), values.astype(float)
+    if values.dtype.kind in 'US':
+        try:
+            return present.copy(), values.astype(float)
+        except ValueError:
+            pass
+    ok, floats = np.zeros(n, dtype=bool), np.full(n, np.nan)
+    for i in np.flatnonzero(present):
+        try:
+            floats[i] = float(values[i])
+            ok[i] = True
+        except (TypeError, ValueError):
+            pass
+    return ok, floats
+
+
+def _as_int(values, present):
+    """
+    Vectorized isInt: returns (ok, ints) for the present cells. Floats are
+    truncated like int() does; nan and inf are rejected.
+    """
+    n = len(values)
+    if values.dtype.kind in 'biu':
+        return present.copy(), values.astype(np.int64)
+    if values.dtype.kind == 'f':
+        ok = present & np.isfinite(values)
+        return ok, np.trunc(np.where(ok, values, 0)).astype(np.int64)
+    if values.dtype.kind in 'US':
+        try:
+            return present.copy(), values.astype(np.int64)
+        except (ValueError, OverflowError):
+            pass
+    ok, ints = np.zeros(n, dtype=bool), np.zeros(n, dtype=np.int64)
+    for i in np.flatnonzero(present):
+        try:
+            ints[i] = int(values[i])
+            ok[i] = True
+        except (TypeError, ValueError, OverflowError):
+            pass
+    return ok, ints
+
+
+def _valid_objectid(values, present):
+    ok = np.zeros(len(values), dtype=bool)
+    for i in np.flatnonzero(present):
+        v = values[i]
+        if isinstance(v, str) and 2 <= len(v) <= 50:
+            ok[i] = all(c.isalnum() or c.isspace() for c in v)
+    return ok
+
+
+def _in(values, present, options):
+    if values.dtype.kind in 'biuf':
+        return present & np.isin(values, [o for o in options if not isinstance(o, str)])
+    if values.dtype.kind in 'US':
+        return present & np.isin(values, [o for o in options if isinstance(o, str)])
+    return present & np.fromiter((_member(v, options) for v in values), dtype=bool, count=len(values))
+
+
+def _validate_instrument(result, instrument, column, rows):
+    """
+    Apply a compiled instrument rule table to the selected rows, one rule
+    at a time across all of them.
+    """
+    present, obs = column('observationtype')
+    result._flag('error', 'observationtype', rows & ~present)
+    rows = rows & present
+    result._flag('error', 'observationtype', rows & ~_in(obs, rows, instrument.observationtypes))
+
+    for rule in instrument.rules:
+        if 'set' in rule:
+            continue
+        field = rule['field']
+        active = rows
+        if rule['when'] is not None:
+            active = active & _in(obs, rows, rule['when'])
+        if rule['requires'] is not None:
+            active = active & column(rule['requires'])[0]
+
+        present, values = column(field)
+        if rule['missing'] is not None:
+            result._flag(rule['missing'][0], field, active & ~present)
+
+        check = active & present
+        ok, floats = _as_float(values, check)
+        if rule['float'] is not None:
+            result._flag(rule['float'][0], field, check & ~ok)
+            check = check & ok
+
+        if rule['choices'] is not None:
+            result._flag(rule['invalid'][0], field, check & ~_in(values, check, rule['choices']))
+
+        if rule['intervals'] is not None:
+            keypresent, keys = column(rule['intervals']['key'])
+            # ranges are registered under both the int and str key, group them back
+            groups = {}
+            for keyvalue, entry in rule['intervals']['ranges'].items():
+                groups.setdefault(id(entry), (entry, []))[1].append(keyvalue)
+            for (starts, ends, (severity, message)), keyvalues in groups.values():
+                selected = check & _in(keys, check & keypresent, keyvalues)
+                i = np.searchsorted(starts, floats, side='right') - 1
+                with np.errstate(invalid='ignore'):
+                    inside = (i >= 0) & (floats <= np.asarray(ends)[np.clip(i, 0, None)])
+                result._flag(severity, field, selected & ~inside)
+
+
+def validate_catalog(table):
+    """
+    Validate a whole catalog of targets at once.
+
+    table is a mapping of column name to a sequence of values, a NumPy
+    structured array or an astropy-style table with one row per target.
+    Missing values are given as None (or masked entries) and are treated
+    like a field that is left out of a Target payload. Each row gets the
+    same verdict as Target.validate would give the equivalent payload.
+
+    Returns a CatalogValidation.
+    """
+    columns = _columns(table)
+    lengths = set(len(c) for c in columns.values())
+    assert len(lengths) <= 1, 'All catalog columns must have the same length'
+    n = lengths.pop() if len(lengths) else 0
+    result = CatalogValidation(n)
+
+    cache = {}
+
+    def column(name):
+        if name not in cache:
+            cache[name] = _column(columns, name, n)
+        return cache[name]
+
+    for name, parse in [('ra', parse_ra), ('dec', parse_dec)]:
+        # like Target.validate, the decimal field stands in for a missing one
+        present, values = column(name)
+        decimal_present, decimal_values = column(name + '_decimal')
+        degrees = parse(np.where(present, values.astype(object), decimal_values.astype(object)))
+        setattr(result, name + '_decimal', degrees)
+        result._flag('error', name, ~np.isfinite(degrees))
+
+    present, values = column('epoch')
+    result._flag('warning', 'epoch', ~present)
+
+    present, values = column('exposuretime')
+    ok, ints = _as_int(values, present)
+    result._flag('error', 'exposuretime', ~(ok & (ints > 0)))
+
+    present, values = column('magnitude')
+    ok, floats = _as_float(values, present)
+    result._flag('error', 'magnitude', ~ok)
+
+    present, values = column('maskid')
+    ok, ints = _as_int(values, present)
+    result._flag('error', 'maskid', ~ok)
+
+    for name in ['numberexposures', 'visits']:
+        present, values = column(name)
+        ok, ints = _as_int(values, present)
+        result._flag('error', name, present & ~ok)
+        result._flag('warning', name, ~present)
+
+    present, values = column('objectid')
+    result._flag('error', 'objectid', ~_valid_objectid(values, present))
+
+    present, values = column('pa')
+    ok, floats = _as_float(values, present)
+    with np.errstate(invalid='ignore'):
+        result._flag('error', 'pa', present & ~(ok & (floats >= -360) & (floats <= 360)))
+    result._flag('warning', 'pa', ~present)
+
+    for name in ['pm_dec', 'pm_ra']:
+        present, values = column(name)
+        ok, floats = _as_float(values, present)
+        result._flag('error', name, present & ~ok)
+        result._flag('warning', name, ~present)
+
+    present, values = column('priority')
+    ok, ints = _as_int(values, present)
+    result._flag('error', 'priority', present & ~(ok & _in(values, present, (1, 2, 3, '1', '2', '3'))))
+    result._flag('warning', 'priority', ~present)
+
+    for name in ['photometric', 'targetofopportunity']:
+        present, values = column(name)
+        ok, ints = _as_int(values, present)
+        result._flag('error', name, present & ~ok)
+
+    present, values = column('instrumentid')
+    result._flag('error', 'instrumentid', ~present)
+    instruments = dict((id(rules), rules) for rules in all_instruments().values())
+    for rules in instruments.values():
+        rows = _in(values, present, (int(rules.instrumentid), str(rules.instrumentid)))
+        if rows.any():
+            _validate_instrument(result, rules, column, rows)
+
+    return result
+
+
+def validate_records(records):
+    """
+    validate_catalog for a list of payload dicts. Keys that a payload does
+    not have are treated as missing for that row.
+    """
+    names = []
+    for r in records:
+        names.extend(str(k).lower() for k in r.keys() if str(k).lower() not in names)
+    lowered = [dict((str(k).lower(), v) for k, v in r.items()) for r in records]
+    columns = {}
+    for name in names:
+        col = np.empty(len(records), dtype=object)
+        for i, r in enumerate(lowered):
+            col[i] = r.get(name)
+        columns[name] = col
+    return validate_catalog(columns)
@@ -0,0 +1,320 @@
+"""
+Command-line interface to PyMMT.
+
+    pymmt submit targets.csv            submit targets from a CSV or JSONL file
+    pymmt sync 1234 1235 --dir data     download the data of targets
+    pymmt listen 1234 1235              download exposures as they are taken
+    pymmt listen --state-dir state --watch-file ids.txt   ... as a restartable daemon
+    pymmt schedule --instrument binospec
+
+The API token is read from --token or the MMT_API_TOKEN environment
+variable. With --json the result is written to stdout as json (one object,
+or one line per event for listen) and log messages go to stderr as json
+lines.
+"""
+import os, sys, json, argparse
+
+# exit codes
+EXIT_OK = 0         # everything succeeded
+EXIT_FAILED = 1     # nothing succeeded, or the command could not run
+EXIT_USAGE = 2      # bad arguments (also used by argparse)
+EXIT_PARTIAL = 3    # some items succeeded and some failed
+
+INSTRUMENT_NAMES = {'binospec':16, 'mmirs':15}
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'pymmt')
+
+
+class CommandError(Exception):
+    pass
+
+
+def _exit_code(succeeded, failed):
+    if not failed:
+        return EXIT_OK
+    return EXIT_PARTIAL if succeeded else EXIT_FAILED
+
+
+def _output(args, result, text):
+    if args.json:
+        json.dump(result, sys.stdout, default=str)
+        sys.stdout.write('\n')
+    else:
+        print(text)
+    sys.stdout.flush()
+
+
+def _read_ids(args, required=True):
+    ids = list(args.targetids)
+    if args.ids_file is not None:
+        f = sys.stdin if args.ids_file == '-' else open(args.ids_file)
+        with f:
+            ids.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    for targetid in ids:
+        if not str(targetid).isdigit():
+            raise CommandError('target ids must be integers: {!r}'.format(targetid))
+    if required and not len(ids):
+        raise CommandError('no target ids given')
+    return [int(targetid) for targetid in dict.fromkeys(ids)]
+
+
+def _load_targets(args, ids):
+    """
+    Fetch the targets concurrently. Returns the loaded targets and the ids
+    that could not be loaded.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from .pymmt import Target
+
+    def load(targetid):
+        try:
+            return Target(token=args.token, verbose=args.verbose, payload={'targetid':targetid})
+        except Exception:
+            return None
+
+    targets, missing = [], []
+    with ThreadPoolExecutor(max_workers=max(1, min(args.workers, len(ids)))) as pool:
+        for targetid, target in zip(ids, pool.map(load, ids)):
+            if target is None or 'objectid' not in target.__dict__:
+                missing.append(targetid)
+            else:
+                if args.dir is not None:
+                    target.parentdir = args.dir
+                targets.append(target)
+    return targets, missing
+
+
+def cmd_submit(args):
+    from .batch import TargetBatch
+
+    fmt = args.format
+    if fmt is None:
+        fmt = 'jsonl' if args.file.endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+    load = TargetBatch.from_jsonl if fmt == 'jsonl' else TargetBatch.from_csv
+    batch = load(args.file, token=args.token, workers=args.workers, rate=args.rate)
+    results = batch.results if args.dry_run else batch.post()
+    summary = batch.summary()
+
+    lines = ['{index:>5} {status:<8} {objectid} {detail}'.format(
+                detail=r['targetid'] if r['status'] == 'posted' else '; '.join(r['errors']) or r['error'] or '', **r)
+             for r in results]
+    lines.append(', '.join('{} {}'.format(count, status) for status, count in summary.items()))
+    _output(args, {'summary':summary, 'results':results}, '\n'.join(lines))
+
+    succeeded = summary['pending'] if args.dry_run else summary['posted']
+    return _exit_code(succeeded, summary['invalid'] + summary['failed'])
+
+
+def cmd_sync(args):
+    from .sync import sync_targets
+
+    ids = _read_ids(args)
+    targets, missing = _load_targets(args, ids)
+    report = {'downloaded':[], 'skipped':[], 'failed':[], 'index':[], 'errors':[], 'total':0, 'elapsed':0.0}
+    if len(targets):
+        report = sync_targets(targets, data_types=args.data_types, file_types=args.file_types, workers=args.workers,
+                              retries=args.retries, refresh=args.refresh, token=args.token, verbose=args.verbose)
+
+    failed = set(missing) | set(r['targetid'] for r in report['failed']) | set(e['targetid'] for e in report['errors'])
+    result = {
+        'targets':dict((t.id, {
+            'objectid':t.objectid,
+            'downloaded':len(t.download_report['downloaded']),
+            'skipped':len(t.download_report['skipped']),
+            'failed':len(t.download_report['failed']),
+            'complete':not t.partial_download,
+        }) for t in targets),
+        'missing':missing,
+        'failed':[dict((k, r[k]) for k in ['targetid', 'datafileid', 'filepath', 'error']) for r in report['failed']],
+        'errors':report['errors'],
+        'downloaded':len(report['downloaded']),
+        'skipped':len(report['skipped']),
+        'elapsed':report['elapsed'],
+    }
+    lines = ['{:>8} {:<24} {downloaded:>4} downloaded {skipped:>4} skipped {failed:>4} failed'.format(targetid, t['objectid'], **t)
+             for targetid, t in result['targets'].items()]
+    lines.extend('{:>8} could not be loaded'.format(targetid) for targetid in missing)
+    lines.extend('{:>8} datalist error: {}'.format(e['targetid'], e['error']) for e in report['errors'])
+    _output(args, result, '\n'.join(lines))
+    return _exit_code(len(set(ids) - failed), len(failed))
+
+
+def cmd_listen(args):
+    import signal
+    from .pymmt import Listener
+    from .daemon import ListenerDaemon
+
+    daemon = args.state_dir is not None
+    if not daemon and (args.watch_file is not None or args.queue_dir is not None):
+        raise CommandError('--watch-file and --queue-dir need --state-dir')
+    ids = _read_ids(args, required=not daemon)
+
+    if daemon:
+        # targets are fetched by the daemon itself, so that they can be
+        # restored from its checkpoint and added or removed at runtime
+        missing = []
+        listener = ListenerDaemon(token=args.token, state_dir=args.state_dir, targetids=ids, watch_file=args.watch_file,
+                                  queue_dir=args.queue_dir, parentdir=args.dir, workers=args.workers,
+                                  min_interval=args.min_interval, max_interval=args.max_interval,
+                                  exit_when_done=args.exit_when_done, verbose=args.verbose)
+    else:
+        targets, missing = _load_targets(args, ids)
+        if not len(targets):
+            _output(args, {'event':'error', 'missing':missing}, 'No target could be loaded: {}'.format(missing))
+            return EXIT_FAILED
+        listener = Listener(token=args.token, targetids=[], workers=args.workers, min_interval=args.min_interval,
+                            max_interval=args.max_interval, verbose=args.verbose, targets=targets)
+    errors = []
+
+    def event(name, target, **fields):
+        entry = dict({'event':name, 'targetid':target.id, 'objectid':target.objectid}, **fields)
+        text = '{:<14} {} {}'.format(name, target.id, ' '.join('{}={}'.format(k, v) for k, v in fields.items()))
+        _output(args, entry, text)
+
+    def on_error(t, e):
+        errors.append(t.id)
+        event('error', t, error='{}: {}'.format(type(e).__name__, e))
+
+    listener.add_hook('changed', lambda t: event('changed', t, percentcompleted=t.__dict__.get('percentcompleted')))
+    listener.add_hook('new_datafiles', lambda t, new: event('new_datafiles', t, files=[r['filepath'] for r in new]))
+    listener.add_hook('complete', lambda t: event('complete', t))
+    listener.add_hook('error', on_error)
+
+    stopped = []
+    def stop(signum, frame):
+        stopped.append(signum)
+        listener.stop()
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    if daemon:
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, listener._signal)
+        listener.run(Force=args.force, handle_signals=False)
+    else:
+        listener.listen(Force=args.force)
+    done = [t.id for t in listener.targets if listener.state[t.id]['done']]
+    if stopped:
+        return EXIT_OK if not missing else EXIT_PARTIAL
+    return _exit_code(len(done), len(missing) + len(set(errors) - set(done)))
+
+
+def cmd_schedule(args):
+    from datetime import datetime
+    from .pymmt import Instruments
+    from .schedule import SCHEDULE_CACHE
+
+    if not args.no_cache:
+        SCHEDULE_CACHE.path = args.cache_dir
+    SCHEDULE_CACHE.ttl = args.ttl
+
+    instrumentid = None
+    if args.instrument is not None:
+        instrumentid = INSTRUMENT_NAMES.get(args.instrument.lower(), args.instrument)
+        if not str(instrumentid).isdigit():
+            raise CommandError('unknown instrument {!r}'.format(args.instrument))
+        instrumentid = int(instrumentid)
+    date = datetime.fromisoformat(args.date) if args.date is not None else None
+
+    schedule = Instruments(token=args.token, verbose=False).get_schedule(refresh=args.refresh)
+    if args.available:
+        if instrumentid is None:
+            raise CommandError('--available needs --instrument')
+        when = date if date is not None else datetime.now()
+        current = schedule.at(when, instrumentid)
+        upcoming = schedule.next_run(instrumentid, when)
+        result = {'instrumentid':instrumentid, 'date':when, 'available':len(current) > 0, 'run':upcoming}
+        text = '{} {} at {}{}'.format(
+            args.instrument, 'is available' if result['available'] else 'is not available', when,
+            '' if upcoming is None else ' (run {} from {} to {})'.format(upcoming['name'], upcoming['start'], upcoming['end']))
+        _output(args, result, text)
+        return EXIT_OK if result['available'] else EXIT_FAILED
+
+    if args.all:
+        runs = schedule.select(getAll=True)
+        if instrumentid is not None:
+            runs = [r for r in runs if int(r['instrumentid']) == instrumentid]
+    elif date is None and instrumentid is None:
+        runs = schedule.select(date=datetime.now())
+    else:
+        runs = schedule.select(date=date, instrumentid=instrumentid)
+    _output(args, {'runs':runs}, '\n'.join('{instrumentid:>3} {name:<24} {start} {end}'.format(**r) for r in runs))
+    return EXIT_OK
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='pymmt', description='Submit targets to and fetch data from the MMT scheduler.')
+    parser.add_argument('--token', default=os.getenv('MMT_API_TOKEN'), help='API token (default: $MMT_API_TOKEN)')
+    parser.add_argument('--json', action='store_true', help='write results as json to stdout and logs as json to stderr')
+    parser.add_argument('-v', '--verbose', action='store_true', help='report progress')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    submit = commands.add_parser('submit', help='validate and submit targets from a CSV or JSONL file')
+    submit.add_argument('file')
+    submit.add_argument('--format', choices=['csv', 'jsonl'], help='default: from the file extension')
+    submit.add_argument('--workers', type=int, default=8)
+    submit.add_argument('--rate', type=float, help='at most this many submissions per second')
+    submit.add_argument('--dry-run', action='store_true', help='only validate')
+    submit.set_defaults(func=cmd_submit)
+
+    def add_targets(sub):
+        sub.add_argument('targetids', nargs='*', help='target ids')
+        sub.add_argument('--ids-file', help='file with one target id per line, - for stdin')
+        sub.add_argument('--dir', help='directory the data/ tree is written to (default: current directory)')
+        sub.add_argument('--workers', type=int, default=8)
+
+    sync = commands.add_parser('sync', help='download the data of targets')
+    add_targets(sync)
+    sync.add_argument('--data-types', nargs='+', choices=['raw', 'reduced'], default=['raw', 'reduced'])
+    sync.add_argument('--file-types', nargs='+', help='only datafiles of these types')
+    sync.add_argument('--retries', type=int, default=2)
+    sync.add_argument('--refresh', action='store_true', help='check the datalists even of unchanged targets')
+    sync.set_defaults(func=cmd_sync)
+
+    listen = commands.add_parser('listen', help='download exposures of targets as they are taken')
+    add_targets(listen)
+    listen.add_argument('--min-interval', type=float, default=60)
+    listen.add_argument('--max-interval', type=float, default=1800)
+    listen.add_argument('--force', action='store_true', help='check for exposures on every poll')
+    listen.add_argument('--state-dir', help='run as a daemon that checkpoints its state here and resumes from it')
+    listen.add_argument('--watch-file', help='daemon: file of target ids to watch, re-read when it changes')
+    listen.add_argument('--queue-dir', help="daemon: directory of files with 'add <id>' / 'remove <id>' lines")
+    listen.add_argument('--exit-when-done', action='store_true',
+                        help='daemon: exit once every target is complete instead of waiting for new ones')
+    listen.set_defaults(func=cmd_listen)
+
+    schedule = commands.add_parser('schedule', help='show the published instrument schedule')
+    schedule.add_argument('--instrument', help='binospec, mmirs or an instrument id')
+    schedule.add_argument('--date', help='ISO date (default: now)')
+    schedule.add_argument('--all', action='store_true', help='every published run')
+    schedule.add_argument('--available', action='store_true',
+                          help='exit 0 if the instrument is on the telescope at the date, 1 if not')
+    schedule.add_argument('--refresh', action='store_true', help='ignore the cached schedule')
+    schedule.add_argument('--ttl', type=float, default=3600, help='seconds the cached schedule is used')
+    schedule.add_argument('--cache-dir', default=os.getenv('PYMMT_CACHE_DIR', DEFAULT_CACHE_DIR))
+    schedule.add_argument('--no-cache', action='store_true', help='do not keep the schedule on disk')
+    schedule.set_defaults(func=cmd_schedule)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.token is None:
+        parser.error('an API token is needed: pass --token or set MMT_API_TOKEN')
+
+    from .logs import configure_logging
+    configure_logging('structured' if args.json else 'print')
+    try:
+        return args.func(args)
+    except (CommandError, AssertionError, OSError, ValueError) as e:
+        if args.json:
+            _output(args, {'error':str(e)}, '')
+        else:
+            print('pymmt: error: {}'.format(e), file=sys.stderr)
+        return EXIT_USAGE if isinstance(e, CommandError) else EXIT_FAILED
+    finally:
+        configure_logging('print')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
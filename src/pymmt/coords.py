@@ -0,0 +1,329 @@
+import re
+
+# ra is hh:mm:ss[.s] and dec [+/-]dd:mm:ss[.s], with two digits per field that
+# are range checked after matching; the seconds may end with a bare '.'.
+# Values without ':' are decimal degrees.
+SEXAGESIMAL = re.compile(r'([+-]?)([0-9]{2}):([0-9]{2}):([0-9]{2}(?:\.[0-9]*)?)')
+# longest coordinate string considered by the array parser
+MAX_COORD_LENGTH = 32
+MAS_TO_DEG = 1.0 / 3.6e6
+# decimal coordinates this close (degrees) to the sexagesimal ones are kept
+# as given, e.g. as rounded by the server
+DECIMAL_TOLERANCE = 1e-6
+
+
+def _decimal(value):
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(value.strip() if isinstance(value, str) else value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _sexagesimal(value, signed):
+    match = SEXAGESIMAL.fullmatch(value.strip())
+    if match is None or (match.group(1) and not signed):
+        return None
+    degrees, minutes, seconds = int(match.group(2)), int(match.group(3)), float(match.group(4))
+    if minutes >= 60 or seconds >= 60:
+        return None
+    sign = -1.0 if match.group(1) == '-' else 1.0
+    return sign, degrees + minutes / 60 + seconds / 3600
+
+
+def ra_to_degrees(value):
+    """
+    Right ascension in degrees from 'hh:mm:ss.s' (hours below 24) or from
+    decimal degrees in [0, 360). None if the value is not a valid ra.
+    """
+    if isinstance(value, bytes):
+        value = value.decode('ascii', 'replace')
+    if isinstance(value, str) and ':' in value:
+        parsed = _sexagesimal(value, signed=False)
+        if parsed is None or parsed[1] >= 24:
+            return None
+        return parsed[1] * 15
+    degrees = _decimal(value)
+    if degrees is None or not 0 <= degrees < 360:
+        return None
+    return degrees
+
+
+def dec_to_degrees(value):
+    """
+    Declination in degrees from '[+/-]dd:mm:ss.s' or from decimal degrees,
+    within [-90, 90]. None if the value is not a valid dec.
+    """
+    if isinstance(value, bytes):
+        value = value.decode('ascii', 'replace')
+    if isinstance(value, str) and ':' in value:
+        parsed = _sexagesimal(value, signed=True)
+        if parsed is None or parsed[1] > 90:
+            return None
+        return parsed[0] * parsed[1]
+    degrees = _decimal(value)
+    if degrees is None or not -90 <= degrees <= 90:
+        return None
+    return degrees
+
+
+def decimal_agrees(value, degrees):
+    decimal = _decimal(value)
+    return decimal is not None and abs(decimal - degrees) <= DECIMAL_TOLERANCE
+
+
+def _join(sign, units, precision):
+    scale = 10 ** precision
+    whole, rest = divmod(units, 3600 * scale)
+    minutes, rest = divmod(rest, 60 * scale)
+    seconds, fraction = divmod(rest, scale)
+    if precision > 0:
+        return '{}{:02d}:{:02d}:{:02d}.{:0{}d}'.format(sign, whole, minutes, seconds, fraction, precision)
+    return '{}{:02d}:{:02d}:{:02d}'.format(sign, whole, minutes, seconds)
+
+
+def degrees_to_ra(degrees, precision=2):
+    """
+    'hh:mm:ss.ss' for an ra in degrees, rounded to `precision` decimals of
+    a second.
+    """
+    return _join('', int(round(degrees % 360 / 15 * 3600 * 10 ** precision)) % (24 * 3600 * 10 ** precision), precision)
+
+
+def degrees_to_dec(degrees, precision=1):
+    """
+    '+dd:mm:ss.s' for a dec in degrees, rounded to `precision` decimals of
+    an arcsecond.
+    """
+    assert -90 <= degrees <= 90, 'dec must be within [-90, 90]'
+    units = int(round(abs(degrees) * 3600 * 10 ** precision))
+    return _join('-' if degrees < 0 and units > 0 else '+', units, precision)
+
+
+def epoch_year(value):
+    """
+    Julian year of an epoch given as 2000, 2000.0, '2000' or 'J2000'. None
+    if it cannot be read.
+    """
+    if isinstance(value, str) and value.strip()[:1] in ['J', 'j']:
+        value = value.strip()[1:]
+    return _decimal(value)
+
+
+def propagate_position(ra, dec, pm_ra, pm_dec, epoch, to_epoch):
+    """
+    propagate for one position. pm_ra and pm_dec may be given as strings
+    and count as 0 when missing. Returns (ra, dec) in degrees, unchanged
+    if there is no motion or an epoch cannot be read.
+    """
+    pm_ra, pm_dec = _decimal(pm_ra) or 0.0, _decimal(pm_dec) or 0.0
+    start, end = epoch_year(epoch), epoch_year(to_epoch)
+    if (pm_ra == 0 and pm_dec == 0) or start is None or end is None or start == end:
+        return ra, dec
+    new_ra, new_dec = propagate(ra, dec, pm_ra, pm_dec, start, end)
+    return float(new_ra), float(new_dec)
+
+
+def _as_bytes(values):
+    import numpy as np
+
+    values = np.asarray(values, dtype=object).ravel()
+    strings = []
+    for v in values.tolist():
+        if isinstance(v, bytes):
+            v = v.decode('ascii', 'replace')
+        # longer strings are left to the scalar parser
+        if isinstance(v, str) and ':' in v:
+            v = v.strip()
+            strings.append(v.encode('ascii', 'replace') if len(v) <= MAX_COORD_LENGTH else b'')
+        else:
+            strings.append(b'')
+    return values, np.array(strings, dtype='S{}'.format(MAX_COORD_LENGTH))
+
+
+def _scan(strings, signed):
+    """
+    Parse an array of fixed-width byte strings as sexagesimal coordinates,
+    one character column at a time across all rows. Returns (sign, value)
+    arrays, with NaN values for the rows that do not match SEXAGESIMAL.
+    """
+    import numpy as np
+
+    n = len(strings)
+    chars = strings.view(np.uint8).reshape(n, strings.dtype.itemsize)
+    first = chars[:, 0] if n else np.zeros(0, dtype=np.uint8)
+    negative = first == ord('-')
+    has_sign = negative | (first == ord('+'))
+    bad = (first == 0) | (has_sign & (not signed))
+    ended = np.zeros(n, dtype=bool)
+
+    field = np.zeros(n, dtype=np.int8)
+    fields = np.zeros((3, n))
+    value = np.zeros(n)
+    count = np.zeros(n, dtype=np.int8)
+    fraction = np.zeros(n)
+    scale = np.full(n, 0.1)
+    in_fraction = np.zeros(n, dtype=bool)
+
+    for j in range(chars.shape[1]):
+        c = chars[:, j]
+        if not c.any():
+            break
+        digit = (c >= ord('0')) & (c <= ord('9'))
+        colon = c == ord(':')
+        dot = c == ord('.')
+        skip = (c == 0) | (has_sign if j == 0 else False)
+        bad |= ~(digit | colon | dot | skip) | (ended & (c != 0))
+        ended |= c == 0
+
+        whole = digit & ~in_fraction
+        value = np.where(whole, value * 10 + (c.astype(np.int64) - ord('0')), value)
+        count = count + whole
+        bad |= count > 2
+        part = digit & in_fraction
+        fraction = np.where(part, fraction + (c.astype(np.int64) - ord('0')) * scale, fraction)
+        scale = np.where(part, scale * 0.1, scale)
+
+        # ':' closes the degree or minute field, '.' starts the seconds fraction
+        bad |= (colon | dot) & (count != 2)
+        bad |= colon & ((field >= 2) | in_fraction)
+        bad |= dot & ((field != 2) | in_fraction)
+        closing = np.flatnonzero(colon & ~bad)
+        fields[field[closing], closing] = value[closing]
+        field = field + colon
+        value = np.where(colon, 0, value)
+        count = np.where(colon, 0, count)
+        in_fraction |= dot
+
+    bad |= (field != 2) | (count != 2)
+    bad |= (fields[1] >= 60) | (value + fraction >= 60)
+    total = fields[0] + fields[1] / 60 + (value + fraction) / 3600
+    sign = np.where(negative, -1.0, 1.0)
+    return sign, np.where(bad, np.nan, total)
+
+
+def _parse(values, signed, finish, scalar):
+    import numpy as np
+
+    values = np.asarray(values, dtype=object)
+    flat, strings = _as_bytes(values)
+    sign, parsed = _scan(strings, signed)
+    with np.errstate(invalid='ignore'):
+        parsed = finish(sign, parsed)
+    # decimal degrees and overlong strings are parsed one by one
+    for i in np.flatnonzero(strings == b''):
+        degrees = scalar(flat[i])
+        parsed[i] = np.nan if degrees is None else degrees
+    return parsed.reshape(values.shape)
+
+
+def parse_ra(values):
+    """
+    Array version of ra_to_degrees: ra in degrees for every value, NaN
+    where the value is not a valid ra.
+    """
+    import numpy as np
+    return _parse(values, False, lambda sign, hours: np.where(hours < 24, hours * 15, np.nan), ra_to_degrees)
+
+
+def parse_dec(values):
+    """
+    Array version of dec_to_degrees: dec in degrees for every value, NaN
+    where the value is not a valid dec.
+    """
+    import numpy as np
+    return _parse(values, True, lambda sign, degrees: np.where(degrees <= 90, sign * degrees, np.nan), dec_to_degrees)
+
+
+def _join_array(signs, units, precision, valid):
+    """
+    Array version of _join: the strings are assembled as a matrix of
+    characters, one column per position, and viewed as byte strings.
+    """
+    import numpy as np
+
+    scale = 10 ** precision
+    whole, rest = np.divmod(units, 3600 * scale)
+    minutes, rest = np.divmod(rest, 60 * scale)
+    seconds, fraction = np.divmod(rest, scale)
+    columns = [] if signs is None else [signs]
+    for number in [whole, minutes, seconds]:
+        columns += [number // 10 + ord('0'), number % 10 + ord('0'), np.full_like(number, ord(':'))]
+    columns[-1] = np.full_like(units, ord('.'))
+    columns += [fraction // 10 ** k % 10 + ord('0') for k in range(precision - 1, -1, -1)]
+    if precision == 0:
+        columns.pop(-1)
+    chars = np.ascontiguousarray(np.stack(columns, axis=1).astype(np.uint8))
+    strings = chars.view('S{}'.format(chars.shape[1])).ravel().astype('U').tolist()
+    return [string if ok else None for string, ok in zip(strings, valid.tolist())]
+
+
+def format_ra(degrees, precision=2):
+    """
+    Array version of degrees_to_ra. NaN gives None.
+    """
+    import numpy as np
+
+    degrees = np.asarray(degrees, dtype=float).ravel()
+    finite = np.isfinite(degrees)
+    units = np.round(np.mod(np.where(finite, degrees, 0), 360) / 15 * 3600 * 10 ** precision)
+    units = units.astype(np.int64) % (24 * 3600 * 10 ** precision)
+    return _join_array(None, units, precision, finite)
+
+
+def format_dec(degrees, precision=1):
+    """
+    Array version of degrees_to_dec. NaN or |dec| > 90 gives None.
+    """
+    import numpy as np
+
+    degrees = np.asarray(degrees, dtype=float).ravel()
+    with np.errstate(invalid='ignore'):
+        ok = np.isfinite(degrees) & (np.abs(degrees) <= 90)
+    degrees = np.where(ok, degrees, 0)
+    units = np.round(np.abs(degrees) * 3600 * 10 ** precision).astype(np.int64)
+    signs = np.where((degrees < 0) & (units > 0), ord('-'), ord('+'))
+    return _join_array(signs, units, precision, ok)
+
+
+def propagate(ra, dec, pm_ra, pm_dec, epoch, to_epoch):
+    """
+    Move positions by their proper motion from `epoch` to `to_epoch`.
+
+    ra and dec are in degrees, pm_ra (including the cos(dec) factor) and
+    pm_dec in mas/yr, and the epochs are Julian years or anything
+    epoch_year reads, per row or for all rows. The motion is applied along
+    the great circle through each position, so it stays correct near the
+    poles. Scalars are broadcast against arrays. Returns (ra, dec) arrays in degrees; rows with an unreadable
+    epoch are NaN.
+    """
+    import numpy as np
+
+    ra, dec = np.radians(np.asarray(ra, dtype=float)), np.radians(np.asarray(dec, dtype=float))
+    pm_ra = np.radians(np.asarray(pm_ra, dtype=float) * MAS_TO_DEG)
+    pm_dec = np.radians(np.asarray(pm_dec, dtype=float) * MAS_TO_DEG)
+
+    def years(epochs):
+        epochs = np.asarray(epochs, dtype=object)
+        out = np.array([epoch_year(e) for e in epochs.ravel().tolist()], dtype=float)
+        return out.reshape(epochs.shape)
+
+    ra, dec, pm_ra, pm_dec, dt = np.broadcast_arrays(ra, dec, pm_ra, pm_dec, years(to_epoch) - years(epoch))
+
+    # unit vector of each position and its motion on the sky per year
+    cos_ra, sin_ra, cos_dec, sin_dec = np.cos(ra), np.sin(ra), np.cos(dec), np.sin(dec)
+    position = np.stack([cos_dec * cos_ra, cos_dec * sin_ra, sin_dec])
+    east = np.stack([-sin_ra, cos_ra, np.zeros_like(ra)])
+    north = np.stack([-sin_dec * cos_ra, -sin_dec * sin_ra, cos_dec])
+    motion = pm_ra * east + pm_dec * north
+
+    speed = np.sqrt((motion ** 2).sum(axis=0))
+    angle = speed * dt
+    with np.errstate(invalid='ignore', divide='ignore'):
+        direction = np.where(speed > 0, motion / np.where(speed > 0, speed, 1), 0)
+    moved = position * np.cos(angle) + direction * np.sin(angle)
+
+    new_ra = np.degrees(np.arctan2(moved[1], moved[0])) % 360
+    new_dec = np.degrees(np.arcsin(np.clip(moved[2], -1, 1)))
+    return new_ra, new_dec
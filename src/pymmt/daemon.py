@@ -0,0 +1,241 @@
+import os, json, time, queue, signal, logging, threading
+from concurrent.futures import ThreadPoolExecutor
+from . import MMT_JSON_KEY_SET
+from .pymmt import Target, Listener
+from .cache import local_fields
+from .logs import log
+
+CHECKPOINT_NAME = 'listener.json'
+
+
+class ListenerDaemon(Listener):
+    """
+    Long-running Listener for many targets, with its state kept on disk.
+
+    After every round of polls the per-target progress (the last target
+    record, download flags, polling interval and next poll time) is
+    checkpointed to `<state_dir>/listener.json`. On start the checkpoint is
+    loaded, so a restarted daemon resumes where it stopped: targets are
+    rebuilt from their stored records without a request, are polled when
+    they were next due, and finished targets are not polled again. Files
+    that are already downloaded are skipped through the download manifest.
+
+    Targets can be added and removed while running:
+
+    - with add(targetid) and remove(targetid), from any thread;
+    - through `watch_file`, a file listing one target id per line; it is
+      re-read when it changes and the watched targets are made to match it;
+    - through `queue_dir`, a directory into which other processes drop
+      files with lines 'add <targetid>' or 'remove <targetid>'; each file is
+      applied once and then deleted.
+
+    run() installs handlers so that SIGINT and SIGTERM stop the daemon
+    gracefully (the polls in progress finish and the state is saved) and
+    SIGHUP re-reads the watch file. Unless exit_when_done is set, the daemon
+    keeps running when every target is complete, waiting for new targets.
+    """
+    require_targets = False
+
+    def __init__(self, token=None, state_dir=None, targetids=None, watch_file=None, queue_dir=None, parentdir=None,
+                 workers=8, min_interval=60, max_interval=1800, backoff=2.0, idle_interval=5.0,
+                 exit_when_done=False, verbose=True, bulk_threshold=20):
+        assert state_dir is not None, 'state_dir cannot be None'
+        super().__init__(token=token, workers=workers, min_interval=min_interval, max_interval=max_interval,
+                         backoff=backoff, verbose=verbose, bulk_threshold=bulk_threshold)
+
+        self.state_dir = state_dir
+        self.checkpoint_path = os.path.join(state_dir, CHECKPOINT_NAME)
+        self.watch_file = watch_file
+        self.queue_dir = queue_dir
+        self.parentdir = parentdir
+        self.idle_interval = idle_interval
+        self.exit_when_done = exit_when_done
+        self.commands = queue.SimpleQueue()
+        self.watch_mtime = None
+        self.dirty = False
+        os.makedirs(state_dir, exist_ok=True)
+        if queue_dir is not None:
+            os.makedirs(queue_dir, exist_ok=True)
+
+        self.load_checkpoint()
+        for targetid in targetids or []:
+            self.add(targetid)
+
+
+    def add(self, targetid):
+        self.commands.put(('add', int(targetid)))
+
+
+    def remove(self, targetid):
+        self.commands.put(('remove', int(targetid)))
+
+
+    def _load_target(self, targetid):
+        t = super()._load_target(targetid)
+        if self.parentdir is not None:
+            t.parentdir = self.parentdir
+        return t
+
+
+    def _watched(self, targetid):
+        return any(str(t.id) == str(targetid) for t in self.targets)
+
+
+    def load_checkpoint(self):
+        """
+        Rebuild the watched targets and their polling state from the
+        checkpoint, if there is one. Returns the number of targets restored.
+        """
+        if not os.path.exists(self.checkpoint_path):
+            return 0
+        with open(self.checkpoint_path) as f:
+            saved = json.load(f)
+
+        now_wall, now = time.time(), time.monotonic()
+        for entry in saved.get('targets', []):
+            t = Target(token=self.token, verbose=False, payload=entry['record'])
+            t.targetid = t.id
+            t.verbose = self.verbose
+            t.__dict__.update(entry.get('local', {}))
+            if entry.get('parentdir') is not None:
+                t.parentdir = entry['parentdir']
+            self.targets.append(t)
+            state = dict(entry['state'])
+            state['signature'] = tuple(state['signature']) if state['signature'] is not None else None
+            state['next_poll'] = now + max(0.0, state.pop('next_poll_time') - now_wall)
+            self.state[t.id] = state
+        self.watch_mtime = saved.get('watch_mtime')
+        if self.verbose:
+            log('Restored {} targets from {}'.format(len(self.targets), self.checkpoint_path), path=self.checkpoint_path)
+        return len(self.targets)
+
+
+    def checkpoint(self):
+        """
+        Write the state of every watched target to disk, atomically.
+        """
+        now_wall, now = time.time(), time.monotonic()
+        entries = []
+        for t in list(self.targets):
+            state = dict(self.state[t.id])
+            state['next_poll_time'] = now_wall + (state.pop('next_poll') - now)
+            entries.append({
+                'record':dict((key, value) for key, value in t.__dict__.items() if key in MMT_JSON_KEY_SET),
+                'local':dict(local_fields(t)),
+                'parentdir':t.__dict__.get('parentdir'),
+                'state':state,
+            })
+        tmp = '{}.tmp'.format(self.checkpoint_path)
+        with open(tmp, 'w') as f:
+            json.dump({'saved':now_wall, 'watch_mtime':self.watch_mtime, 'targets':entries}, f, default=str)
+        os.replace(tmp, self.checkpoint_path)
+        self.dirty = False
+
+
+    def _read_watch_file(self, force=False):
+        if self.watch_file is None or not os.path.exists(self.watch_file):
+            return
+        mtime = os.path.getmtime(self.watch_file)
+        if not force and mtime == self.watch_mtime:
+            return
+        self.watch_mtime = mtime
+        with open(self.watch_file) as f:
+            wanted = set(int(line.split('#')[0]) for line in f if line.split('#')[0].strip().isdigit())
+        watched = set(int(t.id) for t in self.targets)
+        for targetid in sorted(wanted - watched):
+            self.commands.put(('add', targetid))
+        for targetid in sorted(watched - wanted):
+            self.commands.put(('remove', targetid))
+
+
+    def _read_queue_dir(self):
+        if self.queue_dir is None:
+            return
+        for name in sorted(os.listdir(self.queue_dir)):
+            path = os.path.join(self.queue_dir, name)
+            if name.startswith('.') or name.endswith('.tmp') or not os.path.isfile(path):
+                continue
+            with open(path) as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) == 2 and parts[0] in ['add', 'remove'] and parts[1].isdigit():
+                        self.commands.put((parts[0], int(parts[1])))
+                    elif len(parts):
+                        log('Ignoring queue command {!r} in {}'.format(line.strip(), name), logging.WARNING)
+            os.remove(path)
+
+
+    def apply_commands(self):
+        """
+        Apply the pending add and remove requests. New targets are fetched
+        concurrently. Returns the number of changes.
+        """
+        self._read_watch_file()
+        self._read_queue_dir()
+        adds, changes = [], 0
+        while True:
+            try:
+                command, targetid = self.commands.get_nowait()
+            except queue.Empty:
+                break
+            if command == 'add':
+                if not self._watched(targetid) and targetid not in adds:
+                    adds.append(targetid)
+            else:
+                if targetid in adds:
+                    adds.remove(targetid)
+                elif self.remove_target(targetid) is not None:
+                    changes += 1
+                    log('Stopped watching target {}'.format(targetid), targetid=targetid)
+
+        if len(adds):
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(adds))) as pool:
+                for targetid, t in zip(adds, pool.map(self._load_target, adds)):
+                    if 'objectid' not in t.__dict__:
+                        log('Could not load target {}'.format(targetid), logging.ERROR, targetid=targetid)
+                        continue
+                    self.add_target(t)
+                    changes += 1
+                    log('Watching target {}'.format(targetid), targetid=targetid)
+        self.dirty = self.dirty or changes > 0
+        return changes
+
+
+    def _signal(self, signum, frame):
+        if signum == getattr(signal, 'SIGHUP', None):
+            self._read_watch_file(force=True)
+        else:
+            log('Received signal {}, stopping'.format(signum), signal=signum)
+            self.stop()
+
+
+    def run(self, Force=False, handle_signals=True):
+        """
+        Poll, checkpoint and apply add/remove requests until stop() is
+        called, a signal arrives or, with exit_when_done, every target is
+        complete and downloaded.
+        """
+        if handle_signals and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, self._signal)
+            signal.signal(signal.SIGTERM, self._signal)
+            if hasattr(signal, 'SIGHUP'):
+                signal.signal(signal.SIGHUP, self._signal)
+
+        self._stop.clear()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                while not self._stop.is_set():
+                    self.apply_commands()
+                    if self.poll_due(pool, Force):
+                        self.dirty = True
+                    if self.dirty:
+                        self.checkpoint()
+
+                    wait = self.next_wait()
+                    if wait is None and self.exit_when_done and self.commands.empty():
+                        log('Download finished :)')
+                        break
+                    # wake up regularly to pick up new add/remove requests
+                    self._stop.wait(self.idle_interval if wait is None else min(wait, self.idle_interval))
+        finally:
+            self.checkpoint()
@@ -0,0 +1,91 @@
+import os, time, logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from .manifest import file_digest
+from .logs import log
+
+
+def _download_one(job, token, retries, backoff):
+    from requests.exceptions import ConnectionError, Timeout, ChunkedEncodingError
+    from .pymmt import Image
+
+    # error responses were already retried, if they can be, by the request
+    # loop (api._send); only a download cut off in transit is tried again
+    # here, resuming from its '.part' file
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            im = Image(token=token, verbose=False)
+            if not im.get(datafileid=job['datafileid'], filepath=job['filepath']):
+                return {'status':'failed', 'attempts':attempt, 'error':'download request error'}
+        except (ConnectionError, Timeout, ChunkedEncodingError) as e:
+            if attempt > retries:
+                return {'status':'failed', 'attempts':attempt, 'error':'{}: {}'.format(type(e).__name__, e)}
+            time.sleep(backoff * 2 ** (attempt - 1))
+            continue
+        except Exception as e:
+            return {'status':'failed', 'attempts':attempt, 'error':'{}: {}'.format(type(e).__name__, e)}
+
+        result = {'status':'downloaded', 'attempts':attempt, 'error':None}
+        if job.get('checksum'):
+            result['digest'] = file_digest(job['filepath'])
+        return result
+
+
+def download_datafiles(jobs, token=None, workers=4, retries=2, backoff=1.0, progress=None, verbose=True):
+    """
+    Download many datafiles on a bounded pool of worker threads.
+
+    jobs is an iterable of dicts with the keys 'datafileid' and 'filepath'
+    (any other keys are carried through to the report). Files that already
+    exist at filepath are skipped. A download interrupted by a connection
+    error or timeout is resumed up to `retries` times with exponential
+    backoff; error responses are retried by the request itself. Jobs with 'checksum' set get
+    the (size, sha256, mtime) of the downloaded file in their result's
+    'digest'.
+
+    progress, if given, is called as progress(done, total, result) from the
+    calling thread after each job finishes.
+
+    Returns a report dict with the lists 'downloaded', 'skipped' and
+    'failed' (one result dict per job) plus 'total' and 'elapsed' seconds.
+    """
+    assert workers >= 1, 'workers must be at least 1'
+    start = datetime.now()
+    report = {'downloaded':[], 'skipped':[], 'failed':[], 'total':0, 'elapsed':0.0}
+
+    jobs = list(jobs)
+    report['total'] = len(jobs)
+    pending = []
+    for job in jobs:
+        if os.path.exists(job['filepath']):
+            if verbose:
+                log('File \'{}\' already exists'.format(job['filepath']))
+            result = dict(job, status='skipped', attempts=0, error=None)
+            report['skipped'].append(result)
+            if progress is not None:
+                progress(len(report['skipped']), report['total'], result)
+        else:
+            pending.append(job)
+
+    done = len(report['skipped'])
+    if len(pending):
+        with ThreadPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+            futures = {}
+            for job in pending:
+                if verbose:
+                    log('Downloading: {}'.format(job['filepath']))
+                futures[pool.submit(_download_one, job, token, retries, backoff)] = job
+
+            for future in as_completed(futures):
+                result = dict(futures[future], **future.result())
+                report[result['status']].append(result)
+                done += 1
+                if verbose and result['status'] == 'failed':
+                    log('Failed to download \'{}\': {}'.format(result['filepath'], result['error']), logging.ERROR)
+                if progress is not None:
+                    progress(done, report['total'], result)
+
+    report['elapsed'] = (datetime.now() - start).total_seconds()
+    return report
@@ -0,0 +1,179 @@
+import os, time, uuid, hashlib, logging, mimetypes
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from .logs import log
+
+FINDER_FIELD = 'finding_chart_file'
+# local target field recording the last finder uploaded from this client
+FINDER_UPLOAD_KEY = 'finder_upload'
+
+
+def finder_digest(fileobj, chunk_size=1024*1024):
+    """
+    sha256 of an open binary file, read in chunks from its current position,
+    which is restored afterwards.
+    """
+    start = fileobj.tell()
+    sha = hashlib.sha256()
+    for chunk in iter(lambda: fileobj.read(chunk_size), b''):
+        sha.update(chunk)
+    fileobj.seek(start)
+    return sha.hexdigest()
+
+
+def finder_is_current(target, digest):
+    """
+    True if the finder the server has for the target was uploaded from
+    here from a file with this content: the digest recorded at the last
+    upload matches and the server still reports the file name it gave
+    that upload.
+    """
+    upload = target.__dict__.get(FINDER_UPLOAD_KEY)
+    return (isinstance(upload, dict) and upload.get('sha256') == digest
+            and upload.get('filename') == target.__dict__.get('findingchartfilename'))
+
+
+def record_finder_upload(target, digest):
+    target.__dict__[FINDER_UPLOAD_KEY] = {'sha256':digest, 'filename':target.__dict__.get('findingchartfilename')}
+
+
+class MultipartFile():
+    """
+    multipart/form-data request body with text `fields` and one file part,
+    streamed from `fileobj` in chunks instead of being built in memory.
+
+    It has a length, so requests sends it with a Content-Length header, and
+    seek(0) rewinds it so that the same body can be sent again on a retry.
+    """
+    def __init__(self, fields, name, fileobj, filename, content_type=None, chunk_size=64*1024):
+        self.boundary = uuid.uuid4().hex
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self.start = fileobj.tell()
+        fileobj.seek(0, os.SEEK_END)
+        self.file_size = fileobj.tell() - self.start
+        fileobj.seek(self.start)
+
+        if content_type is None:
+            content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        head = []
+        for key, value in fields.items():
+            head.append('--{}\r\nContent-Disposition: form-data; name="{}"\r\n\r\n{}\r\n'.format(self.boundary, key, value))
+        head.append('--{}\r\nContent-Disposition: form-data; name="{}"; filename="{}"\r\nContent-Type: {}\r\n\r\n'.format(
+            self.boundary, name, filename.replace('"', ''), content_type))
+        self.head = ''.join(head).encode()
+        self.tail = '\r\n--{}--\r\n'.format(self.boundary).encode()
+        self.seek(0)
+
+
+    @property
+    def content_type(self):
+        return 'multipart/form-data; boundary={}'.format(self.boundary)
+
+
+    def __len__(self):
+        return len(self.head) + self.file_size + len(self.tail)
+
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        assert offset == 0 and whence == os.SEEK_SET, 'MultipartFile can only be rewound'
+        self.fileobj.seek(self.start)
+        self.parts = [self.head, None, self.tail]
+        return 0
+
+
+    def read(self, size=-1):
+        out = []
+        while len(self.parts) and (size < 0 or size > 0):
+            part = self.parts[0]
+            if part is None:
+                chunk = self.fileobj.read(self.chunk_size if size < 0 else size)
+                if not len(chunk):
+                    self.parts.pop(0)
+                    continue
+            else:
+                chunk = part if size < 0 else part[:size]
+                if len(chunk) == len(part):
+                    self.parts.pop(0)
+                else:
+                    self.parts[0] = part[len(chunk):]
+            out.append(chunk)
+            if size > 0:
+                size -= len(chunk)
+        return b''.join(out)
+
+
+    def __iter__(self):
+        return iter(lambda: self.read(self.chunk_size), b'')
+
+
+def _upload_one(job, force, retries, backoff):
+    from requests.exceptions import ConnectionError, Timeout
+
+    target = job['target']
+    if not target.valid:
+        return {'status':'failed', 'attempts':0, 'error':'invalid target'}
+
+    # 429 and 5xx are retried by the request loop (api._send); only an
+    # upload that never got a response is tried again here
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            r = target.upload_finder(job['finder_path'], force=force)
+        except (ConnectionError, Timeout) as e:
+            if attempt > retries:
+                return {'status':'failed', 'attempts':attempt, 'error':'{}: {}'.format(type(e).__name__, e)}
+            time.sleep(backoff * 2 ** (attempt - 1))
+            continue
+        except Exception as e:
+            return {'status':'failed', 'attempts':attempt, 'error':'{}: {}'.format(type(e).__name__, e)}
+
+        if r is None:
+            return {'status':'skipped', 'attempts':attempt - 1, 'error':None}
+        if r.status_code == 200:
+            return {'status':'uploaded', 'attempts':attempt, 'error':None}
+        return {'status':'failed', 'attempts':attempt, 'error':'{}: {}'.format(r.status_code, r.text)}
+
+
+def upload_finders(jobs, workers=4, retries=2, backoff=1.0, force=False, progress=None, verbose=True):
+    """
+    Upload the finding charts of many targets on a bounded pool of worker
+    threads.
+
+    jobs is an iterable of dicts with the keys 'target' (a Target with an
+    id) and 'finder_path' (any other keys are carried through to the
+    report). A chart is skipped when the target's findingchartfilename
+    shows it was uploaded from a file with the same content, unless force
+    is set. Uploads that fail with a connection error are retried up to
+    `retries` times with exponential backoff; 429 and 5xx responses are
+    retried by the request itself, through the rate limiter.
+
+    progress, if given, is called as progress(done, total, result) from the
+    calling thread after each job finishes.
+
+    Returns a report dict with the lists 'uploaded', 'skipped' and 'failed'
+    (one result dict per job) plus 'total' and 'elapsed' seconds.
+    """
+    assert workers >= 1, 'workers must be at least 1'
+    start = datetime.now()
+    report = {'uploaded':[], 'skipped':[], 'failed':[], 'total':0, 'elapsed':0.0}
+
+    jobs = list(jobs)
+    report['total'] = len(jobs)
+    if len(jobs):
+        with ThreadPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            futures = dict((pool.submit(_upload_one, job, force, retries, backoff), job) for job in jobs)
+            done = 0
+            for future in as_completed(futures):
+                result = dict(futures[future], **future.result())
+                report[result['status']].append(result)
+                done += 1
+                if verbose and result['status'] == 'failed':
+                    log('Failed to upload the finder of target {}: {}'.format(
+                        result['target'].__dict__.get('id'), result['error']), logging.ERROR)
+                if progress is not None:
+                    progress(done, report['total'], result)
+
+    report['elapsed'] = (datetime.now() - start).total_seconds()
+    return report
@@ -1 +1,54 @@
-from . import *
\ No newline at end of file
+import threading
+from importlib import import_module
+from .rules import InstrumentRules
+
+# compiled instrument validators keyed by instrumentid; ids are registered as
+# both int and str since payloads use either
+INSTRUMENTS = {}
+
+# modules of the built-in instruments, imported on first use
+BUILTIN_INSTRUMENTS = {16:'binospec', 15:'mmirs'}
+_builtin_lock = threading.Lock()
+
+
+def register_instrument(rules):
+    """
+    Add an instrument, given as a rule table or InstrumentRules, to the
+    registry used by Target.validate.
+    """
+    if not isinstance(rules, InstrumentRules):
+        rules = InstrumentRules(rules)
+    INSTRUMENTS[int(rules.instrumentid)] = rules
+    INSTRUMENTS[str(rules.instrumentid)] = rules
+    return rules
+
+
+def _load_builtin(instrumentid):
+    # under a lock, so that a thread validating while another imports the
+    # module waits for it instead of finding the instrument in neither table
+    with _builtin_lock:
+        if instrumentid in INSTRUMENTS or instrumentid not in BUILTIN_INSTRUMENTS:
+            return
+        module = import_module('.{}'.format(BUILTIN_INSTRUMENTS[instrumentid]), __name__)
+        register_instrument(module.INSTRUMENT)
+        del BUILTIN_INSTRUMENTS[instrumentid]
+
+
+def get_instrument(instrumentid):
+    try:
+        rules = INSTRUMENTS.get(instrumentid)
+        if rules is None and int(instrumentid) in BUILTIN_INSTRUMENTS:
+            _load_builtin(int(instrumentid))
+            rules = INSTRUMENTS.get(instrumentid)
+        return rules
+    except (TypeError, ValueError):
+        return None
+
+
+def all_instruments():
+    """
+    The registry with every built-in instrument loaded.
+    """
+    for instrumentid in list(BUILTIN_INSTRUMENTS):
+        _load_builtin(instrumentid)
+    return INSTRUMENTS
@@ -0,0 +1,140 @@
+from bisect import bisect_right
+from .. import isFloat
+
+
+def _member(value, options):
+    try:
+        return value in options
+    except TypeError:  # unhashable values are never valid options
+        return False
+
+
+class InstrumentRules():
+    """
+    Validator compiled from a declarative instrument rule table.
+
+    A rule table is a dict with the keys:
+
+        instrumentid        the MMT instrument id
+        name                instrument name
+        observationtypes    {'choices': (...), 'invalid': msg, 'missing': msg}
+        fields              ordered list of field rules
+
+    Each field rule is a dict with the key 'field' and any of:
+
+        when        observation types the rule applies to (default: all)
+        requires    only apply the rule if this other field is given
+        set         always set the field to this value
+        default     value to set when the field is missing
+        missing     (severity, message) reported when the field is missing
+        float       (severity, message) reported when the value is not a float
+        choices     allowed values
+        intervals   {'key': field, 'ranges': {keyvalue: ([(low, high), ...], (severity, message))}}
+                    the value must lie inside one of the closed ranges listed
+                    for the value of the key field
+        invalid     (severity, message) reported when the value is not allowed
+
+    severity is 'error' or 'warning'. Messages may use {value} for the
+    offending value. Choices are compiled into frozensets and ranges into
+    sorted bound arrays, so each check is a hash or bisect lookup.
+    """
+    def __init__(self, table):
+        self.instrumentid = table['instrumentid']
+        self.name = table['name']
+        obs = table['observationtypes']
+        self.observationtypes = frozenset(obs['choices'])
+        self.observationtype_invalid = obs['invalid']
+        self.observationtype_missing = obs['missing']
+        self.rules = [self._compile(rule) for rule in table['fields']]
+
+
+    @staticmethod
+    def _compile(rule):
+        compiled = {
+            'field':rule['field'],
+            'when':frozenset(rule['when']) if 'when' in rule else None,
+            'requires':rule.get('requires'),
+            'missing':rule.get('missing'),
+            'float':rule.get('float'),
+            'choices':frozenset(rule['choices']) if 'choices' in rule else None,
+            'invalid':rule.get('invalid'),
+            'intervals':None,
+        }
+        for key in ['set', 'default']:
+            if key in rule:
+                compiled[key] = rule[key]
+
+        if 'intervals' in rule:
+            ranges = {}
+            for keyvalue, (bounds, message) in rule['intervals']['ranges'].items():
+                bounds = sorted(bounds)
+                entry = (tuple(b[0] for b in bounds), tuple(b[1] for b in bounds), message)
+                # grating 270 and '270' are both accepted, like the choices
+                ranges[keyvalue] = entry
+                ranges[str(keyvalue)] = entry
+            compiled['intervals'] = {'key':rule['intervals']['key'], 'ranges':ranges}
+        return compiled
+
+
+    @staticmethod
+    def in_ranges(value, starts, ends):
+        i = bisect_right(starts, value) - 1
+        return i >= 0 and value <= ends[i]
+
+
+    def validate(self, payload={}):
+        """
+        Returns (errors, warnings, update_dict) like the hand-written
+        validate functions this replaces.
+        """
+        errors, warnings = [], []
+        update_dict = {}
+        report = {'error':errors, 'warning':warnings}
+
+        if 'observationtype' not in payload:
+            errors.append(self.observationtype_missing)
+            return errors, warnings, update_dict
+
+        observationtype = payload['observationtype']
+        if not _member(observationtype, self.observationtypes):
+            errors.append(self.observationtype_invalid)
+
+        for rule in self.rules:
+            if rule['when'] is not None and not _member(observationtype, rule['when']):
+                continue
+            if rule['requires'] is not None and rule['requires'] not in payload:
+                continue
+
+            field = rule['field']
+            if 'set' in rule:
+                update_dict[field] = rule['set']
+                continue
+
+            if field not in payload:
+                if 'default' in rule:
+                    update_dict[field] = rule['default']
+                if rule['missing'] is not None:
+                    severity, message = rule['missing']
+                    report[severity].append(message)
+                continue
+
+            value = payload[field]
+            if rule['float'] is not None:
+                if not isFloat(value):
+                    severity, message = rule['float']
+                    report[severity].append(message.format(value=value))
+                    continue
+
+            if rule['choices'] is not None and not _member(value, rule['choices']):
+                severity, message = rule['invalid']
+                report[severity].append(message.format(value=value))
+
+            if rule['intervals'] is not None:
+                entry = rule['intervals']['ranges'].get(payload[rule['intervals']['key']]) \
+                    if _member(payload[rule['intervals']['key']], rule['intervals']['ranges']) else None
+                if entry is not None:
+                    starts, ends, (severity, message) = entry
+                    if not self.in_ranges(float(value), starts, ends):
+                        report[severity].append(message.format(value=value))
+
+        return errors, warnings, update_dict
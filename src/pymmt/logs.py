@@ -0,0 +1,69 @@
+import sys, json, queue, logging, threading
+
+LOGGER_NAME = 'pymmt'
+LOG_MODES = ('print', 'structured')
+
+_lock = threading.Lock()
+_mode = 'print'
+_listener = None
+logger = logging.getLogger(LOGGER_NAME)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line with the time, level, message and the fields
+    passed to log().
+    """
+    def format(self, record):
+        entry = {
+            'time':self.formatTime(record),
+            'level':record.levelname,
+            'logger':record.name,
+            'message':record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(mode='print', handler=None, level=logging.INFO):
+    """
+    Choose how pymmt reports progress and errors.
+
+    'print' (the default) writes messages to stdout as they happen.
+    'structured' sends them as records, with their fields attached, to the
+    'pymmt' logger. The records are put on a queue and written by a
+    background thread to `handler` (by default JSON lines on stderr), so
+    the calling threads never wait on I/O.
+    """
+    global _mode, _listener
+    from logging.handlers import QueueHandler, QueueListener
+
+    assert mode in LOG_MODES, 'mode must be one of {}'.format(', '.join(LOG_MODES))
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+        for h in list(logger.handlers):
+            if isinstance(h, QueueHandler):
+                logger.removeHandler(h)
+
+        if mode == 'structured':
+            if handler is None:
+                handler = logging.StreamHandler(sys.stderr)
+                handler.setFormatter(JsonFormatter())
+            records = queue.SimpleQueue()
+            logger.addHandler(QueueHandler(records))
+            logger.setLevel(level)
+            logger.propagate = False
+            _listener = QueueListener(records, handler, respect_handler_level=True)
+            _listener.start()
+        else:
+            logger.propagate = True
+        _mode = mode
+
+
+def log(message, level=logging.INFO, **fields):
+    if _mode == 'print':
+        print(message)
+    else:
+        logger.log(level, message, extra={'fields':fields})
@@ -0,0 +1,122 @@
+import os, json, hashlib
+from datetime import datetime
+
+MANIFEST_NAME = '.manifest.json'
+
+# datafile fields that identify a particular version of a file on the server
+REMOTE_KEYS = ('filename', 'type', 'size', 'filesize', 'checksum', 'md5', 'modified', 'date')
+
+
+def file_digest(path, chunk_size=1024*1024):
+    """
+    Returns (size, sha256, mtime) of a file, reading it once in chunks.
+    """
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    stat = os.stat(path)
+    return stat.st_size, sha.hexdigest(), stat.st_mtime
+
+
+def remote_signature(datafile):
+    return dict((key, datafile[key]) for key in REMOTE_KEYS if key in datafile)
+
+
+def size_matches(path, remote):
+    """
+    False if the server reports a size for the datafile and the local file
+    has a different one.
+    """
+    expected = remote.get('size', remote.get('filesize'))
+    return expected is None or str(expected) == str(os.path.getsize(path))
+
+
+class Manifest():
+    """
+    On-disk record of the datafiles downloaded for one target.
+
+    For every datafile id it stores the local path, size, sha256 checksum,
+    modification time and the server's description of the file. A file is
+    considered intact while its size and mtime still match the manifest, so
+    checking a whole target only needs a stat per file; the checksum is
+    computed once, when the file is recorded, and can be re-checked with
+    verify(deep=True).
+
+    The manifest also keeps the target state ('modified', completion) seen
+    at the last sync, so that an unchanged, fully downloaded target can be
+    skipped without fetching its datalist.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        self.target = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            self.files = saved.get('files', {})
+            self.target = saved.get('target', {})
+
+
+    @classmethod
+    def for_target(cls, parentdir, objectid):
+        return cls('{}/data/{}/{}'.format(parentdir, objectid, MANIFEST_NAME))
+
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = '{}.tmp'.format(self.path)
+        with open(tmp, 'w') as f:
+            json.dump({'target':self.target, 'files':self.files}, f, indent=1, default=str)
+        os.replace(tmp, self.path)
+
+
+    def record(self, datafileid, filepath, remote={}, digest=None):
+        size, sha256, mtime = digest if digest is not None else file_digest(filepath)
+        self.files[str(datafileid)] = {
+            'filepath':filepath,
+            'size':size,
+            'sha256':sha256,
+            'mtime':mtime,
+            'remote':remote,
+            'recorded':datetime.now().isoformat(),
+        }
+
+
+    def forget(self, datafileid):
+        self.files.pop(str(datafileid), None)
+
+
+    def verify(self, datafileid, deep=False):
+        """
+        True if the recorded file is still on disk, unchanged. With
+        deep=True the checksum is recomputed instead of trusting size and
+        mtime.
+        """
+        entry = self.files.get(str(datafileid))
+        if entry is None:
+            return False
+        try:
+            stat = os.stat(entry['filepath'])
+        except OSError:
+            return False
+        if stat.st_size != entry['size']:
+            return False
+        if deep:
+            return file_digest(entry['filepath'])[1] == entry['sha256']
+        return stat.st_mtime == entry['mtime']
+
+
+    def is_current(self, datafileid, filepath, remote):
+        """
+        True if the datafile was downloaded to filepath, is intact and the
+        server still describes it the same way.
+        """
+        entry = self.files.get(str(datafileid))
+        if entry is None or entry['filepath'] != filepath or entry['remote'] != remote:
+            return False
+        return self.verify(datafileid) and size_matches(filepath, remote)
+
+
+    def complete(self):
+        return all(self.verify(datafileid) for datafileid in self.files)
@@ -0,0 +1,209 @@
+import threading
+from bisect import bisect_left
+
+# Upper bounds, in seconds, of the request latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HOOK_EVENTS = ('before', 'after')
+
+
+def _body_size(body):
+    if isinstance(body, (bytes, bytearray, str)):
+        return len(body)
+    return 0
+
+
+class Histogram():
+    """
+    Cumulative-bucket histogram in the Prometheus style.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+    def cumulative(self):
+        total, ret = 0, []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            ret.append((bound, total))
+        return ret
+
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding the q-quantile, like
+        histogram_quantile without interpolation.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        for bound, total in self.cumulative():
+            if total >= rank:
+                return bound
+
+
+class Metrics():
+    """
+    Thread-safe request metrics, kept per endpoint (HTTP method and API
+    path such as 'GET catalogTarget').
+
+    For every endpoint it counts requests, responses by status, errors
+    (exceptions and 4xx/5xx responses) and retries, sums the bytes sent and
+    received, and keeps a latency histogram. Export with to_dict() or, in
+    the Prometheus text format, with to_prometheus().
+
+    Hooks registered with add_hook('before', func) are called as
+    func(api, method, url, kwargs) before each attempt of a request, and
+    'after' hooks as func(api, info) after it, with info the dict of what
+    was measured: method, endpoint, url, status, elapsed, bytes_sent,
+    bytes_received, retries and error.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.hooks = dict((event, []) for event in HOOK_EVENTS)
+        self.endpoints = {}
+
+
+    def add_hook(self, event, func):
+        assert event in HOOK_EVENTS, 'event must be one of {}'.format(', '.join(HOOK_EVENTS))
+        self.hooks[event].append(func)
+
+
+    def remove_hook(self, event, func):
+        self.hooks[event].remove(func)
+
+
+    def before(self, api, method, url, kwargs):
+        for func in self.hooks['before']:
+            func(api, method, url, kwargs)
+
+
+    def after(self, api, method, response=None, elapsed=0.0, retries=0, error=None, bytes_sent=None):
+        """
+        Record one attempt of a request, given its response or the
+        exception it raised. bytes_sent is taken from the request of a
+        requests.Response unless given.
+        """
+        info = {
+            'method':method,
+            'endpoint':api.target,
+            'url':api.url,
+            'status':None,
+            'elapsed':elapsed,
+            'bytes_sent':0,
+            'bytes_received':0,
+            'retries':retries,
+            'error':None if error is None else '{}: {}'.format(type(error).__name__, error),
+        }
+        if response is not None:
+            info['status'] = response.status_code
+            request = getattr(response, 'request', None)
+            info['bytes_sent'] = bytes_sent if bytes_sent is not None else _body_size(getattr(request, 'body', None))
+            length = response.headers.get('Content-Length')
+            if length is not None and length.isdigit():
+                info['bytes_received'] = int(length)
+            elif getattr(response, '_content_consumed', True):
+                info['bytes_received'] = len(response.content or b'')
+            # retries made by the session (connection errors, 5xx) before this response
+            history = getattr(getattr(getattr(response, 'raw', None), 'retries', None), 'history', None)
+            info['retries'] += len(history) if history else 0
+        self.observe(info)
+        for func in self.hooks['after']:
+            func(api, info)
+        return info
+
+
+    def observe(self, info):
+        key = (info['method'], info['endpoint'])
+        with self.lock:
+            ep = self.endpoints.get(key)
+            if ep is None:
+                ep = self.endpoints[key] = {
+                    'requests':0, 'errors':0, 'retries':0, 'bytes_sent':0, 'bytes_received':0,
+                    'status':{}, 'latency':Histogram(self.buckets),
+                }
+            ep['requests'] += 1
+            ep['retries'] += info['retries']
+            ep['bytes_sent'] += info['bytes_sent']
+            ep['bytes_received'] += info['bytes_received']
+            ep['latency'].observe(info['elapsed'])
+            if info['status'] is not None:
+                ep['status'][info['status']] = ep['status'].get(info['status'], 0) + 1
+            if info['error'] is not None or (info['status'] is not None and info['status'] >= 400):
+                ep['errors'] += 1
+
+
+    def reset(self):
+        with self.lock:
+            self.endpoints = {}
+
+
+    def to_dict(self):
+        ret = {}
+        with self.lock:
+            for (method, endpoint), ep in self.endpoints.items():
+                latency = ep['latency']
+                ret['{} {}'.format(method, endpoint)] = {
+                    'requests':ep['requests'],
+                    'errors':ep['errors'],
+                    'retries':ep['retries'],
+                    'bytes_sent':ep['bytes_sent'],
+                    'bytes_received':ep['bytes_received'],
+                    'status':dict(ep['status']),
+                    'latency':{
+                        'count':latency.count,
+                        'sum':latency.sum,
+                        'mean':latency.sum / latency.count if latency.count else None,
+                        'p50':latency.quantile(0.5),
+                        'p95':latency.quantile(0.95),
+                        'p99':latency.quantile(0.99),
+                        'buckets':[(bound, count) for bound, count in latency.cumulative()],
+                    },
+                }
+        return ret
+
+
+    def to_prometheus(self, prefix='pymmt'):
+        lines = []
+        def header(name, kind, text):
+            lines.append('# HELP {}_{} {}'.format(prefix, name, text))
+            lines.append('# TYPE {}_{} {}'.format(prefix, name, kind))
+
+        with self.lock:
+            items = sorted(self.endpoints.items())
+            labels = dict((key, 'method="{}",endpoint="{}"'.format(key[0], key[1])) for key, ep in items)
+
+            for name, text in [('requests', 'API requests sent.'), ('errors', 'API requests that failed.'),
+                               ('retries', 'API request retries.'), ('bytes_sent', 'Request body bytes sent.'),
+                               ('bytes_received', 'Response body bytes received.')]:
+                header('{}_total'.format(name), 'counter', text)
+                for key, ep in items:
+                    lines.append('{}_{}_total{{{}}} {}'.format(prefix, name, labels[key], ep[name]))
+
+            header('responses_total', 'counter', 'API responses by status code.')
+            for key, ep in items:
+                for status, count in sorted(ep['status'].items()):
+                    lines.append('{}_responses_total{{{},status="{}"}} {}'.format(prefix, labels[key], status, count))
+
+            header('request_seconds', 'histogram', 'API request latency.')
+            for key, ep in items:
+                latency = ep['latency']
+                for bound, count in latency.cumulative():
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append('{}_request_seconds_bucket{{{},le="{}"}} {}'.format(prefix, labels[key], le, count))
+                lines.append('{}_request_seconds_sum{{{}}} {}'.format(prefix, labels[key], latency.sum))
+                lines.append('{}_request_seconds_count{{{}}} {}'.format(prefix, labels[key], latency.count))
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()
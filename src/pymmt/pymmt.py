@@ -1,17 +1,33 @@
-import os, json, requests, re, time
-from pathlib import Path
-from . import MMT_JSON_KEYS, LOCAL_TARGET_KEYS, isInt, isFloat
-from .instruments.binospec import validate as bino_validate
-from .instruments.mmirs import validate as mmirs_validate
+import os, re, time, logging, threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from . import MMT_JSON_KEY_SET, LOCAL_TARGET_KEYS, isInt, isFloat
+from .coords import ra_to_degrees, dec_to_degrees, degrees_to_ra, degrees_to_dec, decimal_agrees
+from .instruments import get_instrument
+from .session import get_session, get_timeout, get_session_config
+from .ratelimit import get_limiter, parse_retry_after, THROTTLE_STATUS
+from .metrics import METRICS
+from .singleflight import get_singleflight, request_key
+from .responses import Response
+from .logs import log
+from .downloads import download_datafiles
+from .finders import FINDER_FIELD, MultipartFile, finder_digest, finder_is_current, record_finder_upload
+from .cache import local_fields
+from .schedule import Schedule, SCHEDULE_CACHE
+from .sync import sync_targets
+from .bulk import refresh_targets
 from datetime import datetime
 
 
 class api():
 
-    def __init__(self, target=None, token=None):
+    # request metrics and hooks, shared by all instances unless replaced
+    metrics = METRICS
 
-        self.base = 'https://scheduler.mmto.arizona.edu/APIv2'
+    def __init__(self, target=None, token=None, session=None):
+
+        self.base = os.getenv('MMT_API_BASE', 'https://scheduler.mmto.arizona.edu/APIv2')
         self.target = target
+        self.session = session
 
         if token is None:
             self.token = os.getenv('MMT_API_TOKEN')
@@ -31,39 +47,101 @@ class api():
                 self.url = '{}/{}/{}'.format(self.url, p, params[p])
 
 
+    def _request(self, method, **kwargs):
+        # concurrent identical GETs share one request and its response; only
+        # the request actually sent shows in the metrics
+        kwargs.setdefault('timeout', get_timeout())
+        flight = get_singleflight()
+        key = request_key(method, self.url, kwargs, scope=None if self.session is None else id(self.session)) if flight is not None else None
+        if key is None:
+            return self._send(method, **kwargs)
+        self.request = flight.do(key, lambda: self._send(method, **kwargs))[0]
+        return self.request
+
+
+    def _send(self, method, **kwargs):
+        session = self.session if self.session is not None else get_session()
+        limiter = get_limiter()
+        config = get_session_config()
+
+        # responses are only retried here, never by the session, so that the
+        # limiter sees every attempt: 429 and 503 while the limiter is on,
+        # and the 5xx of status_forcelist for the session's allowed methods.
+        # POSTs are only resent when the server refused them outright, and
+        # never with file uploads whose file objects cannot be rewound
+        if method == 'POST':
+            retriable = (429,) if limiter is not None else ()
+        else:
+            retriable = THROTTLE_STATUS if limiter is not None else ()
+            if method in config['allowed_methods']:
+                retriable += tuple(config['status_forcelist'])
+        body = kwargs.get('data')
+        if kwargs.get('files') is not None or (hasattr(body, 'read') and not hasattr(body, 'seek')):
+            retriable = ()
+        retries, backoff = (limiter.retries, limiter.backoff) if limiter is not None else (config['retries'], config['backoff_factor'])
+        attempt = 0
+        while True:
+            self.metrics.before(self, method, self.url, kwargs)
+            started = limiter.acquire() if limiter is not None else time.monotonic()
+            try:
+                self.request = session.request(method, self.url, **kwargs)
+            except Exception as e:
+                if limiter is not None:
+                    limiter.release(started, error=True)
+                self.metrics.after(self, method, elapsed=time.monotonic() - started, retries=min(attempt, 1), error=e)
+                raise
+            elapsed = time.monotonic() - started
+            status = self.request.status_code
+            retry_after = None
+            if status in THROTTLE_STATUS:
+                retry_after = parse_retry_after(self.request.headers.get('Retry-After'))
+            if limiter is not None:
+                limiter.release(started, status=status, retry_after=retry_after, error=status in config['status_forcelist'])
+            self.metrics.after(self, method, self.request, elapsed=elapsed, retries=min(attempt, 1))
+
+            if status not in retriable or attempt >= retries:
+                if not kwargs.get('stream'):
+                    self.request = Response.from_requests(self.request)
+                return self.request
+            attempt += 1
+            self.request.close()
+            if hasattr(body, 'seek'):
+                body.seek(0)
+            if retry_after is None:
+                time.sleep(backoff * 2 ** (attempt - 1))
+
+
     def _post(self, r_json):
         self._build_url(r_json['urlparams'])
         data = r_json['data'] if 'data' in r_json.keys() else None
         files = r_json['files'] if 'files' in r_json.keys() else None
         d_json = r_json['d_json'] if 'd_json' in r_json.keys() else None
-        self.request = requests.post(self.url, json=d_json, data=data, files=files)
-        return self.request
+        return self._request('POST', json=d_json, data=data, files=files)
 
 
-    def _get(self, r_json):
+    def _get(self, r_json, **kwargs):
         self._build_url(r_json['urlparams'])
         d_json = r_json['d_json'] if 'd_json' in r_json.keys() else None
-        self.request = requests.get(self.url, json=d_json)
-        return self.request
+        return self._request('GET', json=d_json, **kwargs)
 
 
     def _put(self, r_json):
         self._build_url(r_json['urlparams'])
         d_json = r_json['d_json']
-        self.request = requests.put(self.url, json=d_json)
-        return self.request
+        return self._request('PUT', json=d_json)
 
 
     def _delete(self, r_json):
         self._build_url(r_json['urlparams'])
         d_json = r_json['d_json']
-        self.request = requests.delete(self.url, json=d_json)
-        return self.request
+        return self._request('DELETE', json=d_json)
 
 
 class Target(api):
-    def __init__(self, token=None, verbose=True, payload={}):
+    def __init__(self, token=None, verbose=True, payload={}, cache=None, index=None):
         self.verbose = verbose
+        self.cache = cache
+        self.index = index
         self.valid = False
         self.downloaded = False
         self.partial_download = False
@@ -75,14 +153,13 @@ class Target(api):
         assert token is not None, 'Token cannot be None'
         super().__init__('catalogTarget', token)
 
-        allowed_keys = list(MMT_JSON_KEYS)
-        self.__dict__.update((str(key).lower(), value) for key, value in payload.items() if str(key).lower() in allowed_keys)
+        self.__dict__.update((str(key).lower(), value) for key, value in payload.items() if str(key).lower() in MMT_JSON_KEY_SET)
 
         if 'targetid' in payload.keys():
             self.targetid = payload['targetid']
             self.id = payload['targetid']
-            self.get()
-            #self.database_load()
+            if not self.load_cached():
+                self.get()
 
         self.validate(verbose=self.verbose)
 
@@ -92,29 +169,41 @@ class Target(api):
         selfdict = self.__dict__
         errors, warnings = [], []
 
+        # ra and dec are given as sexagesimal strings or decimal degrees;
+        # decimal values are stored as strings and the decimal fields filled
+        if 'ra' not in selfkeys and 'ra_decimal' in selfkeys:
+            self.__dict__.update({'ra':selfdict['ra_decimal']})
         if 'ra' in selfkeys:
             ra = selfdict['ra']
-            r = re.compile('.{2}:.{2}:.{2}\.*')
-            if not r.match(ra):
-                errors.append('Invalid format for field \'ra\' ['+ra+']. Valid format is dd:dd:dd.d')
+            ra_decimal = ra_to_degrees(ra)
+            if ra_decimal is None:
+                errors.append('Invalid format for field \'ra\' ['+str(ra)+']. Valid format is hh:mm:ss.s (hh < 24) or decimal degrees')
+            else:
+                if not isinstance(ra, str) or ':' not in ra:
+                    ra = degrees_to_ra(ra_decimal)
+                self.__dict__.update({'ra':ra.strip()})
+                if not decimal_agrees(selfdict.get('ra_decimal'), ra_decimal):
+                    self.__dict__.update({'ra_decimal':ra_decimal})
         else:
-            errors.append('Field \'ra\' is required. Valid format is dd:dd:dd.d')
+            errors.append('Field \'ra\' is required. Valid format is hh:mm:ss.s')
 
+        if 'dec' not in selfkeys and 'dec_decimal' in selfkeys:
+            self.__dict__.update({'dec':selfdict['dec_decimal']})
         if 'dec' in selfkeys:
             dec = selfdict['dec']
-            r = re.compile('.{2}:.{2}:.{2}\.*')
-            isNeg = dec.startswith('-')
-            if '-' in dec:
-                dec = dec.split('-')[1]
-            if '+' in dec:
-                dec = dec.split('+')[1]
-            if not r.match(dec):
-                errors.append('Invalid format for field \'dec\' ['+dec+']. Valid format is [+/-]dd:dd:dd.d')
-            dec = '-' + dec if isNeg else '+' + dec
-            self.__dict__.update({'dec':dec})
-
+            dec_decimal = dec_to_degrees(dec)
+            if dec_decimal is None:
+                errors.append('Invalid format for field \'dec\' ['+str(dec)+']. Valid format is [+/-]dd:mm:ss.s (within 90 degrees) or decimal degrees')
+            else:
+                if not isinstance(dec, str) or ':' not in dec:
+                    dec = degrees_to_dec(dec_decimal)
+                dec = dec.strip()
+                dec = dec if dec[0] in '+-' else '+' + dec
+                self.__dict__.update({'dec':dec})
+                if not decimal_agrees(selfdict.get('dec_decimal'), dec_decimal):
+                    self.__dict__.update({'dec_decimal':dec_decimal})
         else:
-            errors.append('Field \'dec\' is required. Valid format is [+/-]dd:dd:d.d')
+            errors.append('Field \'dec\' is required. Valid format is [+/-]dd:mm:ss.s')
 
         if 'epoch' not in selfkeys:
             warnings.append('Field \'epoch\' default set to 2000.0')
@@ -233,18 +322,9 @@ class Target(api):
 
         #validating required keys
         if 'instrumentid' in selfkeys:
-            instrumentid = selfdict['instrumentid']
-
-            #Binospec
-            if instrumentid in [16,'16']:
-                inst_errors, inst_warnings, inst_dict = bino_validate(selfdict)
-                errors.extend(inst_errors)
-                warnings.extend(inst_warnings)
-                self.__dict__.update(inst_dict)
-
-            #MMIRS...
-            if instrumentid in [15,'15']:
-                inst_errors, inst_warnings, inst_dict = mmirs_validate(selfdict)
+            instrument = get_instrument(selfdict['instrumentid'])
+            if instrument is not None:
+                inst_errors, inst_warnings, inst_dict = instrument.validate(selfdict)
                 errors.extend(inst_errors)
                 warnings.extend(inst_warnings)
                 self.__dict__.update(inst_dict)
@@ -280,14 +360,9 @@ class Target(api):
 
         if self.verbose:
             if not self.valid:
-                print('INPUT TARGET ERRORS: ')
-                for e in errors:
-                    print(e)
-                print()
+                log('INPUT TARGET ERRORS: \n{}\n'.format('\n'.join(errors)), logging.WARNING, errors=errors)
             if len(warnings) > 0:
-                print('INPUT TARGET WARNINGS: ')
-                for w in warnings:
-                    print(w)
+                log('INPUT TARGET WARNINGS: \n{}'.format('\n'.join(warnings)), logging.WARNING, warnings=warnings)
 
 
     def dump(self):
@@ -298,7 +373,7 @@ class Target(api):
 
     def update(self, **kwargs):
 
-        self.__dict__.update((key, value) for key, value in kwargs.items() if key in MMT_JSON_KEYS)
+        self.__dict__.update((key, value) for key, value in kwargs.items() if key in MMT_JSON_KEY_SET)
         self.validate()
 
         if self.valid:
@@ -314,14 +389,18 @@ class Target(api):
 
             self._put(r_json=data)
             r = self.request
-            print(json.loads(r.text), r.status_code)
+            log('{} {}'.format(r.json(), r.status_code), status=r.status_code, url=r.url)
 
             if r.status_code == 200:
-                self.__dict__.update((key, value) for key, value in json.loads(r.text).items())
+                self.__dict__.update((key, value) for key, value in r.json().items())
+                if self.cache is not None:
+                    self.cache.put(self.__dict__['id'], r.json(), local_fields(self), force=True)
+                if self.index is not None:
+                    self.index.add_record(self.__dict__)
             else:
-                print('Something went wrong with the request. Envoke target.request to see request information')
+                log('Something went wrong with the request. Envoke target.request to see request information', logging.ERROR)
         else:
-            print('Invalid Target. Envoke target.validate() to see errors')
+            log('Invalid Target. Envoke target.validate() to see errors', logging.ERROR)
 
 
     def delete(self):
@@ -335,16 +414,20 @@ class Target(api):
         }
         r = self._delete(r_json=data)
         if r.status_code == 200:
-            print("Succesfully Deleted")
+            log('Succesfully Deleted', targetid=self.__dict__['id'])
+            if self.cache is not None:
+                self.cache.invalidate(self.__dict__['id'])
+            if self.index is not None:
+                self.index.remove(self.__dict__['id'])
         else:
-            print('Something went wrong with the request. Envoke target.request to see request information')
+            log('Something went wrong with the request. Envoke target.request to see request information', logging.ERROR)
         if self.verbose:
-            print(json.loads(r.text), r.status_code)
+            log('{} {}'.format(r.json(), r.status_code), status=r.status_code, url=r.url)
 
 
     def post(self):
         if self.valid:
-            payload = dict((key, value) for key, value in self.__dict__.items() if key in MMT_JSON_KEYS)
+            payload = dict((key, value) for key, value in self.__dict__.items() if key in MMT_JSON_KEY_SET)
             payload['token'] = self.token
             data = {
                 'urlparams':{},
@@ -355,14 +438,38 @@ class Target(api):
             r = self._post(r_json=data)
 
             if self.verbose:
-                print(json.loads(r.text), r.status_code)
+                log('{} {}'.format(r.json(), r.status_code), status=r.status_code, url=r.url)
             if r.status_code == 200:
-                    self.__dict__.update((key, value) for key, value in json.loads(r.text).items())
+                    self.__dict__.update((key, value) for key, value in r.json().items())
                     self.targetid = self.id
-            else:
-                print('Something went wrong with the request. Envoke target.request to see request information')
-        else:
-            print('Invalid Target parameters. Envoke target.validate() to see errors')
+                    if self.cache is not None:
+                        self.cache.put(self.id, r.json(), local_fields(self), force=True)
+                    if self.index is not None:
+                        self.index.add_record(self.__dict__)
+            elif self.verbose:
+                log('Something went wrong with the request. Envoke target.request to see request information', logging.ERROR)
+            return r
+        elif self.verbose:
+            log('Invalid Target parameters. Envoke target.validate() to see errors', logging.ERROR)
+
+
+    def load_cached(self):
+        """
+        Hydrate the target from its cache, if it has one. Returns True if a
+        fresh record was found, so that no request is needed.
+        """
+        if self.cache is None:
+            return False
+        hit = self.cache.get(self.__dict__['targetid'])
+        if hit is None:
+            return False
+        record, local, fresh = hit
+        self.__dict__.update(local)
+        if fresh:
+            self.__dict__.update(record)
+            if self.index is not None:
+                self.index.add_record(self.__dict__)
+        return fresh
 
 
     def get(self):
@@ -375,99 +482,116 @@ class Target(api):
             },
         }
         request = self._get(r_json=data)
-        r = json.loads(request.text)
         if request.status_code == 200:
-            self.__dict__.update((key, value) for key, value in r.items())
+            self.hydrate(request.json())
         else:
-            print('Something went wrong with the request. Envoke target.request to see request information')
-
-
-    def upload_finder(self, finder_path):
+            if request.status_code == 404 and self.index is not None:
+                self.index.remove(self.__dict__['targetid'])
+            log('Something went wrong with the request. Envoke target.request to see request information', logging.ERROR)
+
+
+    def hydrate(self, record):
+        """
+        Update the target in place from a record fetched from the server,
+        and its cache and index with it.
+        """
+        self.__dict__.update((key, value) for key, value in record.items())
+        self.__dict__.setdefault('targetid', self.__dict__.get('id'))
+        if self.cache is not None:
+            self.cache.put(self.__dict__['targetid'], record, local_fields(self))
+        if self.index is not None:
+            self.index.add_record(self.__dict__)
+
+
+    def upload_finder(self, finder_path, force=False):
+        """
+        Upload a finding chart for the target, replacing any existing one.
+
+        The file is streamed rather than read into memory. Its sha256 is
+        kept with the target (and its cache), and the upload is skipped
+        (and None returned) when the same content was already uploaded and
+        the server still has it, unless force is set. Returns the response
+        otherwise.
+        """
         if self.valid:
-            if isinstance(finder_path, str):
+            if isinstance(finder_path, (str, os.PathLike)):
                 finder_file = open(finder_path, 'rb')
             else:  # if it's already a file object (e.g., from Django)
                 finder_file = finder_path.open('rb')
-            data = {
-                'urlparams': {
-                    'targetid':self.__dict__['targetid']
-                },
-                'data':{
-                    'type':'finding_chart',
-                    'token':self.token,
-                    'target_id':str(self.__dict__['id']),
-                },
-                'files':{
-                    'finding_chart_file': finder_file
-                },
-                'd_json':None
-            }
-            r = self._post(r_json=data)
+            with finder_file:
+                digest = finder_digest(finder_file)
+                if not force and finder_is_current(self, digest):
+                    if self.verbose:
+                        log('Finder of target {} is already uploaded'.format(self.__dict__['id']), targetid=self.__dict__['id'])
+                    return None
+                body = MultipartFile(
+                    fields={
+                        'type':'finding_chart',
+                        'token':self.token,
+                        'target_id':str(self.__dict__['id']),
+                    },
+                    name=FINDER_FIELD,
+                    fileobj=finder_file,
+                    filename=os.path.basename(getattr(finder_file, 'name', None) or 'finder'),
+                )
+                self._build_url({'targetid':self.__dict__['targetid']})
+                r = self._request('POST', data=body, headers={'Content-Type':body.content_type})
             if r.status_code == 200:
-                self.__dict__.update((key, value) for key, value in json.loads(r.text).items())
+                self.__dict__.update((key, value) for key, value in r.json().items())
+                record_finder_upload(self, digest)
+                if self.cache is not None:
+                    self.cache.put_local(self.__dict__['id'], local_fields(self))
             else:
-                print('Something went wrong with the request. Envoke target.request to see request information')
+                log('Something went wrong with the request. Envoke target.request to see request information', logging.ERROR)
             if self.verbose:
-                print(json.loads(r.text), r.status_code)
-
-
-    def download_exposures(self, force=False):
+                log('{} {}'.format(r.json(), r.status_code), status=r.status_code, url=r.url)
+            return r
+
+
+    def download_exposures(self, force=False, workers=4, retries=2, progress=None, refresh=False,
+                           data_types=('raw',), file_types=None):
+        """
+        Download the exposures of the target that are new or changed since
+        the last call.
+
+        data_types selects raw and/or reduced data and file_types, if given,
+        the datafile 'type' values to download. What has been downloaded is
+        tracked in a manifest next to the data (see pymmt.manifest). If the
+        target has not changed since the last complete download the
+        datalist is not requested at all, unless refresh=True. Files that
+        were changed on the server or damaged locally are downloaded again.
+        See pymmt.sync.sync_targets to download many targets at once.
+        """
         # also check the headers for the individual exposure times adding up to the total requested from api.get(targetid) method
         # to decide if it is done
         if (self.valid and self.iscomplete != 1) or force:
-            self.datalist = Datalist(token=self.token)
-            self.datalist.get(targetid=self.__dict__['id'])
-
-            parentdir = self.parentdir if 'parentdir' in self.__dict__.keys() else os.getcwd()
-            print('Length of datalist {}'.format(len(self.datalist.data)))
-            if len(self.datalist.data):
-                for d in self.datalist.data:
-                    name = d['name']
-                    datafiles = d['datafiles']
-                    for df in datafiles:
-                        ftype = df['type']
-                        filepath = '{}/data/{}/{}/{}'.format(parentdir, self.objectid, name, ftype)
-                        Path(filepath).mkdir(parents=True, exist_ok=True)
-                        datafileid = df['id']
-                        filename = df['filename']
-                        download_file = '{}/{}'.format(filepath, filename)
-
-                        if not os.path.exists(download_file):
-                            if self.verbose:
-                                print('Downloading: {}'.format(download_file))
-                            im = Image(token=self.token)
-                            im.get(datafileid=datafileid, filepath=download_file)
-                            self.partial_download = True
-
-                        else:
-                            if self.verbose:
-                                print('File \'{}\' already exists'.format(download_file))
-                                self.partial_download = True
-
-                self.downloaded = True
-                self.partial_download = False
-
-            #else:
-            #    if self.verbose:
-            #        print('Exposures have been take, but are not ready for download')
-
-            else:
+            report = sync_targets([self], data_types=data_types, file_types=file_types, workers=workers,
+                                  retries=retries, progress=progress, refresh=refresh, token=self.token,
+                                  verbose=self.verbose)
+            if report['total'] == 0 and not len(report['errors']):
                 if self.verbose:
-                    print('Exposures not taken yet.')
+                    log('Exposures not taken yet.', targetid=self.__dict__['id'])
+                return None
+            return self.download_report
         else:
             if self.verbose:
-                print('Exposure is completed')
+                log('Exposure is completed', targetid=self.__dict__.get('id'))
 
 
 class Instruments(api):
-    def __init__(self, token=None, verbose=True, payload={}):
+    """
+    Queries of the published MMT schedule.
+
+    The schedule is downloaded and indexed once and shared by all
+    Instruments objects until it is older than the cache TTL
+    (pymmt.schedule.SCHEDULE_CACHE.ttl, one hour by default).
+    """
+    def __init__(self, token=None, verbose=True, payload={}, cache=None):
         self. verbose = verbose
+        self.cache = cache if cache is not None else SCHEDULE_CACHE
         super().__init__('trimester//schedule/all/', token)
 
-    def get_instruments(self, date=None, instrumentid=None, getAll=False):
-        if date is None and instrumentid is None:
-            date = datetime.now()
-
+    def _fetch_schedule(self):
         r_json = {
             'urlparams':{},
             'd_json':{
@@ -475,35 +599,26 @@ class Instruments(api):
             }
         }
 
-        self._get(r_json=r_json)
+        return self._get(r_json=r_json).json()
 
-        schedule = json.loads(self.request.text)
-        published_queues = schedule['published']['queues']
-        ret = []
-
-        for pq in published_queues:
-            start = datetime.strptime(pq['queueruns'][0]['startdate'], '%Y-%m-%d %H:%M:%S-%f')
-            end = datetime.strptime(pq['queueruns'][0]['enddate'], '%Y-%m-%d %H:%M:%S-%f')
-            instid = pq['instrumentid']
-            queuename = pq['name']
-            for qr in pq['queueruns']:
-                start = datetime.strptime(qr['startdate'], '%Y-%m-%d %H:%M:%S-%f')
-                end = datetime.strptime(qr['enddate'], '%Y-%m-%d %H:%M:%S-%f')
-                if getAll:
-                    ret.append({'instrumentid':instid, 'name':queuename, 'start': start, 'end': end})
-                else:
-                    if instrumentid is None and (date > start and date < end):
-                        ret.append({'instrumentid':instid, 'name':queuename, 'start': start, 'end': end})
-                    if date is None and (instrumentid == int(instid)):
-                        ret.append({'instrumentid':instid, 'name':queuename, 'start': start, 'end': end})
+    def get_schedule(self, refresh=False):
+        return self.cache.get((self.base, self.token), self._fetch_schedule, refresh=refresh)
 
-        ret = sorted(ret, key=lambda i: i['start'])
+    def get_instruments(self, date=None, instrumentid=None, getAll=False, refresh=False):
+        if date is None and instrumentid is None:
+            date = datetime.now()
+
+        ret = self.get_schedule(refresh=refresh).select(date=date, instrumentid=instrumentid, getAll=getAll)
         if self.verbose:
             for r in ret:
-                print(r)
+                log(str(r), run=r)
         return ret
 
 
+def filter_schedule(schedule, date=None, instrumentid=None, getAll=False):
+    return Schedule(schedule).select(date=date, instrumentid=instrumentid, getAll=getAll)
+
+
 class Datalist(api):
     def __init__(self, token=None, verbose=True, payload={}):
         self.verbose = verbose
@@ -526,7 +641,7 @@ class Datalist(api):
         if self.request.status_code == 200:
             self.data = self.request.json()
         else:
-            print('Datalist request error')
+            log('Datalist request error', logging.ERROR, targetid=targetid, status=self.request.status_code)
 
 
 class Image(api):
@@ -535,7 +650,19 @@ class Image(api):
         super().__init__('data/download/datafile', token)
 
 
-    def get(self, datafileid=None, filepath=os.getcwd()):
+    def get(self, datafileid=None, filepath=os.getcwd(), stream=True, chunk_size=1024*1024, resume=True):
+        """
+        Download a datafile to filepath.
+
+        With stream=True the body is written in chunk_size pieces to
+        '<filepath>.part', which is renamed to filepath once complete, so
+        memory use does not depend on the file size. If a '.part' file is
+        left over from an interrupted download and resume=True, only the
+        missing bytes are requested with an HTTP Range header; servers that
+        ignore the Range header just send the whole file again.
+
+        Returns True if the file was written.
+        """
 
         assert datafileid is not None, 'datafileid cannot be None'
         r_json = {
@@ -545,46 +672,248 @@ class Image(api):
             }
         }
 
-        self._get(r_json=r_json)
+        if not stream:
+            self._get(r_json=r_json)
 
-        if self.request.status_code == 200:
+            if self.request.status_code == 200:
+                if self.verbose:
+                    log('Writing file.', datafileid=datafileid, filepath=filepath)
+                with open(filepath, 'wb') as f:
+                    f.write(self.request.content)
+                self.request = None
+                return True
+            else:
+                log('Image download request error', logging.ERROR, datafileid=datafileid, status=self.request.status_code)
+                return False
+
+        partpath = '{}.part'.format(filepath)
+        offset = os.path.getsize(partpath) if resume and os.path.exists(partpath) else 0
+        headers = {'Range':'bytes={}-'.format(offset)} if offset else {}
+
+        with self._get(r_json=r_json, stream=True, headers=headers) as r:
+            if r.status_code == 416 and offset:
+                # the partial file is no longer valid for this datafile, start over
+                r.close()
+                os.remove(partpath)
+                return self.get(datafileid=datafileid, filepath=filepath, stream=True, chunk_size=chunk_size, resume=False)
+
+            if r.status_code not in [200, 206]:
+                log('Image download request error', logging.ERROR, datafileid=datafileid, status=self.request.status_code)
+                self.request = None
+                return False
+
+            mode = 'ab' if r.status_code == 206 else 'wb'
             if self.verbose:
-                print('Writing file.')
-            open(filepath, 'wb').write(self.request.content)
-            self.request = None
-        else:
-            print('Image download request error')
+                if mode == 'ab':
+                    log('Resuming file at byte {}.'.format(offset), datafileid=datafileid, filepath=filepath, offset=offset)
+                else:
+                    log('Writing file.', datafileid=datafileid, filepath=filepath)
+            with open(partpath, mode) as f:
+                for chunk in r.iter_content(chunk_size=chunk_size):
+                    if chunk:
+                        f.write(chunk)
+
+        os.replace(partpath, filepath)
+        self.request = None
+        return True
 
 
 class Listener():
-    def __init__(self, token=None, targetid=None):
+    """
+    Watch one or more targets and download their exposures as they arrive.
+
+    Targets are polled concurrently on a pool of `workers` threads. Each
+    target keeps its own polling interval: it is reset to `min_interval`
+    whenever the target's 'modified', 'percentcompleted' or 'iscomplete'
+    values change or new datafiles are downloaded, and grows by a factor of
+    `backoff` (up to `max_interval`) on every poll where nothing changed.
+    Exposures are only downloaded when something changed or an earlier
+    download is still incomplete. Targets that are complete and fully
+    downloaded are no longer polled.
+
+    Targets are given by id, or as already loaded Target objects with
+    targets=[...].
+
+    When at least `bulk_threshold` targets are due at once, they are
+    refreshed together with refresh_targets, which lists the token's
+    targets a page at a time instead of getting each one, and only falls
+    back to one request per target when the listing is not available.
+
+    Callbacks can be registered with add_hook for the events
+    'changed' (target), 'new_datafiles' (target, results),
+    'complete' (target) and 'error' (target, exception).
+    """
+    HOOK_EVENTS = ('changed', 'new_datafiles', 'complete', 'error')
+    # subclasses that are given their targets later may start with none
+    require_targets = True
+
+    def __init__(self, token=None, targetid=None, targetids=[], workers=8, min_interval=60, max_interval=1800,
+                 backoff=2.0, verbose=True, targets=[], bulk_threshold=20):
         assert token is not None, 'token cannot be None'
-        assert targetid is not None, 'targetid cannot be None'
+        targetids = list(targetids) + ([targetid] if targetid is not None else [])
+        assert len(targetids) or len(targets) or not self.require_targets, 'targetid cannot be None'
+        assert workers >= 1, 'workers must be at least 1'
         self.token = token
+        self.workers = workers
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.verbose = verbose
+        self.bulk_threshold = bulk_threshold
+        self.hooks = dict((event, []) for event in self.HOOK_EVENTS)
+        self.state = {}
         self.targets = []
-        self.targets.append(Target(token=self.token, payload={'targetid':targetid})) 
+        self._stop = threading.Event()
         #self.listener_log = payload['logpath'] if 'logpath' in payload.keys() else os.getcwd()
 
-    def listen(self, Force=True):
+        for t in targets:
+            self.add_target(t)
+        if len(targetids):
+            with ThreadPoolExecutor(max_workers=min(workers, len(targetids))) as pool:
+                for t in pool.map(self._load_target, targetids):
+                    self.add_target(t)
 
-        start_time = datetime.now()
-        all_downloaded = all([x.downloaded for x in self.targets])
 
-        run_listener = not all_downloaded or Force
+    def _load_target(self, targetid):
+        return Target(token=self.token, verbose=self.verbose, payload={'targetid':targetid})
 
-        while run_listener:
 
-            for t in self.targets:
-                t.get()
-                print(t.objectid)
-                t.download_exposures(force=Force)
+    def add_target(self, target):
+        if not isinstance(target, Target):
+            target = self._load_target(target)
+        self.targets.append(target)
+        self.state[target.id] = {
+            'signature':None,
+            'interval':self.min_interval,
+            'next_poll':0.0,
+            'polls':0,
+            'done':False,
+        }
+        return target
 
-            run_listener = not all([x.downloaded for x in self.targets])
 
-            if run_listener:
-                print("Sleeping for 60s")
-                time.sleep(60)
-            else:
-                print('Download finished :)')
+    def add_hook(self, event, func):
+        assert event in self.HOOK_EVENTS, 'event must be one of {}'.format(', '.join(self.HOOK_EVENTS))
+        self.hooks[event].append(func)
 
-        pass
+
+    def _fire(self, event, *args):
+        for func in self.hooks[event]:
+            func(*args)
+
+
+    def _poll(self, t, Force=False, fetched=False):
+        state = self.state[t.id]
+        # the first poll reuses the record fetched when the Target was built
+        if state['polls'] and not fetched:
+            t.get()
+        state['polls'] += 1
+
+        signature = (t.__dict__.get('modified'), t.__dict__.get('percentcompleted'), t.__dict__.get('iscomplete'))
+        changed = signature != state['signature']
+        state['signature'] = signature
+
+        exposed = t.__dict__.get('iscomplete') == 1 or (isFloat(t.__dict__.get('percentcompleted')) and float(t.percentcompleted) > 0)
+        waiting = t.partial_download or (exposed and not t.downloaded)
+
+        new = []
+        if changed or waiting or Force:
+            if self.verbose:
+                log(t.objectid, targetid=t.id)
+            report = t.download_exposures(force=True)
+            if report is not None:
+                new = report['downloaded']
+
+        state['done'] = t.__dict__.get('iscomplete') == 1 and t.downloaded and not t.partial_download
+        if changed or len(new):
+            state['interval'] = self.min_interval
+        else:
+            state['interval'] = min(state['interval'] * self.backoff, self.max_interval)
+        state['next_poll'] = time.monotonic() + state['interval']
+        return changed, new
+
+
+    def remove_target(self, targetid):
+        """
+        Stop watching a target. Returns the removed Target, or None.
+        """
+        for t in self.targets:
+            if str(t.id) == str(targetid):
+                self.targets.remove(t)
+                del self.state[t.id]
+                return t
+        return None
+
+
+    def stop(self):
+        self._stop.set()
+
+
+    def active(self):
+        return [t for t in self.targets if not self.state[t.id]['done']]
+
+
+    def poll_due(self, pool, Force=False):
+        """
+        Poll the targets whose next poll is due on `pool` and fire the hooks.
+        Returns the number of targets polled.
+        """
+        now = time.monotonic()
+        due = [t for t in self.active() if self.state[t.id]['next_poll'] <= now]
+        fetched = set()
+        stale = [t for t in due if self.state[t.id]['polls']]
+        if self.bulk_threshold is not None and len(stale) >= self.bulk_threshold:
+            report = refresh_targets(stale, token=self.token, workers=self.workers, verbose=self.verbose)
+            failed = set(id(f['target']) for f in report['failed'])
+            fetched = set(id(t) for t in stale if id(t) not in failed)
+        futures = dict((pool.submit(self._poll, t, Force, id(t) in fetched), t) for t in due)
+        for future in as_completed(futures):
+            t = futures[future]
+            try:
+                changed, new = future.result()
+            except Exception as e:
+                state = self.state[t.id]
+                state['interval'] = min(state['interval'] * self.backoff, self.max_interval)
+                state['next_poll'] = time.monotonic() + state['interval']
+                log('Polling target {} failed: {}'.format(t.id, e), logging.ERROR, targetid=t.id)
+                self._fire('error', t, e)
+                continue
+            if changed:
+                self._fire('changed', t)
+            if len(new):
+                self._fire('new_datafiles', t, new)
+            if self.state[t.id]['done']:
+                self._fire('complete', t)
+        return len(futures)
+
+
+    def next_wait(self):
+        """
+        Seconds until the next poll is due, or None if no target is active.
+        """
+        active = self.active()
+        if not len(active):
+            return None
+        return max(0, min(self.state[t.id]['next_poll'] for t in active) - time.monotonic())
+
+
+    def listen(self, Force=False):
+        """
+        Poll targets until every one is complete and downloaded, or until
+        stop() is called. With Force=True exposures are checked on every
+        poll, even when nothing about the target changed.
+        """
+        self._stop.clear()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while not self._stop.is_set():
+                if not len(self.active()):
+                    log('Download finished :)')
+                    break
+
+                self.poll_due(pool, Force)
+
+                wait = self.next_wait()
+                if wait is not None:
+                    if self.verbose:
+                        log('Sleeping for {:.0f}s'.format(wait), wait=wait)
+                    self._stop.wait(wait)
@@ -0,0 +1,231 @@
+import threading, time
+from datetime import datetime, timezone
+
+
+class TokenBucket():
+    """
+    Thread-safe token bucket allowing `rate` operations per second on
+    average, with bursts of up to `capacity` operations.
+    """
+    def __init__(self, rate, capacity=None):
+        assert rate > 0, 'rate must be greater than zero'
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity is not None else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+    def _take(self, tokens):
+        # take the tokens if available; else the seconds until they will be
+        with self.lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            return (tokens - self.tokens) / self.rate
+
+
+    def acquire(self, tokens=1):
+        """
+        Block until `tokens` tokens are available and take them.
+        """
+        while True:
+            wait = self._take(tokens)
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+    async def acquire_async(self, tokens=1):
+        import asyncio
+
+        while True:
+            wait = self._take(tokens)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+# Responses that mean the server wants fewer requests.
+THROTTLE_STATUS = (429, 503)
+# seconds between checks of a full limiter by waiting coroutines
+ASYNC_POLL_INTERVAL = 0.005
+
+LIMITER_DEFAULTS = {
+    'initial': 8,
+    'min_limit': 1,
+    'max_limit': 32,
+    'decrease': 0.5,
+    'latency_target': None,
+    'rate': None,
+    'burst': None,
+    'retries': 3,
+    'backoff': 0.5,
+    'max_wait': 60.0,
+}
+
+
+def parse_retry_after(value):
+    """
+    Seconds to wait from a Retry-After header (delay-seconds or HTTP date),
+    or None.
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+class AdaptiveLimiter():
+    """
+    Thread-safe client-side limit on the requests in flight, adjusted by
+    AIMD (additive increase, multiplicative decrease).
+
+    Every successful request raises the concurrency limit by 1/limit, i.e.
+    by about one per round of `limit` requests, up to `max_limit`. A
+    throttled (429/503) or failed request, or one slower than
+    `latency_target` seconds, multiplies the limit by `decrease`; requests
+    that were sent before the last decrease do not decrease it again, so a
+    burst of errors from requests already in flight only counts once. A
+    Retry-After delay holds back every request sharing the limiter. With `rate` set, requests are
+    additionally spaced by a TokenBucket of `rate` per second.
+    """
+    def __init__(self, initial=8, min_limit=1, max_limit=32, decrease=0.5, latency_target=None,
+                 rate=None, burst=None, retries=3, backoff=0.5, max_wait=60.0):
+        assert 1 <= min_limit <= initial <= max_limit, 'limits must satisfy 1 <= min_limit <= initial <= max_limit'
+        assert 0 < decrease < 1, 'decrease must be between 0 and 1'
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.bucket = TokenBucket(rate, burst) if rate is not None else None
+        self.retries = retries
+        self.backoff = backoff
+        self.max_wait = max_wait
+
+        self.inflight = 0
+        self.blocked_until = 0.0
+        self.last_decrease = -1.0
+        self.cond = threading.Condition()
+        self.stats = {'requests':0, 'throttled':0, 'errors':0, 'slow':0, 'decreases':0, 'waited':0.0}
+
+
+    def _grant(self, start):
+        # called holding self.cond: take a slot if one is free and return
+        # (granted time, None), or (None, seconds to wait or None)
+        wait = self.blocked_until - time.monotonic()
+        if wait <= 0 and self.inflight < int(self.limit):
+            self.inflight += 1
+            granted = time.monotonic()
+            self.stats['waited'] += granted - start
+            return granted, None
+        return None, (wait if wait > 0 else None)
+
+
+    def acquire(self):
+        """
+        Block until a request may be sent and take a slot for it. Returns
+        the time the slot was granted, to be passed on to release().
+        """
+        start = time.monotonic()
+        if self.bucket is not None:
+            self.bucket.acquire()
+        with self.cond:
+            while True:
+                granted, wait = self._grant(start)
+                if granted is not None:
+                    return granted
+                self.cond.wait(wait)
+
+
+    async def acquire_async(self):
+        """
+        acquire() for coroutines, waiting on the event loop instead of
+        blocking it; a full limiter is checked again every
+        ASYNC_POLL_INTERVAL seconds.
+        """
+        import asyncio
+
+        start = time.monotonic()
+        if self.bucket is not None:
+            await self.bucket.acquire_async()
+        while True:
+            with self.cond:
+                granted, wait = self._grant(start)
+            if granted is not None:
+                return granted
+            await asyncio.sleep(wait if wait is not None else ASYNC_POLL_INTERVAL)
+
+
+    def release(self, started=None, status=None, retry_after=None, error=False):
+        """
+        Give back the slot taken at `started` and adjust the limit from how
+        the request went.
+        """
+        now = time.monotonic()
+        latency = now - started if started is not None else None
+        with self.cond:
+            self.inflight -= 1
+            self.stats['requests'] += 1
+            throttled = status in THROTTLE_STATUS
+            slow = self.latency_target is not None and latency is not None and latency > self.latency_target
+            self.stats['throttled'] += throttled
+            self.stats['errors'] += error
+            self.stats['slow'] += slow
+
+            if retry_after is not None:
+                self.blocked_until = max(self.blocked_until, now + min(retry_after, self.max_wait))
+            if throttled or error or slow:
+                if started is None or started > self.last_decrease:
+                    self.limit = max(float(self.min_limit), self.limit * self.decrease)
+                    self.last_decrease = now
+                    self.stats['decreases'] += 1
+            else:
+                self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+            self.cond.notify_all()
+
+
+    def summary(self):
+        with self.cond:
+            return dict(self.stats, limit=self.limit, inflight=self.inflight)
+
+
+_limiter_lock = threading.Lock()
+_limiter = AdaptiveLimiter(**LIMITER_DEFAULTS)
+
+
+def configure_limiter(enabled=True, **kwargs):
+    """
+    Replace the limiter shared by all api requests with one built from the
+    given settings (the keys of LIMITER_DEFAULTS); enabled=False turns
+    client-side limiting off, and with it the retrying of 429 and 503
+    responses.
+    """
+    global _limiter
+    unknown = set(kwargs) - set(LIMITER_DEFAULTS)
+    assert not unknown, 'Unknown limiter settings: {}'.format(', '.join(sorted(unknown)))
+    with _limiter_lock:
+        _limiter = AdaptiveLimiter(**dict(LIMITER_DEFAULTS, **kwargs)) if enabled else None
+    return _limiter
+
+
+def get_limiter():
+    return _limiter
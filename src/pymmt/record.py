@@ -0,0 +1,122 @@
+from dataclasses import dataclass, fields
+from typing import Any, Optional
+from . import MMT_JSON_KEYS, MMT_JSON_KEY_SET
+
+
+def _int(value):
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, float) and not value.is_integer():
+        return value
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _float(value):
+    if value is None or isinstance(value, float):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+@dataclass(slots=True)
+class TargetRecord():
+    """
+    Compact, typed copy of an MMT catalog target.
+
+    Uses __slots__ instead of a per-instance __dict__, and stores ids,
+    flags, priorities and exposure times (whole seconds) as ints and
+    coordinates, magnitudes and lengths as floats, like the server sends
+    them. Values that do not parse are kept as they came. Convert with
+    TargetRecord.from_json(payload) and record.to_json(); to_target()
+    builds a full Target without a network request.
+    """
+    id: Optional[int] = None
+    ra: Optional[str] = None
+    objectid: Optional[str] = None
+    observationtype: Optional[str] = None
+    moon: Any = None
+    seeing: Any = None
+    photometric: Optional[int] = None
+    priority: Optional[int] = None
+    dec: Optional[str] = None
+    ra_decimal: Optional[float] = None
+    dec_decimal: Optional[float] = None
+    pm_ra: Optional[float] = None
+    pm_dec: Optional[float] = None
+    magnitude: Optional[float] = None
+    exposuretime: Optional[int] = None
+    numberexposures: Optional[int] = None
+    visits: Optional[int] = None
+    onevisitpernight: Optional[int] = None
+    filter: Optional[str] = None
+    grism: Optional[str] = None
+    grating: Any = None
+    centralwavelength: Optional[float] = None
+    readtab: Optional[str] = None
+    gain: Optional[str] = None
+    dithersize: Any = None
+    epoch: Any = None
+    submitted: Optional[str] = None
+    modified: Optional[str] = None
+    notes: Optional[str] = None
+    pa: Optional[float] = None
+    maskid: Optional[int] = None
+    slitwidth: Optional[str] = None
+    slitwidthproperty: Optional[str] = None
+    iscomplete: Optional[int] = None
+    disabled: Optional[int] = None
+    notify: Optional[int] = None
+    locked: Optional[int] = None
+    findingchartfilename: Optional[str] = None
+    instrumentid: Optional[int] = None
+    targetofopportunity: Optional[int] = None
+    reduced: Optional[int] = None
+    exposuretimeremaining: Optional[int] = None
+    totallength: Optional[float] = None
+    totallengthformatted: Optional[str] = None
+    exposuretimeremainingformatted: Optional[str] = None
+    exposuretimecompleted: Optional[int] = None
+    percentcompleted: Optional[float] = None
+    offsetstars: Any = None
+    details: Any = None
+    mask: Any = None
+
+    @classmethod
+    def from_json(cls, payload):
+        record = cls()
+        for key, value in payload.items():
+            if key in MMT_JSON_KEY_SET:
+                convert = CONVERTERS.get(key)
+                setattr(record, key, value if convert is None else convert(value))
+        return record
+
+    @classmethod
+    def from_target(cls, target):
+        return cls.from_json(target.__dict__)
+
+    def to_json(self, drop_none=False):
+        if drop_none:
+            return dict((key, value) for key in MMT_JSON_KEYS if (value := getattr(self, key)) is not None)
+        return dict((key, getattr(self, key)) for key in MMT_JSON_KEYS)
+
+    def to_target(self, token=None, verbose=False):
+        from .pymmt import Target
+        target = Target(token=token, verbose=verbose, payload=self.to_json(drop_none=True))
+        if self.id is not None:
+            target.targetid = self.id
+        return target
+
+
+assert frozenset(f.name for f in fields(TargetRecord)) == MMT_JSON_KEY_SET, 'TargetRecord fields must match MMT_JSON_KEYS'
+
+CONVERTERS = {}
+for f in fields(TargetRecord):
+    if f.type == Optional[int]:
+        CONVERTERS[f.name] = _int
+    elif f.type == Optional[float]:
+        CONVERTERS[f.name] = _float
@@ -0,0 +1,158 @@
+import json, threading
+
+# JSON decoders in order of preference for backend='auto'
+JSON_BACKENDS = ('orjson', 'msgspec', 'json')
+
+
+def _orjson():
+    import orjson
+    return orjson.loads
+
+
+def _msgspec():
+    import msgspec
+    return msgspec.json.decode
+
+
+_LOADERS = {
+    'orjson':_orjson,
+    'msgspec':_msgspec,
+    'json':lambda: json.loads,
+}
+
+_json_lock = threading.Lock()
+_json_backend = None
+_json_loads = None
+
+
+def configure_json(backend='auto'):
+    """
+    Choose the decoder of API response bodies: 'orjson' or 'msgspec' (which
+    must be installed), 'json' for the standard library, or 'auto' for the
+    first of JSON_BACKENDS that is installed. Returns the backend name.
+    """
+    global _json_backend, _json_loads
+    assert backend == 'auto' or backend in JSON_BACKENDS, 'backend must be auto or one of {}'.format(', '.join(JSON_BACKENDS))
+    for name in (JSON_BACKENDS if backend == 'auto' else (backend,)):
+        try:
+            loads = _LOADERS[name]()
+        except ImportError:
+            if backend != 'auto':
+                raise ImportError('The {0} JSON backend is not installed. Install it with: pip install {0}'.format(name))
+            continue
+        with _json_lock:
+            _json_backend, _json_loads = name, loads
+        return name
+
+
+def get_json_backend():
+    if _json_loads is None:
+        configure_json()
+    return _json_backend
+
+
+def loads(data):
+    """
+    Decode a JSON document (bytes or str) with the configured backend.
+
+    Documents a fast backend rejects (NaN, integers beyond 64 bits, invalid
+    JSON) are decoded again with the json module, so that results and
+    errors (json.JSONDecodeError) are the same whatever the backend.
+    """
+    if _json_loads is None:
+        configure_json()
+    if _json_loads is not json.loads:
+        try:
+            return _json_loads(data)
+        except Exception:
+            pass
+    return json.loads(data)
+
+
+_UNDECODED = object()
+
+
+class Response():
+    """
+    The status, headers and body of a finished API request.
+
+    The body is decoded at most once: json() parses it with the configured
+    backend on the first call and returns the same object afterwards, and
+    the raw bytes are then released. content and text are rebuilt from the
+    decoded value if asked for later. Bodies that are not JSON (e.g.
+    datafiles) are kept as they are.
+    """
+    def __init__(self, status_code, headers, content, url, reason=None, encoding=None, elapsed=None):
+        self.status_code = status_code
+        self.headers = headers
+        self.url = url
+        self.reason = reason
+        self.encoding = encoding or 'utf-8'
+        self.elapsed = elapsed
+        self._content = content
+        self._data = _UNDECODED
+        self._lock = threading.Lock()
+
+
+    @classmethod
+    def from_requests(cls, r):
+        """
+        Keep what is needed of a loaded requests.Response, without its
+        connection, prepared request or raw stream.
+        """
+        return cls(r.status_code, r.headers, r.content, r.url, reason=r.reason, encoding=r.encoding, elapsed=r.elapsed)
+
+
+    def json(self):
+        if self._data is _UNDECODED:
+            with self._lock:
+                if self._data is _UNDECODED:
+                    self._data = loads(self._content)
+                    self._content = None
+        return self._data
+
+
+    @property
+    def content(self):
+        content = self._content
+        if content is None and self._data is not _UNDECODED:
+            return json.dumps(self._data).encode()
+        return content
+
+
+    @property
+    def text(self):
+        content = self.content
+        return '' if content is None else content.decode(self.encoding, errors='replace')
+
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+
+    def raise_for_status(self):
+        from requests.exceptions import HTTPError
+
+        if not self.ok:
+            raise HTTPError('{} {} for url: {}'.format(self.status_code, self.reason or '', self.url), response=self)
+
+
+    def close(self):
+        pass
+
+
+    def __bool__(self):
+        return self.ok
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def __repr__(self):
+        return '<Response [{}]>'.format(self.status_code)
@@ -0,0 +1,185 @@
+import os, json, hashlib, threading, time
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S-%f'
+
+
+class Schedule():
+    """
+    Parsed published MMT queue schedule with an interval index per
+    instrument.
+
+    Every queue run is parsed once into a dict with the keys instrumentid,
+    name, start and end. For each instrument the runs are kept sorted by
+    start together with a running maximum of their end dates, so that
+    point-in-time, next-run and range queries are answered by bisection.
+    """
+    def __init__(self, schedule):
+        self.runs = []
+        for pq in schedule['published']['queues']:
+            for qr in pq['queueruns']:
+                self.runs.append({
+                    'instrumentid':pq['instrumentid'],
+                    'name':pq['name'],
+                    'start':datetime.strptime(qr['startdate'], DATE_FORMAT),
+                    'end':datetime.strptime(qr['enddate'], DATE_FORMAT),
+                })
+        self.runs.sort(key=lambda r: r['start'])
+
+        self.index = {}
+        for run in self.runs:
+            self.index.setdefault(int(run['instrumentid']), []).append(run)
+        self.starts, self.maxends = {}, {}
+        for instid, runs in self.index.items():
+            self.starts[instid] = [r['start'] for r in runs]
+            maxends, latest = [], None
+            for r in runs:
+                latest = r['end'] if latest is None or r['end'] > latest else latest
+                maxends.append(latest)
+            self.maxends[instid] = maxends
+
+
+    def _overlapping(self, instid, start, end):
+        # runs with run.start < end and run.end > start, in start order
+        runs, maxends = self.index[instid], self.maxends[instid]
+        i = bisect_left(self.starts[instid], end) - 1
+        found = []
+        while i >= 0 and maxends[i] > start:
+            if runs[i]['end'] > start:
+                found.append(runs[i])
+            i -= 1
+        return found[::-1]
+
+
+    def _instruments(self, instrumentid):
+        if instrumentid is None:
+            return list(self.index)
+        return [int(instrumentid)] if int(instrumentid) in self.index else []
+
+
+    def at(self, date, instrumentid=None):
+        """
+        Runs in progress at date (strictly between their start and end).
+        """
+        ret = []
+        for instid in self._instruments(instrumentid):
+            ret.extend(r for r in self._overlapping(instid, date, date) if r['start'] < date)
+        return sorted(ret, key=lambda r: r['start'])
+
+
+    def between(self, start, end, instrumentid=None):
+        """
+        Runs that overlap the period from start to end.
+        """
+        ret = []
+        for instid in self._instruments(instrumentid):
+            ret.extend(self._overlapping(instid, start, end))
+        return sorted(ret, key=lambda r: r['start'])
+
+
+    def next_run(self, instrumentid, date=None):
+        """
+        The run of an instrument in progress at date, or else the first one
+        starting after it. None if there is no such run.
+        """
+        date = datetime.now() if date is None else date
+        current = self.at(date, instrumentid)
+        if len(current):
+            return current[0]
+        instid = int(instrumentid)
+        if instid not in self.index:
+            return None
+        i = bisect_right(self.starts[instid], date)
+        return self.index[instid][i] if i < len(self.index[instid]) else None
+
+
+    def is_available(self, instrumentid, date=None):
+        return len(self.at(datetime.now() if date is None else date, instrumentid)) > 0
+
+
+    def select(self, date=None, instrumentid=None, getAll=False):
+        """
+        The selection made by Instruments.get_instruments: every run with
+        getAll, the runs of an instrument, the runs in progress at a date,
+        or the runs of an instrument in progress at a date.
+        """
+        if getAll:
+            ret = self.runs
+        elif date is None:
+            ret = self.index.get(int(instrumentid), [])
+        else:
+            ret = self.at(date, instrumentid)
+        return [dict(r) for r in ret]
+
+
+class ScheduleCache():
+    """
+    Thread-safe holder of parsed schedules, keyed by API base url and token,
+    that are refetched once they are older than `ttl` seconds.
+
+    With a `path` (a directory), the schedule json is also written to disk
+    so that other processes, such as repeated command-line calls, can use
+    it while it is younger than the TTL.
+    """
+    def __init__(self, ttl=3600, path=None):
+        self.ttl = ttl
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+
+
+    def _file(self, key):
+        return os.path.join(self.path, 'schedule-{}.json'.format(hashlib.sha1(repr(key).encode()).hexdigest()[:16]))
+
+
+    def lookup(self, key):
+        """
+        The cached schedule for key if it is younger than the TTL, else None.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            return entry[1]
+        if self.path is not None:
+            try:
+                age = time.time() - os.path.getmtime(self._file(key))
+                if age < self.ttl:
+                    with open(self._file(key)) as f:
+                        schedule = Schedule(json.load(f))
+                    with self.lock:
+                        self.entries[key] = (time.monotonic() - age, schedule)
+                    return schedule
+            except (OSError, ValueError, KeyError):
+                pass
+        return None
+
+
+    def store(self, key, schedule):
+        if self.path is not None:
+            os.makedirs(self.path, exist_ok=True)
+            tmp = '{}.{}.tmp'.format(self._file(key), os.getpid())
+            with open(tmp, 'w') as f:
+                json.dump(schedule, f)
+            os.replace(tmp, self._file(key))
+        schedule = Schedule(schedule)
+        with self.lock:
+            self.entries[key] = (time.monotonic(), schedule)
+        return schedule
+
+
+    def get(self, key, fetch, refresh=False):
+        """
+        The cached schedule for key, calling fetch() for the schedule json
+        when there is none, it is too old, or refresh is set.
+        """
+        schedule = None if refresh else self.lookup(key)
+        return schedule if schedule is not None else self.store(key, fetch())
+
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+
+
+SCHEDULE_CACHE = ScheduleCache()
@@ -0,0 +1,98 @@
+import threading
+
+# Connection pool and retry defaults for the shared scheduler session.
+# pool_connections is the number of distinct hosts kept in the pool and
+# pool_maxsize the number of keep-alive connections kept per host. The
+# session only retries connection and read errors; responses (the 5xx of
+# status_forcelist, and 429 and 503) are retried by api._request, through
+# the shared limiter in pymmt.ratelimit, so that it sees every attempt.
+SESSION_DEFAULTS = {
+    'pool_connections': 4,
+    'pool_maxsize': 16,
+    'pool_block': False,
+    'timeout': (10, 120),
+    'retries': 3,
+    'backoff_factor': 0.5,
+    'status_forcelist': (500, 502, 504),
+    'allowed_methods': ('GET', 'PUT', 'DELETE'),
+}
+
+_lock = threading.Lock()
+_session = None
+_config = dict(SESSION_DEFAULTS)
+
+
+def _build_session(config):
+    # the HTTP stack is only imported once the first request is made
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=config['retries'],
+        connect=config['retries'],
+        read=config['retries'],
+        status=0,
+        backoff_factor=config['backoff_factor'],
+        allowed_methods=frozenset(config['allowed_methods']),
+        raise_on_status=False,
+        respect_retry_after_header=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=config['pool_connections'],
+        pool_maxsize=config['pool_maxsize'],
+        pool_block=config['pool_block'],
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def configure_session(**kwargs):
+    """
+    Replace the shared session with one built from the given settings.
+
+    Valid keyword arguments are the keys of SESSION_DEFAULTS. Settings that
+    are not passed keep their current value. Connections held by the old
+    session are closed.
+    """
+    global _session
+    unknown = set(kwargs) - set(SESSION_DEFAULTS)
+    assert not unknown, 'Unknown session settings: {}'.format(', '.join(sorted(unknown)))
+
+    with _lock:
+        _config.update(kwargs)
+        old, _session = _session, _build_session(_config)
+    if old is not None:
+        old.close()
+    return _session
+
+
+def get_session():
+    """
+    Return the process-wide pooled session, creating it on first use.
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _build_session(_config)
+    return _session
+
+
+def get_timeout():
+    return _config['timeout']
+
+
+def close_session():
+    global _session
+    with _lock:
+        old, _session = _session, None
+    if old is not None:
+        old.close()
+
+
+def get_session_config():
+    return dict(_config)
@@ -0,0 +1,164 @@
+import json, threading
+
+# request arguments that may differ between coalesced requests; any other
+# (stream, headers, data, ...) keeps a request out of coalescing
+COALESCED_KWARGS = ('json', 'params', 'timeout')
+
+
+def request_key(method, url, kwargs, scope=None):
+    """
+    Key under which a request can share the response of an identical one,
+    or None if it must be sent on its own. Only plain GETs are coalesced:
+    same url, query parameters and JSON body, and the same `scope` (e.g. a
+    session other than the shared one).
+    """
+    if method != 'GET' or set(kwargs) - set(COALESCED_KWARGS):
+        return None
+    try:
+        body = json.dumps(kwargs.get('json'), sort_keys=True, separators=(',', ':'))
+        params = json.dumps(kwargs.get('params'), sort_keys=True, separators=(',', ':'))
+    except (TypeError, ValueError):
+        return None
+    return (scope, method, url, params, body)
+
+
+class _Call():
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight():
+    """
+    Coalesces concurrent identical calls: while a call for a key is in
+    flight, every other caller with the same key waits for it and gets its
+    result (or its exception) instead of making the call again.
+
+    do() is for threads and do_async() for coroutines; calls are only
+    shared within one event loop. 'calls' counts the calls made and
+    'saved' those answered by a call already in flight.
+
+    The result is not copied: every caller gets the same object, so for
+    API requests the same Response and, through its json(), the same
+    decoded dict or list. Treat these as read-only and copy them before
+    changing them.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.inflight = {}
+        self.calls = 0
+        self.saved = 0
+
+
+    def do(self, key, func):
+        """
+        Returns (result, shared), with shared True if the result came from
+        another caller's call.
+        """
+        with self.lock:
+            call = self.inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self.inflight[key] = _Call()
+                self.calls += 1
+            else:
+                self.saved += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.inflight[key]
+            call.done.set()
+        return call.result, False
+
+
+    async def do_async(self, key, func):
+        """
+        Awaitable do(): func is a coroutine function. If the caller making
+        the call is cancelled, the callers waiting on it try again.
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        key = ('asyncio', id(loop), key)
+        while True:
+            with self.lock:
+                future = self.inflight.get(key)
+                leader = future is None
+                if leader:
+                    future = self.inflight[key] = loop.create_future()
+                    self.calls += 1
+                else:
+                    self.saved += 1
+            if leader:
+                break
+            try:
+                return await asyncio.shield(future), True
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                with self.lock:
+                    self.saved -= 1
+
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # retrieved here so that a call nobody waited for is not reported
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self.lock:
+                del self.inflight[key]
+        return result, False
+
+
+    def summary(self):
+        with self.lock:
+            return {
+                'calls':self.calls,
+                'saved':self.saved,
+                'in_flight':len(self.inflight),
+            }
+
+
+    def reset(self):
+        with self.lock:
+            self.calls = 0
+            self.saved = 0
+
+
+_singleflight_lock = threading.Lock()
+_singleflight = SingleFlight()
+
+
+def configure_coalescing(enabled=True):
+    """
+    Replace the SingleFlight shared by all api requests with a new one, or
+    with enabled=False send every GET on its own.
+    """
+    global _singleflight
+    with _singleflight_lock:
+        _singleflight = SingleFlight() if enabled else None
+    return _singleflight
+
+
+def get_singleflight():
+    return _singleflight
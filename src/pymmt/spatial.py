@@ -0,0 +1,177 @@
+import math, threading
+from .coords import ra_to_degrees, dec_to_degrees, propagate_position
+
+# positions are indexed and compared at this epoch
+INDEX_EPOCH = 2000.0
+
+
+def unit_vector(ra, dec):
+    ra, dec = math.radians(ra), math.radians(dec)
+    return (math.cos(dec) * math.cos(ra), math.cos(dec) * math.sin(ra), math.sin(dec))
+
+
+def separation(a, b):
+    """
+    Angle in arcseconds between two unit vectors, accurate at small angles.
+    """
+    chord = math.sqrt(sum((x - y) ** 2 for x, y in zip(a, b)))
+    return math.degrees(2 * math.asin(min(1.0, chord / 2))) * 3600
+
+
+def record_position(record):
+    """
+    (ra, dec) in degrees of a target record, from ra_decimal/dec_decimal or
+    else from ra/dec, moved by its proper motion (pm_ra, pm_dec) from its
+    epoch to INDEX_EPOCH. None if it has no valid position.
+    """
+    ra = ra_to_degrees(record.get('ra_decimal')) if record.get('ra_decimal') is not None else None
+    dec = dec_to_degrees(record.get('dec_decimal')) if record.get('dec_decimal') is not None else None
+    if ra is None or dec is None:
+        ra, dec = ra_to_degrees(record.get('ra')), dec_to_degrees(record.get('dec'))
+    if ra is None or dec is None:
+        return None
+    return propagate_position(ra, dec, record.get('pm_ra'), record.get('pm_dec'), record.get('epoch', INDEX_EPOCH), INDEX_EPOCH)
+
+
+class SpatialIndex():
+    """
+    In-memory index of target positions for cone searches.
+
+    The sky is cut into declination bands `cell_size` degrees high, and
+    each band into right ascension cells about `cell_size` degrees wide.
+    A cone search only looks at the cells that the cone can reach and then
+    compares unit vectors exactly, so a search for duplicates costs tens of
+    microseconds however many targets are indexed, and targets can be added and removed at any
+    time. It is safe to use from several threads.
+
+    Keep it in sync with the server by passing it to Target (index=...),
+    which adds targets when they are fetched, posted or updated and removes
+    them when deleted, or fill it from a TargetCache or a list of records.
+    """
+    def __init__(self, cell_size=0.1):
+        assert 0 < cell_size <= 90, 'cell_size must be within (0, 90] degrees'
+        self.cell_size = cell_size
+        self.bands = int(math.ceil(180 / cell_size))
+        self.cells = {}
+        self.targets = {}
+        self.lock = threading.Lock()
+
+
+    @classmethod
+    def from_records(cls, records, **kwargs):
+        index = cls(**kwargs)
+        index.update(records)
+        return index
+
+
+    @classmethod
+    def from_cache(cls, cache, **kwargs):
+        return cls.from_records((record for targetid, record in cache.records()), **kwargs)
+
+
+    def _band(self, dec):
+        return min(self.bands - 1, max(0, int((dec + 90) / self.cell_size)))
+
+
+    def _width(self, band):
+        # number of ra cells in a band, from its edge closest to the equator
+        low = -90 + band * self.cell_size
+        closest = min(abs(low), abs(low + self.cell_size)) if low * (low + self.cell_size) > 0 else 0.0
+        return max(1, int(360 * math.cos(math.radians(closest)) / self.cell_size))
+
+
+    def _cell(self, ra, dec):
+        band = self._band(dec)
+        width = self._width(band)
+        return band, int(ra % 360 / 360 * width) % width
+
+
+    def add(self, targetid, ra, dec):
+        """
+        Index a target at ra, dec (degrees), replacing its previous position.
+        """
+        targetid = str(targetid)
+        cell = self._cell(ra, dec)
+        with self.lock:
+            self._discard(targetid)
+            self.targets[targetid] = (unit_vector(ra, dec), cell, ra, dec)
+            self.cells.setdefault(cell, set()).add(targetid)
+
+
+    def add_record(self, record):
+        """
+        Index a target record by its 'id'. Returns False if the record has
+        no id or no valid position.
+        """
+        position = record_position(record)
+        if record.get('id') is None or position is None:
+            return False
+        self.add(record['id'], *position)
+        return True
+
+
+    def update(self, records):
+        return sum(self.add_record(r) for r in records)
+
+
+    def _discard(self, targetid):
+        entry = self.targets.pop(targetid, None)
+        if entry is not None:
+            members = self.cells[entry[1]]
+            members.discard(targetid)
+            if not len(members):
+                del self.cells[entry[1]]
+        return entry is not None
+
+
+    def remove(self, targetid):
+        with self.lock:
+            return self._discard(str(targetid))
+
+
+    def cone(self, ra, dec, radius):
+        """
+        Targets within `radius` arcseconds of ra, dec (degrees), as a list of
+        (targetid, separation in arcseconds), closest first.
+        """
+        r = radius / 3600
+        center = unit_vector(ra, dec)
+        if abs(dec) + r >= 90:
+            half_width = 180.0
+        else:
+            # widest ra offset of any point of the cone
+            half_width = math.degrees(math.asin(min(1.0, math.sin(math.radians(r)) / math.cos(math.radians(dec)))))
+
+        matches = []
+        with self.lock:
+            for band in range(self._band(dec - r), self._band(dec + r) + 1):
+                width = self._width(band)
+                first = int(math.floor((ra - half_width) % 360 / 360 * width))
+                count = int(math.ceil(2 * half_width / 360 * width)) + 1
+                for i in range(min(count, width)):
+                    for targetid in self.cells.get((band, (first + i) % width), ()):
+                        distance = separation(center, self.targets[targetid][0])
+                        if distance <= radius:
+                            matches.append((targetid, distance))
+        return sorted(matches, key=lambda match: match[1])
+
+
+    def nearest(self, ra, dec, radius):
+        """
+        The closest (targetid, separation) within `radius` arcseconds, or None.
+        """
+        matches = self.cone(ra, dec, radius)
+        return matches[0] if len(matches) else None
+
+
+    def position(self, targetid):
+        entry = self.targets.get(str(targetid))
+        return None if entry is None else entry[2:]
+
+
+    def __contains__(self, targetid):
+        return str(targetid) in self.targets
+
+
+    def __len__(self):
+        return len(self.targets)
@@ -0,0 +1,273 @@
+import os, logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from .downloads import download_datafiles
+from .manifest import Manifest, remote_signature, size_matches
+from .cache import local_fields
+from .logs import log
+
+DATA_TYPES = ('raw', 'reduced')
+
+# target fields that change when new data is taken or reduced
+STATE_KEYS = ('modified', 'percentcompleted', 'exposuretimecompleted', 'iscomplete', 'reduced')
+
+
+def _fetch_one(token, targetid, data_type):
+    from .pymmt import Datalist
+
+    datalist = Datalist(token=token, verbose=False)
+    try:
+        datalist.get(targetid=targetid, data_type=data_type)
+    except Exception as e:
+        return None, '{}: {}'.format(type(e).__name__, e)
+    if datalist.request.status_code != 200:
+        return None, 'status {}'.format(datalist.request.status_code)
+    return datalist.data, None
+
+
+def fetch_index(token, targetids, data_types=DATA_TYPES, workers=8, verbose=True):
+    """
+    Fetch the datalists of several targets and data types concurrently.
+
+    Returns (entries, errors). entries is the merged index, one dict per
+    datafile with the keys 'targetid', 'data_type', 'name' (the name of the
+    datalist group) and 'datafile' (the datafile as listed by the server),
+    ordered by target and data type. errors lists a dict with 'targetid',
+    'data_type' and 'error' for every datalist that could not be fetched.
+    """
+    assert workers >= 1, 'workers must be at least 1'
+    for data_type in data_types:
+        assert data_type in DATA_TYPES, 'data_type must either be raw or reduced'
+
+    requests = [(targetid, data_type) for targetid in targetids for data_type in data_types]
+    entries, errors = [], []
+    if not len(requests):
+        return entries, errors
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(requests))) as pool:
+        futures = [pool.submit(_fetch_one, token, targetid, data_type) for targetid, data_type in requests]
+        for (targetid, data_type), future in zip(requests, futures):
+            data, error = future.result()
+            if error is not None:
+                if verbose:
+                    log('Datalist request error for target {} ({}): {}'.format(targetid, data_type, error), logging.ERROR)
+                errors.append({'targetid':targetid, 'data_type':data_type, 'error':error})
+                continue
+            entries.extend(index_entries(targetid, data_type, data))
+    return entries, errors
+
+
+def index_entries(targetid, data_type, data):
+    """
+    The index entries of one datalist, as returned by the server.
+    """
+    return [{'targetid':targetid, 'data_type':data_type, 'name':d['name'], 'datafile':df}
+            for d in data for df in d['datafiles']]
+
+
+def filter_index(entries, data_types=None, file_types=None):
+    """
+    The entries of the given data types ('raw', 'reduced') whose datafile
+    'type' is one of file_types. None selects everything.
+    """
+    data_types = set(data_types) if data_types is not None else None
+    file_types = set(file_types) if file_types is not None else None
+    return [e for e in entries
+            if (data_types is None or e['data_type'] in data_types)
+            and (file_types is None or e['datafile']['type'] in file_types)]
+
+
+def datafile_path(parentdir, objectid, entry):
+    """
+    Where a datafile is saved: raw data under data/<objectid>/<name>/<type>,
+    reduced data under data/<objectid>/reduced/<name>/<type>.
+    """
+    if entry['data_type'] == 'raw':
+        dirname = '{}/data/{}/{}/{}'.format(parentdir, objectid, entry['name'], entry['datafile']['type'])
+    else:
+        dirname = '{}/data/{}/{}/{}/{}'.format(parentdir, objectid, entry['data_type'], entry['name'], entry['datafile']['type'])
+    return dirname, '{}/{}'.format(dirname, entry['datafile']['filename'])
+
+
+def target_state(target, data_types, file_types):
+    state = dict((key, target.__dict__.get(key)) for key in STATE_KEYS)
+    state['data_types'] = sorted(data_types)
+    state['file_types'] = sorted(file_types) if file_types is not None else None
+    return state
+
+
+def is_synced(manifest, state):
+    """
+    True if the target has not changed since its last complete download
+    and every file recorded then is still intact.
+    """
+    return len(manifest.files) > 0 and manifest.target == state and manifest.complete()
+
+
+def manifest_results(manifest, targetid):
+    """
+    'skipped' download results for every file recorded in a manifest.
+    """
+    return [{'datafileid':int(datafileid) if datafileid.isdigit() else datafileid,
+             'filepath':entry['filepath'], 'targetid':targetid,
+             'status':'skipped', 'attempts':0, 'error':None}
+            for datafileid, entry in manifest.files.items()]
+
+
+def record_downloads(manifests, report):
+    """
+    Record the downloaded and skipped files of a download report in the
+    manifests of their targets, keyed by targetid.
+    """
+    for result in report['downloaded']:
+        manifests[result['targetid']].record(result['datafileid'], result['filepath'], result['remote'], digest=result['digest'])
+    for result in report['skipped']:
+        if str(result['datafileid']) not in manifests[result['targetid']].files:
+            manifests[result['targetid']].record(result['datafileid'], result['filepath'], result['remote'])
+
+
+def plan_downloads(entries, parentdir, objectid, manifest, verbose=True):
+    """
+    Download jobs for the selected entries of one target. Files that were
+    changed on the server or damaged locally are removed so that they are
+    downloaded again; files that are current are skipped by the download
+    pool because they exist.
+    """
+    jobs, dirs = [], set()
+    for entry in entries:
+        df = entry['datafile']
+        dirname, filepath = datafile_path(parentdir, objectid, entry)
+        if dirname not in dirs:
+            Path(dirname).mkdir(parents=True, exist_ok=True)
+            dirs.add(dirname)
+        remote = remote_signature(df)
+
+        if str(df['id']) in manifest.files:
+            stale = not manifest.is_current(df['id'], filepath, remote)
+        else:
+            stale = os.path.exists(filepath) and not size_matches(filepath, remote)
+        if stale:
+            if verbose:
+                log('File \'{}\' changed or is incomplete'.format(filepath))
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            manifest.forget(df['id'])
+
+        jobs.append({
+            'datafileid':df['id'],
+            'filepath':filepath,
+            'targetid':entry['targetid'],
+            'data_type':entry['data_type'],
+            'remote':remote,
+            'checksum':True,
+        })
+    return jobs
+
+
+def load_manifests(targets, data_types, file_types, refresh=False, verbose=True):
+    """
+    The manifest and current state of every target, keyed by targetid.
+    Returns (manifests, states, pending, skipped): the targets whose
+    datalists must be fetched, and 'skipped' results for the files of the
+    targets that have not changed since their last complete download
+    (all targets are pending with refresh=True).
+    """
+    manifests, states, pending, skipped = {}, {}, [], []
+    for target in targets:
+        targetid = target.__dict__['id']
+        parentdir = target.parentdir if 'parentdir' in target.__dict__.keys() else os.getcwd()
+        manifests[targetid] = manifest = Manifest.for_target(parentdir, target.objectid)
+        states[targetid] = state = target_state(target, data_types, file_types)
+        if not refresh and is_synced(manifest, state):
+            if verbose:
+                log('No changes for target {} since the last download'.format(targetid))
+            skipped.extend(manifest_results(manifest, targetid))
+        else:
+            pending.append(target)
+    return manifests, states, pending, skipped
+
+
+def plan_targets(pending, entries, manifests, verbose=True):
+    """
+    Download jobs for the index entries of the pending targets. Returns
+    (jobs, listed), listed being the ids of the targets with entries.
+    """
+    by_target = {}
+    for entry in entries:
+        by_target.setdefault(entry['targetid'], []).append(entry)
+    jobs = []
+    for target in pending:
+        targetid = target.__dict__['id']
+        parentdir = target.parentdir if 'parentdir' in target.__dict__.keys() else os.getcwd()
+        jobs.extend(plan_downloads(by_target.get(targetid, []), parentdir, target.objectid, manifests[targetid], verbose))
+    return jobs, set(by_target)
+
+
+def finish_sync(targets, pending, listed, manifests, states, report, skipped, errors, start):
+    """
+    Record a download report in the manifests and on the targets: add the
+    skipped files to it, set download_report on every target and
+    downloaded and partial_download on the targets that have datafiles,
+    and save the manifests of the pending targets.
+    """
+    record_downloads(manifests, report)
+    report['skipped'].extend(skipped)
+    report['total'] += len(skipped)
+
+    failed = set(r['targetid'] for r in report['failed']) | set(e['targetid'] for e in errors)
+    for target in targets:
+        targetid = target.__dict__['id']
+        has_data = target not in pending or targetid in listed
+        if has_data:
+            target.partial_download = targetid in failed
+            target.downloaded = not target.partial_download
+        target.download_report = dict((key, [r for r in report[key] if r['targetid'] == targetid])
+                                      for key in ['downloaded', 'skipped', 'failed'])
+        target.download_report['total'] = sum(len(results) for results in target.download_report.values())
+        target.download_report['elapsed'] = (datetime.now() - start).total_seconds()
+        if target in pending:
+            if has_data and target.downloaded:
+                manifests[targetid].target = states[targetid]
+            manifests[targetid].save()
+        if target.__dict__.get('cache') is not None:
+            target.cache.put_local(targetid, local_fields(target))
+
+
+def sync_targets(targets, data_types=DATA_TYPES, file_types=None, workers=4, list_workers=8, retries=2,
+                 progress=None, refresh=False, token=None, verbose=True):
+    """
+    Download the raw and/or reduced data of several targets.
+
+    The datalists of all targets and data types are fetched concurrently
+    and merged into one index, the entries are filtered by data type and
+    datafile 'type', and the selected files of all targets are downloaded
+    through one shared pool of `workers` threads. Each target's manifest
+    (see pymmt.manifest) is used to skip what is already downloaded;
+    targets that have not changed since their last complete sync are
+    skipped without fetching their datalists, unless refresh=True.
+
+    Sets download_report on every target, and downloaded and
+    partial_download on the targets that have datafiles (targets with an
+    empty or failed datalist are left as they are). Returns the combined
+    report, which also holds the merged 'index' and the datalist 'errors'.
+    """
+    start = datetime.now()
+    targets = list(targets)
+    data_types = list(data_types)
+    token = token if token is not None else (targets[0].token if len(targets) else None)
+
+    manifests, states, pending, skipped = load_manifests(targets, data_types, file_types, refresh, verbose)
+    entries, errors = fetch_index(token, [t.__dict__['id'] for t in pending], data_types, workers=list_workers, verbose=verbose)
+    entries = filter_index(entries, file_types=file_types)
+    if verbose:
+        log('Length of datalist {}'.format(len(entries)))
+
+    jobs, listed = plan_targets(pending, entries, manifests, verbose)
+    report = download_datafiles(jobs, token=token, workers=workers, retries=retries, progress=progress, verbose=verbose)
+    finish_sync(targets, pending, listed, manifests, states, report, skipped, errors, start)
+
+    report['index'] = entries
+    report['errors'] = errors
+    report['elapsed'] = (datetime.now() - start).total_seconds()
+    return report
@@ -0,0 +1,18 @@
+import pytest
+import pymmt
+from pymmt.session import SESSION_DEFAULTS
+from mock_server import MockScheduler
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """
+    A local mock scheduler that the api classes point at, with a fresh
+    session so that connections are counted from zero.
+    """
+    with MockScheduler(targets=10, files=2, size=1000) as mock:
+        monkeypatch.setenv('MMT_API_BASE', mock.url)
+        pymmt.close_session()
+        yield mock
+        pymmt.configure_session(**SESSION_DEFAULTS)
+        pymmt.close_session()
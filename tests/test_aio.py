@@ -0,0 +1,75 @@
+import asyncio, time
+import pytest
+import pymmt
+from pymmt.ratelimit import LIMITER_DEFAULTS
+
+pytest.importorskip('aiohttp')
+from pymmt.aio import AsyncTarget, close_async_session
+
+
+@pytest.fixture
+def limiter():
+    limiter = pymmt.configure_limiter(backoff=0.01)
+    yield limiter
+    pymmt.configure_limiter(**LIMITER_DEFAULTS)
+
+
+def run(coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await close_async_session()
+    return asyncio.run(main())
+
+
+def test_throttled_request_goes_through_the_limiter(server, limiter):
+    pymmt.METRICS.reset()
+    server.fail_status, server.fail_next, server.retry_after = 429, 2, '0.2'
+    start = time.monotonic()
+    t = run(AsyncTarget.fetch(token='x', targetid=1, verbose=False))
+
+    assert t.request.status_code == 200 and t.id == 1
+    assert time.monotonic() - start >= 0.4
+    assert server.requests == 3
+    assert limiter.summary()['throttled'] == 2
+    stats = pymmt.METRICS.to_dict()['GET catalogTarget']
+    assert stats['requests'] == 3 and stats['retries'] == 2
+
+
+def test_downloads_are_tracked_in_the_manifest(server, limiter, tmp_path):
+    t = run(AsyncTarget.fetch(token='x', targetid=1, verbose=False))
+    t.parentdir = str(tmp_path)
+    report = run(t.download_exposures(force=True))
+    assert len(report['downloaded']) == 2 and not report['failed']
+    assert t.downloaded and not t.partial_download
+    requests = server.requests
+
+    report = run(t.download_exposures(force=True))
+    assert len(report['skipped']) == 2 and not report['downloaded']
+    assert server.requests == requests
+
+
+def test_download_errors_are_retried_by_the_request(server, limiter, tmp_path):
+    t = run(AsyncTarget.fetch(token='x', targetid=1, verbose=False))
+    t.parentdir = str(tmp_path)
+    requests = server.requests
+    server.fail_status, server.fail_next = 503, 1
+    report = run(t.download_exposures(force=True, retries=0))
+
+    assert len(report['downloaded']) == 2 and t.downloaded
+    # the datalist, the two datafiles and one retry of the refused request
+    assert server.requests == requests + 4
+
+
+def test_unchanged_finder_is_not_uploaded_again(server, limiter, tmp_path):
+    path = tmp_path / 'chart.png'
+    path.write_bytes(b'finder')
+    t = run(AsyncTarget.fetch(token='x', targetid=1, verbose=False))
+
+    assert run(t.upload_finder(path)).status_code == 200
+    assert t.findingchartfilename == 'chart.png'
+    requests = server.requests
+    assert run(t.upload_finder(path)) is None
+    assert server.requests == requests
+    assert run(t.upload_finder(path, force=True)).status_code == 200
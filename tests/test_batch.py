@@ -0,0 +1,66 @@
+import pymmt
+from mock_server import target_payload
+
+SERVER_KEYS = ('id', 'iscomplete', 'percentcompleted', 'exposuretimecompleted', 'modified', 'submitted',
+               'findingchartfilename')
+
+
+def payload(objectid, **fields):
+    payload = dict((k, v) for k, v in target_payload(0).items() if k not in SERVER_KEYS)
+    payload.update(objectid=objectid, **fields)
+    return payload
+
+
+def test_string_decimals_are_screened_against_the_index(server):
+    # as read from JSON lines; the decimals agree with ra/dec and are kept as given
+    index = pymmt.SpatialIndex.from_records(server.targets.values())
+    payloads = [
+        payload('same', ra_decimal='188.736583', dec_decimal='12.582417'),
+        payload('new', ra='01:00:00', dec='+10:00:00', ra_decimal='15.0', dec_decimal='10.0'),
+    ]
+    batch = pymmt.TargetBatch(token='x', payloads=payloads, index=index)
+    results = batch.post()
+
+    assert results[0]['status'] == 'duplicate' and results[0]['duplicate_of'] in server.targets
+    assert results[1]['status'] == 'posted'
+    assert results[1]['targetid'] in index
+
+
+def test_refused_targets_are_posted_again(server):
+    server.fail_status, server.fail_next = 400, 1
+    batch = pymmt.TargetBatch(token='x', payloads=[payload('refused')], workers=1)
+    assert batch.post()[0]['status'] == 'failed' and batch.results[0]['status_code'] == 400
+
+    requests = server.requests
+    result = batch.post()[0]
+    assert result['status'] == 'posted' and result['targetid'] in server.targets
+    # posted without looking the target up first
+    assert server.requests == requests + 1
+
+
+def test_targets_created_before_a_failure_are_not_posted_twice(server):
+    batch = pymmt.TargetBatch(token='x', payloads=[payload('timeout'), payload('unavailable')], workers=1)
+    batch.post()
+    created = batch.results[0]['targetid']
+    # the first was created but the client timed out; the second got a 503 and was not created
+    batch.results[0].update(status='failed', targetid=None, status_code=None, error='ReadTimeout: timed out')
+    del server.targets[batch.results[1]['targetid']]
+    batch.results[1].update(status='failed', targetid=None, status_code=503, error='busy')
+    count = len(server.targets)
+
+    results = batch.post()
+    assert results[0]['status'] == 'posted' and results[0]['targetid'] == created and results[0]['error'] is None
+    assert results[1]['status'] == 'posted' and results[1]['targetid'] in server.targets
+    assert len(server.targets) == count + 1
+    assert [t['objectid'] for t in server.targets.values()].count('timeout') == 1
+
+
+def test_failed_targets_stay_failed_when_the_lookup_fails(server):
+    batch = pymmt.TargetBatch(token='x', payloads=[payload('timeout')], workers=1)
+    batch.results[0].update(status='failed', error='ReadTimeout: timed out')
+    server.listing = False
+    count = len(server.targets)
+
+    result = batch.post()[0]
+    assert result['status'] == 'failed' and result['error'].startswith('lookup failed')
+    assert len(server.targets) == count
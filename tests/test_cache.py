@@ -0,0 +1,87 @@
+import pytest
+from pymmt import cache as cache_module
+from pymmt.cache import TargetCache
+from pymmt.pymmt import Target
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = TargetCache(path=str(tmp_path / 'targets.sqlite'), ttl=300)
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000000.0]
+    monkeypatch.setattr(cache_module.time, 'time', lambda: now[0])
+    return now
+
+
+def test_fresh_and_stale_records(cache, clock):
+    assert cache.get(1) is None
+    assert cache.put(1, {'id':1, 'modified':'a'}, {'downloaded':True})
+    assert cache.get(1) == ({'id':1, 'modified':'a'}, {'downloaded':True}, True)
+
+    clock[0] += 301
+    assert cache.get(1)[2] is False
+    # refetched without changes: only its age is reset, the local fields are kept
+    assert not cache.put(1, {'id':1, 'modified':'a', 'ignored':True})
+    assert cache.get(1) == ({'id':1, 'modified':'a'}, {'downloaded':True}, True)
+    assert cache.put(1, {'id':1, 'modified':'b'})
+    assert cache.get(1)[0]['modified'] == 'b'
+
+
+def test_target_hydrates_from_a_fresh_record(server, cache):
+    Target(token='x', verbose=False, payload={'targetid':1}, cache=cache)
+    assert server.requests == 1
+
+    t = Target(token='x', verbose=False, payload={'targetid':1}, cache=cache)
+    assert server.requests == 1
+    assert t.objectid == server.targets[1]['objectid'] and t.valid
+
+
+def test_stale_record_is_refetched(server, cache, clock):
+    Target(token='x', verbose=False, payload={'targetid':1}, cache=cache)
+    server.targets[1]['objectid'] = 'renamed'
+    server.targets[1]['modified'] = '2024-06-01 12:00:00'
+    assert Target(token='x', verbose=False, payload={'targetid':1}, cache=cache).objectid != 'renamed'
+
+    clock[0] += 301
+    t = Target(token='x', verbose=False, payload={'targetid':1}, cache=cache)
+    assert server.requests == 2
+    assert t.objectid == 'renamed' and cache.get(1)[0]['objectid'] == 'renamed'
+
+
+def test_least_recently_used_records_are_evicted(tmp_path, clock):
+    cache = TargetCache(path=str(tmp_path / 'lru.sqlite'), max_entries=3)
+    for targetid in range(1, 4):
+        clock[0] += 1
+        cache.put(targetid, {'id':targetid})
+    clock[0] += 1
+    cache.get(1)
+    clock[0] += 1
+    cache.put(4, {'id':4})
+
+    assert len(cache) == 3
+    assert cache.get(2) is None and cache.get(1) is not None
+
+
+def test_old_records_are_evicted(tmp_path, clock):
+    cache = TargetCache(path=str(tmp_path / 'age.sqlite'), max_age=3600)
+    cache.put(1, {'id':1})
+    clock[0] += 3601
+    cache.put(2, {'id':2})
+    assert cache.get(1) is None and cache.get(2) is not None
+
+
+def test_inserts_below_the_cap_do_not_evict(tmp_path, clock, monkeypatch):
+    cache = TargetCache(path=str(tmp_path / 'cap.sqlite'), max_entries=100)
+    calls = []
+    evict = cache.evict
+    monkeypatch.setattr(cache, 'evict', lambda: calls.append(1) or evict())
+    for targetid in range(100):
+        cache.put(targetid, {'id':targetid})
+    assert calls == []
+    cache.put(100, {'id':100})
+    assert calls == [1] and len(cache) == 100
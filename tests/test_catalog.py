@@ -0,0 +1,74 @@
+import random
+import pytest
+
+np = pytest.importorskip('numpy')
+from pymmt.pymmt import Target
+from pymmt.catalog import validate_catalog, validate_records
+
+BASE = {'objectid':'AT2024abc', 'ra':'12:34:56.7', 'dec':'+12:34:56.7', 'epoch':'J2000', 'exposuretime':600,
+        'magnitude':19.5, 'maskid':110, 'numberexposures':3, 'visits':1, 'priority':3, 'pa':0.0, 'pm_ra':0.0,
+        'pm_dec':0.0, 'photometric':0, 'targetofopportunity':0, 'onevisitpernight':0}
+INSTRUMENTS = [
+    {'instrumentid':16, 'observationtype':'imaging', 'filter':'g'},
+    {'instrumentid':16, 'observationtype':'longslit', 'filter':'LP3800', 'grating':600, 'centralwavelength':6500,
+     'slitwidth':'Longslit1', 'maskid':111},
+    {'instrumentid':15, 'observationtype':'imaging', 'filter':'J', 'gain':'high', 'readtab':'ramp_1.475', 'dithersize':'7'},
+    {'instrumentid':15, 'observationtype':'longslit', 'filter':'HK', 'gain':'low', 'readtab':'ramp_4.426', 'grism':'HK',
+     'slitwidth':'2pixel', 'slitwidthproperty':'long'},
+]
+# values each field may be changed to, valid or not
+VALUES = {
+    'objectid':['a', 'AT 2024', 'AT-2024', 'x' * 60], 'ra':['25:00:00', '188.7', 188.7, 'abc', '12:34'],
+    'dec':['-91:00:00', '-12.5', -12.5, '+89:59:59.9'], 'ra_decimal':[188.7, '188.7', 'abc'], 'dec_decimal':[12.5, '-12.5'],
+    'exposuretime':[0, -5, '600', 600.0, 'long'], 'magnitude':['19.5', 'bright', 21], 'maskid':['110', 'm'],
+    'numberexposures':['3', 2.5], 'visits':['x', '2'], 'priority':[0, 4, '2', 'high'], 'pa':[400, '-360', 'x'],
+    'pm_ra':['x', '1.5'], 'pm_dec':['1e-3', []], 'photometric':['1', 'yes'], 'targetofopportunity':[1, 'no'],
+    'instrumentid':[16, 15, '16', 99], 'observationtype':['imaging', 'longslit', 'mask', 'spectrum'],
+    'filter':['g', 'LP3500', 'Ks', 'zJ', 'u'], 'grating':[270, '1000', 500], 'centralwavelength':[5000, '7000', 9000, 'blue'],
+    'slitwidth':['Longslit5', '12pixel', 'wide'], 'gain':['low', 'high', 'medium'], 'readtab':['ramp_4.426', 'ramp_1.475', 'x'],
+    'grism':['J', 'HK3', 'Y'], 'slitwidthproperty':['short', 'medium'], 'dithersize':['15', '8'],
+    'onevisitpernight':[1, 2, '0'],
+}
+
+
+def payloads(count, seed=1):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        row = dict(BASE, **rng.choice(INSTRUMENTS))
+        for _ in range(rng.randint(0, 3)):
+            field = rng.choice(sorted(set(row) | set(VALUES)))
+            action = rng.random()
+            if action < 0.2:
+                row.pop(field, None)
+            elif action < 0.4:
+                row[field] = None
+            elif field in VALUES:
+                row[field] = rng.choice(VALUES[field])
+        rows.append(row)
+    return rows
+
+
+def target_valid(row):
+    # a missing cell is a field left out of the payload
+    payload = dict((k, v) for k, v in row.items() if v is not None)
+    return Target(token='x', verbose=False, payload=payload).valid
+
+
+def test_records_get_the_verdict_of_target_validate():
+    rows = payloads(600)
+    expected = [target_valid(row) for row in rows]
+    assert 0 < sum(expected) < len(rows)
+    assert validate_records(rows).valid.tolist() == expected
+
+
+def test_masked_cells_are_missing_fields():
+    rows = payloads(200, seed=2)
+    names = sorted(set(name for row in rows for name in row))
+    table = {}
+    for name in names:
+        values = np.empty(len(rows), dtype=object)
+        # what is under the mask must not matter
+        values[:] = [row[name] if row.get(name) is not None else 'garbage' for row in rows]
+        table[name] = np.ma.masked_array(values, mask=[row.get(name) is None for row in rows])
+    assert validate_catalog(table).valid.tolist() == [target_valid(row) for row in rows]
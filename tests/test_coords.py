@@ -0,0 +1,60 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+from pymmt import coords
+from pymmt.spatial import record_position
+
+RA = [
+    ('12:34:56.78', 188.73658333333333), ('12:34:56', 188.73333333333333), ('12:34:56.', 188.73333333333333),
+    ('00:00:00', 0.0), (' 23:59:59.9 ', 359.99958333333333), ('188.7', 188.7), (188.7, 188.7), (b'01:00:00', 15.0),
+    ('24:00:00', None), ('12:60:00', None), ('12:34:60', None), ('1:23:45', None), ('12:34:56.7.8', None),
+    ('+12:34:56', None), ('12:34', None), ('ab:cd:ef', None), ('12:34:56junk', None), ('360', None), ('-1', None),
+    ('', None), (None, None), (True, None),
+]
+DEC = [
+    ('+12:34:56.7', 12.582416666666667), ('-05:30:00', -5.5), ('05:30:00.', 5.5), ('-00:30:00', -0.5),
+    ('+90:00:00', 90.0), ('-12.5', -12.5), (12.5, 12.5),
+    ('+90:00:01', None), ('91:00:00', None), ('+12:61:00', None), ('--12:00:00', None), ('-1:00:00', None),
+    ('95', None), ('x', None), (None, None),
+]
+
+
+@pytest.mark.parametrize('value, degrees', RA)
+def test_ra(value, degrees):
+    assert coords.ra_to_degrees(value) == pytest.approx(degrees)
+
+
+@pytest.mark.parametrize('value, degrees', DEC)
+def test_dec(value, degrees):
+    assert coords.dec_to_degrees(value) == pytest.approx(degrees)
+
+
+def test_array_parsers_agree_with_scalar_ones():
+    for parse, cases in [(coords.parse_ra, RA), (coords.parse_dec, DEC)]:
+        values = [value for value, degrees in cases]
+        expected = [np.nan if degrees is None else degrees for value, degrees in cases]
+        np.testing.assert_allclose(parse(values), expected)
+
+
+def test_format_round_trips():
+    ra, dec = np.array([0.0, 188.7366, 359.9999]), np.array([-90.0, -0.00001, 45.5])
+    assert coords.format_ra(ra) == [coords.degrees_to_ra(x) for x in ra]
+    assert coords.format_dec(dec) == [coords.degrees_to_dec(x) for x in dec] == ['-90:00:00.0', '+00:00:00.0', '+45:30:00.0']
+    np.testing.assert_allclose(coords.parse_ra(coords.format_ra(ra, precision=3)), ra % 360, atol=1e-6)
+
+
+def test_propagate_moves_along_the_proper_motion():
+    # 1 arcsec/yr north for 10 years
+    ra, dec = coords.propagate(10.0, 20.0, 0.0, 1000.0, 'J2000', 2010)
+    assert ra == pytest.approx(10.0) and (dec - 20.0) * 3600 == pytest.approx(10.0)
+    # across the pole the position comes out on the other side
+    ra, dec = coords.propagate(0.0, 89.9999, 0.0, 1000.0, 2000, 2001)
+    assert ra == pytest.approx(180.0) and dec < 90
+
+
+def test_record_positions_are_moved_to_the_index_epoch():
+    record = {'ra':'12:00:00', 'dec':'+10:00:00', 'pm_ra':'0', 'pm_dec':None, 'epoch':'J2024'}
+    assert record_position(record) == (180.0, 10.0)
+    ra, dec = record_position(dict(record, pm_dec=1000.0))
+    assert ra == pytest.approx(180.0) and (10.0 - dec) * 3600 == pytest.approx(24.0)
+    assert record_position(dict(record, pm_dec=1000.0, epoch='J2000')) == (180.0, 10.0)
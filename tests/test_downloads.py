@@ -0,0 +1,42 @@
+import pytest
+import pymmt
+from pymmt.ratelimit import LIMITER_DEFAULTS
+
+
+@pytest.fixture
+def limiter():
+    limiter = pymmt.configure_limiter(backoff=0.01)
+    yield limiter
+    pymmt.configure_limiter(**LIMITER_DEFAULTS)
+
+
+def jobs(tmp_path, count):
+    return ({'datafileid':10000 + i, 'filepath':str(tmp_path / 'file{}.fits'.format(i))} for i in range(count))
+
+
+def test_missing_files_are_not_retried(server, limiter, tmp_path):
+    server.fail_status, server.fail_next = 404, 1
+    report = pymmt.download_datafiles(jobs(tmp_path, 1), token='x', retries=3, backoff=0.01, verbose=False)
+
+    assert report['failed'][0]['attempts'] == 1
+    assert server.requests == 1
+
+
+def test_interrupted_downloads_are_resumed(server, limiter, tmp_path):
+    server.cut_next = 1
+    report = pymmt.download_datafiles(jobs(tmp_path, 1), token='x', retries=2, backoff=0.01, verbose=False)
+
+    result, = report['downloaded']
+    assert result['attempts'] == 2
+    assert (tmp_path / 'file0.fits').stat().st_size == server.size
+
+
+def test_progress_reports_the_full_total(server, limiter, tmp_path):
+    (tmp_path / 'file0.fits').write_bytes(b'')
+    (tmp_path / 'file1.fits').write_bytes(b'')
+    calls = []
+    report = pymmt.download_datafiles(jobs(tmp_path, 4), token='x', verbose=False,
+                                      progress=lambda done, total, result: calls.append((done, total)))
+
+    assert report['total'] == 4 and len(report['skipped']) == 2
+    assert sorted(calls) == [(1, 4), (2, 4), (3, 4), (4, 4)]
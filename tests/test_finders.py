@@ -0,0 +1,52 @@
+import pytest
+import pymmt
+from pymmt.pymmt import Target
+from pymmt.ratelimit import LIMITER_DEFAULTS
+
+
+@pytest.fixture
+def limiter():
+    limiter = pymmt.configure_limiter(backoff=0.01)
+    yield limiter
+    pymmt.configure_limiter(**LIMITER_DEFAULTS)
+
+
+@pytest.fixture
+def jobs(server, tmp_path):
+    def jobs(*targetids):
+        ret = []
+        for targetid in targetids:
+            path = tmp_path / 'finder{}.png'.format(targetid)
+            path.write_bytes(b'finder %d' % targetid)
+            ret.append({'target':Target(token='x', verbose=False, payload={'targetid':targetid}), 'finder_path':str(path)})
+        return ret
+    return jobs
+
+
+def test_throttled_upload_is_retried_by_the_request_only(server, limiter, jobs):
+    job, = jobs(1)
+    server.requests = 0
+    server.fail_status, server.fail_next = 429, 1
+    report = pymmt.upload_finders([job], retries=2, backoff=0.01, verbose=False)
+
+    assert len(report['uploaded']) == 1
+    assert server.requests == 2
+
+
+def test_server_errors_are_reported_not_retried(server, limiter, jobs):
+    job, = jobs(1)
+    server.requests = 0
+    server.fail_status, server.fail_next = 503, 1
+    report = pymmt.upload_finders([job], retries=2, backoff=0.01, verbose=False)
+
+    assert report['failed'][0]['error'].startswith('503')
+    assert report['failed'][0]['attempts'] == 1
+    assert server.requests == 1
+
+
+def test_unchanged_finders_are_skipped(server, limiter, jobs):
+    job, = jobs(2)
+    assert len(pymmt.upload_finders([job], verbose=False)['uploaded']) == 1
+    server.requests = 0
+    assert len(pymmt.upload_finders([job], verbose=False)['skipped']) == 1
+    assert server.requests == 0
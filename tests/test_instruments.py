@@ -0,0 +1,90 @@
+import pytest
+from pymmt.instruments import binospec, mmirs
+
+# messages as printed by the original hand-written validators, whitespace included
+BINOSPEC_FILTER_MISSING = ("Field 'filter' is required for observation types 'imaging' and 'longslit' \n"
+                           "                         For imaging: valid options are 'g', 'r', 'i', and 'z'. \n"
+                           "                         For longslit: valid options are 'LP3800' (default) and 'LP3500'")
+BINOSPEC_GRATING_MISSING = ("Field 'grating' is required for observationtype: longslit \n"
+                            "                     Valid options are '270', '600', and '1000'")
+BINOSPEC_CENTRALWAVELENGTH_MISSING = (
+    "For observationtype: longslit, field 'centralwavelength' is required \n"
+    "                         Valid options are dependent on the field 'grating' \n"
+    "                         'grating' = 270: valid centralwavelength must be between 5501-7838 Angstroms \n"
+    "                         'grating' = 600: valid centralwavelength must be between 5146-8783 Angstroms \n"
+    "                         'grating' = 1000: valid centralwavelength must be between 4108-4683, 5181-7273, 7363-7967, 8153-8772 or 8897-9279")
+BINOSPEC_FILTER_DEFAULT = ("For observationtype: longslit, valid options for field 'filter' are: 'LP3800' and 'LP3500' \n"
+                           "                                 Default setting 'filter' to 'LP3800'")
+MMIRS_FILTER_MISSING = ("Field 'filter' is required for observation types 'imaging' and 'longslit' \n"
+                        "                         For imaging: valid options are 'J', 'H', 'K', and 'Ks'. \n"
+                        "                         For longslit: valid options are 'HK' (default) and 'zJ'")
+MMIRS_DITHERSIZE = ("For observationtype: imaging, valid options for field 'dithersize' are: '5', '7','10','15','20','30','60','120','210' \n"
+                    "                                 Default setting 'dithersize' to '7'")
+OBSERVATIONTYPE_MISSING = "Field 'observationtype' is required. Valid values are 'longslit', 'imaging', and 'mask'"
+
+CASES = [
+    (binospec, {}, ([OBSERVATIONTYPE_MISSING], [], {})),
+    (binospec, {'observationtype':'spectrum', 'filter':'g'},
+     (["Field ' observationtype' must be either 'imaging', 'longslit', or 'mask'"], [], {})),
+    (binospec, {'observationtype':'imaging', 'filter':'u', 'onevisitpernight':2},
+     (["For observationtype: imaging, valid options for field 'filter' are: 'g', 'r', 'i', and 'z'.",
+       "Field 'onevisitpernight' must be either 0 or 1"], [], {'centralwavelength':None, 'grating':None})),
+    (binospec, {'observationtype':'imaging'},
+     ([BINOSPEC_FILTER_MISSING], [], {'centralwavelength':None, 'grating':None, 'onevisitpernight':0})),
+    (binospec, {'observationtype':'longslit'},
+     ([BINOSPEC_GRATING_MISSING,
+       "For observationtype: longslit, field 'slitwidth' is required. Valid options are: Longslit0_75, Longslit1, Longslit1_25, Longslit1_5, and Longslit5",
+       BINOSPEC_FILTER_MISSING], [], {'filter':'LP3800', 'onevisitpernight':1})),
+    (binospec, {'observationtype':'longslit', 'grating':500, 'slitwidth':'wide', 'filter':'g'},
+     (["For observationtype longslit, valid options for field 'grating' are '270', '600', and '1000'",
+       BINOSPEC_CENTRALWAVELENGTH_MISSING,
+       "Field 'slitwidth' valid options are: Longslit0_75, Longslit1, Longslit1_25, Longslit1_5, and Longslit5"],
+      [BINOSPEC_FILTER_DEFAULT], {'onevisitpernight':1})),
+    (binospec, {'observationtype':'longslit', 'grating':270, 'centralwavelength':'blue', 'slitwidth':'Longslit1', 'filter':'LP3500'},
+     (["Field 'centralwavelength' must be float"], [], {'onevisitpernight':1})),
+    (binospec, {'observationtype':'longslit', 'grating':'270', 'centralwavelength':9000, 'slitwidth':'Longslit1', 'filter':'LP3800'},
+     (["For 'grating' = 270: valid centralwavelength [9000] must be between 5501-7838 Angstroms"], [], {'onevisitpernight':1})),
+    # the original message gave the 270 range for grating 600; corrected on purpose
+    (binospec, {'observationtype':'longslit', 'grating':600, 'centralwavelength':9000, 'slitwidth':'Longslit1', 'filter':'LP3800'},
+     (["For 'grating' = 600: valid centralwavelength [9000] must be between 5146-8783 Angstroms"], [], {'onevisitpernight':1})),
+    (binospec, {'observationtype':'longslit', 'grating':1000, 'centralwavelength':5000, 'slitwidth':'Longslit5', 'filter':'LP3800'},
+     (["For 'grating' = 1000: valid centralwavelength must be between 4108-4683, 5181-7273, 7363-7967, 8153-8772 or 8897-9279"],
+      [], {'onevisitpernight':1})),
+    (binospec, {'observationtype':'longslit', 'grating':600, 'centralwavelength':6000, 'slitwidth':'Longslit1', 'filter':'LP3800',
+                'onevisitpernight':0}, ([], [], {})),
+    (mmirs, {}, ([OBSERVATIONTYPE_MISSING], [], {})),
+    (mmirs, {'observationtype':'imaging'},
+     (["For observationtype:imagin, field 'gain' is required. Valid options is: high",
+       "For observationtype:longlist, field 'readtab' is required. Valid options is: 4.426, 1.475",
+       MMIRS_FILTER_MISSING], [], {'onevisitpernight':0})),
+    (mmirs, {'observationtype':'imaging', 'filter':'g', 'gain':'low', 'readtab':'x', 'dithersize':'8'},
+     (["Field 'gain' is required. Valid options is: high",
+       "Field 'readtab' is required. Valid options is:ramp_4.426, ramp_1.475",
+       "For observationtype: imaging, valid options for field 'filter' are: 'J', 'H', 'K', and 'Ks'."],
+      [MMIRS_DITHERSIZE], {'onevisitpernight':0})),
+    (mmirs, {'observationtype':'imaging', 'filter':'Ks', 'gain':'high', 'readtab':'ramp_1.475', 'dithersize':'7'},
+     ([], [], {'onevisitpernight':0})),
+    (mmirs, {'observationtype':'longslit'},
+     (["For observationtype:longlist, field 'gain' is required. Valid options is: low",
+       "For observationtype:longlist, field 'readtab' is required. Valid options is: ramp_4.426",
+       "For observationtype:longlist, field 'grism' is required. Valid options are: J, HK, HK3 ",
+       "For observationtype: longslit, field 'slitwidth' is required. Valid options are: 1pixel, 2pixel, 3pixel, 4pixel, 5pixel,6pixel,12pixel",
+       "For observationtype: longlist, slitwidthproperty is required. Valid options are: long, short",
+       MMIRS_FILTER_MISSING], [], {'filter':'HK', 'onevisitpernight':1})),
+    (mmirs, {'observationtype':'longslit', 'filter':'J', 'gain':'high', 'readtab':'ramp_1.475', 'grism':'Y', 'slitwidth':'7pixel',
+             'slitwidthproperty':'medium', 'onevisitpernight':'1'},
+     (["Field 'gain' is required. Valid options is: low",
+       "Field 'readtab' is required. Valid options is:ramp_4.426",
+       "Field 'grism' is required. Valid options are: J, HK, HK3",
+       "Field 'slitwidth' valid options are: 1pixel, 2pixel, 3pixel, 4pixel, 5pixel,6pixel,12pixel",
+       "Field 'slitwidthproperties' valid options are: long, short",
+       "Field 'onevisitpernight' must be either 0 or 1"],
+      ["For observationtype: longslit, valid options for field 'filter' are: 'HK' and 'zJ' \n "], {})),
+    (mmirs, {'observationtype':'longslit', 'filter':'zJ', 'gain':'low', 'readtab':'ramp_4.426', 'grism':'HK3', 'slitwidth':'2pixel',
+             'slitwidthproperty':'long'}, ([], [], {'onevisitpernight':1})),
+]
+
+
+@pytest.mark.parametrize('module, payload, expected', CASES)
+def test_verdicts_and_messages(module, payload, expected):
+    assert module.validate(dict(payload)) == expected
@@ -0,0 +1,100 @@
+import json, os
+import pytest
+from mock_server import BLOCK
+from pymmt.manifest import Manifest, MANIFEST_NAME
+from pymmt.pymmt import Target
+
+
+def content(size):
+    return (BLOCK * (size // len(BLOCK) + 1))[:size]
+
+
+@pytest.fixture
+def target(server, tmp_path):
+    t = Target(token='x', verbose=False, payload={'targetid':1})
+    t.parentdir = str(tmp_path)
+    return t
+
+
+def datafiles(target, tmp_path):
+    return sorted(str(p) for p in (tmp_path / 'data' / target.objectid).rglob('*.fits'))
+
+
+def test_partial_files_are_resumed(server, target, tmp_path):
+    # a '.part' file left by an interrupted run; marked so that only the
+    # missing bytes can have come from the server
+    directory = tmp_path / 'data' / target.objectid / '2024.0501' / 'science'
+    directory.mkdir(parents=True)
+    (directory / 'mock1_0000.fits.part').write_bytes(b'x' * 400)
+
+    report = target.download_exposures(force=True)
+    assert len(report['downloaded']) == 2
+    resumed, fresh = datafiles(target, tmp_path)
+    with open(resumed, 'rb') as f:
+        assert f.read() == b'x' * 400 + content(server.size)[400:]
+    with open(fresh, 'rb') as f:
+        assert f.read() == content(server.size)
+    assert not list(directory.glob('*.part'))
+
+
+def test_stale_partial_file_is_downloaded_again(server, target, tmp_path):
+    directory = tmp_path / 'data' / target.objectid / '2024.0501' / 'science'
+    directory.mkdir(parents=True)
+    (directory / 'mock1_0000.fits.part').write_bytes(b'x' * (server.size + 10))
+
+    assert len(target.download_exposures(force=True)['downloaded']) == 2
+    with open(directory / 'mock1_0000.fits', 'rb') as f:
+        assert f.read() == content(server.size)
+
+
+def test_interrupted_download_is_completed_on_the_next_run(server, target, tmp_path):
+    server.cut_next = 1
+    report = target.download_exposures(force=True, retries=0)
+    assert len(report['failed']) == 1 and target.partial_download
+    manifest = Manifest.for_target(str(tmp_path), target.objectid)
+    assert len(manifest.files) == 1 and not manifest.target
+
+    requests = server.requests
+    report = target.download_exposures(force=True)
+    assert len(report['downloaded']) == 1 and len(report['skipped']) == 1
+    assert target.downloaded and not target.partial_download
+    # the datalist and the missing file
+    assert server.requests == requests + 2
+
+
+def test_unchanged_target_is_skipped_without_requests(server, target, tmp_path):
+    target.download_exposures(force=True)
+    requests = server.requests
+    report = target.download_exposures(force=True)
+    assert len(report['skipped']) == 2 and server.requests == requests
+
+    assert len(target.download_exposures(force=True, refresh=True)['skipped']) == 2
+    assert server.requests == requests + 1
+
+
+def test_damaged_and_changed_files_are_downloaded_again(server, target, tmp_path):
+    target.download_exposures(force=True)
+    first, second = datafiles(target, tmp_path)
+    with open(first, 'r+b') as f:
+        f.truncate(10)
+    server.datalists[(1, 'raw')][0]['datafiles'][1]['modified'] = '2024-06-01 00:00:00'
+
+    report = target.download_exposures(force=True)
+    assert sorted(r['filepath'] for r in report['downloaded']) == [first, second]
+    assert os.path.getsize(first) == server.size
+
+
+def test_manifest_round_trip(tmp_path):
+    path = tmp_path / 'file.fits'
+    path.write_bytes(b'data')
+    manifest = Manifest(str(tmp_path / MANIFEST_NAME))
+    manifest.record(5, str(path), {'size':4})
+    manifest.target = {'modified':'a'}
+    manifest.save()
+
+    loaded = Manifest(str(tmp_path / MANIFEST_NAME))
+    assert loaded.files == json.loads(json.dumps(manifest.files)) and loaded.target == {'modified':'a'}
+    assert loaded.is_current(5, str(path), {'size':4}) and loaded.complete()
+    assert not loaded.is_current(5, str(path), {'size':5})
+    path.write_bytes(b'other')
+    assert not loaded.verify(5) and not loaded.complete()
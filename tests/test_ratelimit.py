@@ -0,0 +1,105 @@
+import time
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+import pytest
+import pymmt
+from pymmt.pymmt import api, Target
+from pymmt.ratelimit import AdaptiveLimiter, LIMITER_DEFAULTS, parse_retry_after
+
+
+@pytest.fixture
+def limiter():
+    limiter = pymmt.configure_limiter(backoff=0.01)
+    yield limiter
+    pymmt.configure_limiter(**LIMITER_DEFAULTS)
+
+
+def post(payload):
+    a = api('catalogTarget', 'x')
+    return a._post({'urlparams':{}, 'd_json':dict(payload, token='x')})
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('2') == 2.0
+    assert parse_retry_after('-1') == 0.0
+    assert parse_retry_after('soon') is None
+    date = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 < parse_retry_after(date) <= 30
+
+
+def test_throttled_get_waits_for_retry_after(server, limiter):
+    server.fail_status, server.fail_next, server.retry_after = 429, 2, '0.2'
+    start = time.monotonic()
+    t = Target(token='x', verbose=False, payload={'targetid':1})
+
+    assert t.request.status_code == 200 and t.id == 1
+    assert time.monotonic() - start >= 0.4
+    assert server.requests == 3
+    assert limiter.summary()['throttled'] == 2
+
+
+def test_retries_are_bounded(server, limiter):
+    server.fail_status, server.fail_next = 503, 10
+    t = Target(token='x', verbose=False, payload={'targetid':1})
+
+    assert t.request.status_code == 503
+    assert server.requests == limiter.retries + 1
+
+
+def test_server_errors_are_retried_once_through_the_limiter(server, limiter):
+    # the session must not retry 5xx itself, or attempts multiply
+    server.fail_status, server.fail_next, server.retry_after = 502, 10, None
+    t = Target(token='x', verbose=False, payload={'targetid':1})
+
+    assert t.request.status_code == 502
+    assert server.requests == limiter.retries + 1
+    assert limiter.summary()['errors'] == limiter.retries + 1
+
+
+def test_post_is_retried_on_429_only(server, limiter):
+    server.fail_status, server.fail_next = 429, 1
+    assert post({'objectid':'a'}).status_code == 200
+    assert server.requests == 2
+
+    server.fail_status, server.fail_next = 503, 1
+    assert post({'objectid':'b'}).status_code == 503
+    assert server.requests == 3
+
+
+def test_no_retries_without_limiter(server, limiter):
+    pymmt.configure_limiter(enabled=False)
+    server.fail_status, server.fail_next = 429, 1
+    t = Target(token='x', verbose=False, payload={'targetid':1})
+
+    assert t.request.status_code == 429
+    assert server.requests == 1
+
+
+def test_aimd_decrease_and_recovery():
+    limiter = AdaptiveLimiter(initial=8, max_limit=16)
+    started = [limiter.acquire() for _ in range(4)]
+    # a burst of throttled responses to requests already in flight counts once
+    for s in started:
+        limiter.release(s, status=429)
+    assert limiter.limit == 4
+    assert limiter.summary()['decreases'] == 1
+
+    limiter.release(limiter.acquire(), status=503)
+    assert limiter.limit == 2
+
+    for _ in range(20):
+        limiter.release(limiter.acquire(), status=200)
+    assert 6 < limiter.limit < 7
+    for _ in range(200):
+        limiter.release(limiter.acquire(), status=200)
+    assert limiter.limit == 16
+
+
+def test_throttling_lowers_the_shared_limit(server, limiter):
+    before = limiter.limit
+    server.fail_status, server.fail_next = 503, 1
+    Target(token='x', verbose=False, payload={'targetid':1})
+
+    assert limiter.limit < before
+    assert limiter.summary()['decreases'] == 1
@@ -0,0 +1,38 @@
+from concurrent.futures import ThreadPoolExecutor
+import pymmt
+from pymmt.pymmt import Target, Datalist, Instruments
+
+
+def test_requests_reuse_one_connection(server):
+    for targetid in [1, 2, 3, 1]:
+        Target(token='x', verbose=False, payload={'targetid':targetid})
+    datalist = Datalist(token='x', verbose=False)
+    datalist.get(targetid=1)
+    Instruments(token='x', verbose=False).get_schedule(refresh=True)
+
+    assert len(datalist.data)
+    assert server.requests == 6
+    assert server.connections == 1
+
+
+def test_concurrent_requests_stay_within_the_pool(server):
+    pymmt.configure_session(pool_maxsize=4)
+    server.latency = 0.02
+
+    def get(targetid):
+        return Target(token='x', verbose=False, payload={'targetid':targetid}).id
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        for _ in range(3):
+            assert list(pool.map(get, range(1, 9))) == list(range(1, 9))
+    assert server.requests == 24
+    assert server.connections <= 4
+
+
+def test_configure_session_replaces_the_pool(server):
+    Target(token='x', verbose=False, payload={'targetid':1})
+    pymmt.configure_session(timeout=(5, 60))
+    Target(token='x', verbose=False, payload={'targetid':1})
+    Target(token='x', verbose=False, payload={'targetid':2})
+
+    assert server.connections == 2
@@ -0,0 +1,148 @@
+import asyncio, threading, time
+import pytest
+import pymmt
+from pymmt.pymmt import Datalist
+from pymmt.singleflight import SingleFlight, request_key
+
+
+@pytest.fixture
+def flight():
+    flight = pymmt.configure_coalescing()
+    yield flight
+    pymmt.configure_coalescing()
+
+
+def test_request_key():
+    assert request_key('GET', 'u', {'json':{'a':1, 'b':2}}) == request_key('GET', 'u', {'json':{'b':2, 'a':1}})
+    assert request_key('GET', 'u', {'json':{'a':1}}) != request_key('GET', 'u', {'json':{'a':2}})
+    assert request_key('GET', 'u', {}, scope=1) != request_key('GET', 'u', {})
+    assert request_key('POST', 'u', {}) is None
+    assert request_key('GET', 'u', {'stream':True}) is None
+
+
+def test_concurrent_identical_gets_share_one_request(server, flight):
+    server.latency = 0.2
+    barrier = threading.Barrier(8)
+    results = []
+
+    def get():
+        datalist = Datalist(token='x', verbose=False)
+        barrier.wait()
+        datalist.get(targetid=1)
+        results.append(datalist.request)
+
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert server.requests == 1
+    assert len(results) == 8 and all(r is results[0] for r in results)
+    assert flight.summary() == {'calls':1, 'saved':7, 'in_flight':0}
+
+
+def test_different_requests_are_not_shared(server, flight):
+    server.latency = 0.1
+    threads = [threading.Thread(target=lambda i=i: Datalist(token='x', verbose=False).get(targetid=i)) for i in [1, 2]]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert server.requests == 2
+
+
+def test_disabled_coalescing_sends_every_request(server, flight):
+    pymmt.configure_coalescing(enabled=False)
+    server.latency = 0.1
+    threads = [threading.Thread(target=lambda: Datalist(token='x', verbose=False).get(targetid=1)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert server.requests == 4
+
+
+def test_errors_reach_every_waiting_caller():
+    flight, started, release = SingleFlight(), threading.Event(), threading.Event()
+    errors = []
+
+    def fail():
+        started.set()
+        release.wait()
+        raise ValueError('boom')
+
+    def call():
+        try:
+            flight.do('key', fail)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=call) for _ in range(3)]
+    for t in followers:
+        t.start()
+    while flight.summary()['saved'] < 3:
+        time.sleep(0.001)
+    release.set()
+    for t in [leader] + followers:
+        t.join()
+    assert len(errors) == 4 and all(e is errors[0] for e in errors)
+
+
+def test_coroutines_share_one_call():
+    flight, calls = SingleFlight(), []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return object()
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async('key', work) for _ in range(10)))
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(result is results[0][0] for result, shared in results)
+    assert sorted(shared for result, shared in results) == [False] + [True] * 9
+
+
+def test_waiting_coroutines_retry_when_the_caller_is_cancelled():
+    flight, calls = SingleFlight(), []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return len(calls)
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do_async('key', work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do_async('key', work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(main()) == (2, False)
+    assert flight.summary() == {'calls':2, 'saved':0, 'in_flight':0}
+
+
+def test_async_gets_share_one_request(server, flight):
+    pytest.importorskip('aiohttp')
+    from pymmt.aio import AsyncDatalist, close_async_session
+
+    server.latency = 0.2
+
+    async def main():
+        try:
+            lists = [AsyncDatalist(token='x', verbose=False) for _ in range(8)]
+            await asyncio.gather(*(datalist.get(targetid=1) for datalist in lists))
+            return lists
+        finally:
+            await close_async_session()
+
+    lists = asyncio.run(main())
+    assert server.requests == 1
+    assert all(datalist.data == lists[0].data for datalist in lists)
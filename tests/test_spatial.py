@@ -0,0 +1,55 @@
+import math, random
+import pytest
+from pymmt.spatial import SpatialIndex, separation, unit_vector
+
+
+def brute_force(points, ra, dec, radius):
+    center = unit_vector(ra, dec)
+    matches = [(str(i), separation(center, unit_vector(*p))) for i, p in enumerate(points)]
+    return sorted((m for m in matches if m[1] <= radius), key=lambda m: m[1])
+
+
+def offset(ra, dec, arcsec, angle):
+    # a point `arcsec` away in direction `angle` (radians from north), on the sphere
+    d, t = math.radians(arcsec / 3600), angle
+    dec1 = math.asin(math.sin(math.radians(dec)) * math.cos(d) + math.cos(math.radians(dec)) * math.sin(d) * math.cos(t))
+    ra1 = math.radians(ra) + math.atan2(math.sin(t) * math.sin(d) * math.cos(math.radians(dec)),
+                                        math.cos(d) - math.sin(math.radians(dec)) * math.sin(dec1))
+    return math.degrees(ra1) % 360, math.degrees(dec1)
+
+
+@pytest.mark.parametrize('ra, dec', [(0.0, 0.0), (359.9999, 10.0), (0.0001, -45.0), (180.0, 89.999), (90.0, -89.9995),
+                                     (0.0, 90.0), (123.4, 60.0)])
+def test_cone_matches_brute_force(ra, dec):
+    # points around the center, including across the ra = 0 seam and over the poles
+    rng = random.Random(int(ra * 1000 + dec))
+    points = [offset(ra, dec, rng.uniform(0, 20), rng.uniform(0, 2 * math.pi)) for _ in range(300)]
+    records = [{'id':i, 'ra_decimal':p[0], 'dec_decimal':p[1]} for i, p in enumerate(points)]
+    for cell_size in [0.001, 0.1]:
+        index = SpatialIndex.from_records(records, cell_size=cell_size)
+        for radius in [1.0, 5.0, 15.0]:
+            assert index.cone(ra, dec, radius) == pytest.approx(brute_force(points, ra, dec, radius))
+
+
+def test_seam_neighbours_are_found():
+    index = SpatialIndex()
+    index.add(1, 359.9998, 0.0)
+    index.add(2, 0.0002, 0.0)
+    assert [m[0] for m in index.cone(0.0, 0.0, 1.0)] == ['1', '2']
+    assert index.nearest(359.9998, 0.0, 2.0)[0] == '1'
+
+
+def test_targets_can_move_and_be_removed():
+    index = SpatialIndex()
+    index.add(7, 10.0, 10.0)
+    index.add(7, 20.0, -10.0)
+    assert len(index) == 1 and index.position(7) == (20.0, -10.0)
+    assert index.nearest(10.0, 10.0, 10.0) is None
+    assert index.remove(7) and 7 not in index and not index.cells
+
+
+def test_records_without_position_are_not_indexed():
+    index = SpatialIndex()
+    assert not index.add_record({'id':1, 'ra':'25:00:00', 'dec':'+10:00:00'})
+    assert not index.add_record({'ra_decimal':10.0, 'dec_decimal':10.0})
+    assert index.add_record({'id':2, 'ra':'01:00:00', 'dec':'+10:00:00'}) and 2 in index